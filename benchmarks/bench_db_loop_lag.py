@@ -0,0 +1,93 @@
+"""
+Event loop lag under concurrent setting writes
+
+Runs the same burst of setting writes twice, one committed INSERT per
+write in both modes: "before" executes the SQL on the event loop through
+the legacy get_cursor path, "after" on the writer thread of
+DatabaseManager. set_setting itself only buffers, so the benchmark
+writes through the executor directly to compare the same DB work. A
+ticker task measures how late the loop wakes it up while the writes are
+in flight.
+
+Run with: python3 -m benchmarks.bench_db_loop_lag [--writes 2000] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from forelka.core.database import DatabaseManager
+
+
+async def _ticker(lags, stop: asyncio.Event, interval: float = 0.001):
+    loop = asyncio.get_event_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected) * 1000)
+
+
+_INSERT_SETTING = """
+    INSERT OR REPLACE INTO settings (account_id, key, value, updated_at)
+    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+"""
+
+
+async def _inline_set_setting(db: DatabaseManager, account_id: int, key: str, value):
+    async with db.get_cursor() as cursor:
+        cursor.execute(_INSERT_SETTING, (account_id, key, str(value)))
+
+
+async def _executor_set_setting(db: DatabaseManager, account_id: int, key: str, value):
+    await db._write(lambda cursor: cursor.execute(_INSERT_SETTING, (account_id, key, str(value))))
+
+
+async def _run_mode(mode: str, writes: int, concurrency: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="forelka-bench-"), "bench.db")
+    db = DatabaseManager(path)
+    await db.initialize()
+    account_id = await db.add_account(1, "1", "0" * 32)
+    
+    set_setting = _executor_set_setting if mode == "after" else _inline_set_setting
+    
+    lags = []
+    stop = asyncio.Event()
+    ticker = asyncio.ensure_future(_ticker(lags, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def write(i: int):
+        async with semaphore:
+            await set_setting(db, account_id, f"key_{i % 100}", i)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(write(i) for i in range(writes)))
+    elapsed = time.perf_counter() - start
+    
+    stop.set()
+    await ticker
+    await db.close()
+    
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    print(f"{mode:>6}: {writes / elapsed:8,.0f} writes/s, "
+          f"loop lag mean {statistics.mean(lags or [0]):6.2f}ms, "
+          f"p99 {p99:6.2f}ms, max {max(lags or [0]):6.2f}ms, ticks {len(lags)}")
+
+
+async def _run(args):
+    for mode in ("before", "after"):
+        await _run_mode(mode, args.writes, args.concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database event loop lag benchmark")
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark for the command dispatch path
+
+Measures messages per second through CommandHandler's message handler
+with many modules registered and several accounts compiled.
+
+Run with: python3 -m benchmarks.bench_dispatch [--modules 60] [--messages 200000]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+from forelka.core.command_handler import CommandHandler
+
+
+class _Permissions:
+    def is_owner(self, account_id, user_id):
+        return True
+
+
+async def _noop(client, message, args):
+    return None
+
+
+def _build_handler(modules: int, commands_per_module: int, accounts: int):
+    config = SimpleNamespace(get_commands_config=lambda: {"max_concurrency": 8, "timeout": 0})
+    bot = SimpleNamespace(permissions=_Permissions(), config=config)
+    handler = CommandHandler(bot)
+    
+    names = []
+    for m in range(modules):
+        for c in range(commands_per_module):
+            name = f"mod{m}cmd{c}"
+            handler.register_command(name, _noop, f"module{m}", description="bench")
+            names.append(name)
+    
+    clients = []
+    for account_id in range(1, accounts + 1):
+        prefix = "." if account_id % 2 else "!"
+        aliases = {f"a{i}": names[i] for i in range(0, len(names), 7)}
+        handler.compile_account(account_id, prefix, aliases)
+        clients.append(SimpleNamespace(account_id=account_id, prefix=prefix))
+    
+    return handler, names, clients
+
+
+def _build_traffic(names, clients, count: int, command_ratio: float):
+    rng = random.Random(42)
+    words = ["hello", "what's up", "lol", "see you tomorrow", "ok", "👍", "https://t.me/x"]
+    traffic = []
+    
+    for _ in range(count):
+        client = rng.choice(clients)
+        if rng.random() < command_ratio:
+            text = f"{client.prefix}{rng.choice(names)} arg1 arg2"
+        else:
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(1, 12)))
+        message = SimpleNamespace(
+            text=text,
+            chat=SimpleNamespace(id=rng.randint(1, 50)),
+            from_user=SimpleNamespace(id=1)
+        )
+        traffic.append((client, message))
+    
+    return traffic
+
+
+async def _run(args):
+    handler, names, clients = _build_handler(args.modules, args.commands, args.accounts)
+    traffic = _build_traffic(names, clients, args.messages, args.command_ratio)
+    handle_message = handler.create_message_handler()
+    
+    start = time.perf_counter()
+    for client, message in traffic:
+        await handle_message(client, message)
+    await handler.scheduler.join()
+    elapsed = time.perf_counter() - start
+    
+    print(f"modules:   {args.modules} ({len(names)} commands, {args.accounts} accounts)")
+    print(f"messages:  {len(traffic)} ({args.command_ratio:.0%} commands)")
+    print(f"elapsed:   {elapsed:.3f}s")
+    print(f"rate:      {len(traffic) / elapsed:,.0f} msg/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command dispatch micro-benchmark")
+    parser.add_argument("--modules", type=int, default=60)
+    parser.add_argument("--commands", type=int, default=5, help="Commands per module")
+    parser.add_argument("--accounts", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--command-ratio", type=float, default=0.1)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -11,6 +11,7 @@ from .core.database import DatabaseManager
 from .core.config import ConfigManager
 from .core.module_loader import ModuleLoader
 from .core.command_handler import CommandHandler
+from .core.permissions import PermissionManager
 from .core.logger import setup_logger
 
 __all__ = [
@@ -19,5 +20,6 @@ __all__ = [
     'ConfigManager',
     'ModuleLoader',
     'CommandHandler',
+    'PermissionManager',
     'setup_logger'
 ]
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Per-module resource accounting for Forelka Userbot
+"""
+
+import asyncio
+import contextvars
+import time
+import tracemalloc
+from typing import Any, Dict, Optional
+
+# Module whose command (or a task it spawned) is running
+current_module: contextvars.ContextVar = contextvars.ContextVar("forelka_module", default=None)
+
+
+class ModuleUsage:
+    """CPU time and task counters of one module"""
+    
+    __slots__ = ("cpu_s", "tasks_live", "tasks_spawned")
+    
+    def __init__(self):
+        self.cpu_s = 0.0
+        self.tasks_live = 0
+        self.tasks_spawned = 0
+
+
+class _Measured:
+    """Awaitable that drives a coroutine and adds its CPU time to a module
+    
+    Only the steps of the coroutine itself are timed, time spent in other
+    tasks while it waits is not counted.
+    """
+    
+    __slots__ = ("coro", "usage")
+    
+    def __init__(self, coro, usage: ModuleUsage):
+        self.coro = coro
+        self.usage = usage
+    
+    def __await__(self):
+        coro, usage = self.coro, self.usage
+        value, error = None, None
+        
+        while True:
+            started = time.thread_time()
+            try:
+                if error is not None:
+                    future = coro.throw(error)
+                else:
+                    future = coro.send(value)
+            except StopIteration as stop:
+                usage.cpu_s += time.thread_time() - started
+                return stop.value
+            except BaseException:
+                usage.cpu_s += time.thread_time() - started
+                raise
+            usage.cpu_s += time.thread_time() - started
+            
+            try:
+                value, error = (yield future), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class ModuleAccounting:
+    """Attribute CPU time, spawned tasks and memory to modules
+    
+    Command handlers run under ``current_module``; tasks created while it
+    is set inherit it, are counted as the module's and have their CPU time
+    measured too. Memory is read from tracemalloc traces whose frames are
+    in the module's file, when tracing is enabled.
+    """
+    
+    def __init__(self, memory_cache_seconds: float = 10.0):
+        self.usage: Dict[str, ModuleUsage] = {}
+        self.memory_cache_seconds = memory_cache_seconds
+        self._memory: Dict[str, int] = {}
+        self._memory_at = 0.0
+        self._previous_factory = None
+    
+    def get_usage(self, module: str) -> ModuleUsage:
+        usage = self.usage.get(module)
+        if usage is None:
+            usage = self.usage[module] = ModuleUsage()
+        return usage
+    
+    async def run(self, module: str, coro):
+        """Await a command coroutine as the given module"""
+        token = current_module.set(module)
+        try:
+            return await _Measured(coro, self.get_usage(module))
+        finally:
+            current_module.reset(token)
+    
+    def install(self, loop: asyncio.AbstractEventLoop):
+        """Count tasks spawned by modules, keeps any task factory already set"""
+        self._previous_factory = loop.get_task_factory()
+        loop.set_task_factory(self._task_factory)
+    
+    def _task_factory(self, loop, coro, **kwargs):
+        module = current_module.get()
+        if module is not None:
+            usage = self.get_usage(module)
+            coro = self._measured_task(coro, usage)
+        
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        
+        if module is not None:
+            usage.tasks_live += 1
+            usage.tasks_spawned += 1
+            task.add_done_callback(lambda _: self._task_done(usage))
+        return task
+    
+    @staticmethod
+    async def _measured_task(coro, usage: ModuleUsage):
+        return await _Measured(coro, usage)
+    
+    @staticmethod
+    def _task_done(usage: ModuleUsage):
+        usage.tasks_live -= 1
+    
+    @staticmethod
+    def start_memory_tracing(frames: int):
+        """Start tracemalloc, deeper frames attribute allocations made in libraries too"""
+        if frames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+    
+    def memory_usage(self, paths: Dict[str, str]) -> Dict[str, int]:
+        """Bytes currently allocated from each module's file, {module: path}
+        
+        A tracemalloc snapshot is costly, results are reused for
+        ``memory_cache_seconds``.
+        """
+        if not tracemalloc.is_tracing():
+            return {}
+        
+        now = time.monotonic()
+        if now - self._memory_at < self.memory_cache_seconds and set(paths) <= set(self._memory):
+            return {module: self._memory[module] for module in paths}
+        
+        snapshot = tracemalloc.take_snapshot()
+        memory = {}
+        for module, path in paths.items():
+            traces = snapshot.filter_traces([tracemalloc.Filter(True, path, all_frames=True)])
+            memory[module] = sum(stat.size for stat in traces.statistics("filename"))
+        
+        self._memory, self._memory_at = memory, now
+        return memory
+    
+    def snapshot(self, metrics, paths: Optional[Dict[str, str]] = None,
+                 memory: Optional[Dict[str, int]] = None) -> Dict[str, Dict[str, Any]]:
+        """Per-module report joined with the command latency metrics
+        
+        paths maps module names to their files for memory accounting,
+        memory is a result of memory_usage taken beforehand. The counters
+        are owned by the event loop, call this on its thread.
+        """
+        if memory is None:
+            memory = self.memory_usage(paths or {})
+        modules = set(self.usage) | set(metrics.modules) | set(paths or {})
+        
+        report = {}
+        for module in sorted(modules):
+            histogram = metrics.modules.get(module)
+            summary = histogram.snapshot() if histogram is not None else {
+                "count": 0, "errors": 0, "error_rate": 0.0, "avg_ms": 0.0, "p95_ms": 0.0
+            }
+            usage = self.usage.get(module) or ModuleUsage()
+            
+            report[module] = {
+                "calls": summary["count"],
+                "errors": summary["errors"],
+                "error_rate": summary["error_rate"],
+                "wall_ms": round(histogram.total_ms, 2) if histogram is not None else 0.0,
+                "avg_ms": summary["avg_ms"],
+                "p95_ms": summary["p95_ms"],
+                "cpu_ms": round(usage.cpu_s * 1000, 2),
+                "tasks_live": usage.tasks_live,
+                "tasks_spawned": usage.tasks_spawned,
+                "memory_bytes": memory.get(module)
+            }
+        return report
+    
+    def reset(self):
+        """Forget CPU time and spawn counts, live task counts are kept"""
+        for usage in self.usage.values():
+            usage.cpu_s = 0.0
+            usage.tasks_spawned = 0
\ No newline at end of file
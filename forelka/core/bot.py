@@ -3,10 +3,12 @@ import os
 import sys
 import signal
 import logging
+import threading
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 
 from pyrogram import Client, idle
+from pyrogram.handlers import MessageHandler
 from pyrogram.types import Message
 from pyrogram.enums import ParseMode
 
@@ -14,6 +16,10 @@ from .database import DatabaseManager
 from .config import ConfigManager
 from .module_loader import ModuleLoader
 from .command_handler import CommandHandler
+from .permissions import PermissionManager
+from .snapshots import SnapshotStore
+from .watcher import ModuleWatcher
+from .workers import WorkerPool
 from .logger import setup_logger
 from ..utils.helpers import check_root_warning
 from ..utils.strings import StringManager
@@ -26,16 +32,47 @@ class ForelkaBot:
     def __init__(self, config_path: str = "config.json"):
         self.config_path = config_path
         self.config = ConfigManager(config_path)
-        self.db = DatabaseManager(self.config.get("database_path", "forelka.db"))
+        self.db = DatabaseManager.from_config(self.config)
+        self.permissions = PermissionManager(self)
         self.modules = ModuleLoader(self)
         self.commands = CommandHandler(self)
+        self.permissions.add_listener(self.commands.refresh_filter)
         self.strings = StringManager()
         self.messages = MessageManager(self)
         
+        backups_config = self.config.get_backups_config()
+        self.snapshots = SnapshotStore(
+            backups_config.get("dir", "backups"),
+            chunk_size=int(backups_config.get("chunk_size_kib", 64)) * 1024
+        )
+        
+        # Worker processes start with the first command of a heavy module
+        workers_config = self.config.get_workers_config()
+        self.workers: Optional[WorkerPool] = None
+        if int(workers_config.get("processes", 2)) > 0:
+            self.workers = WorkerPool(
+                int(workers_config.get("processes", 2)),
+                float(workers_config.get("restart_delay", 1.0))
+            )
+        
         self.clients: Dict[int, Client] = {}
         self.running = False
+        self.watcher: Optional[ModuleWatcher] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
         
-        setup_logger(self.config.get("log_level", "INFO"))
+        logging_config = self.config.get_logging_config()
+        setup_logger(
+            self.config.get("log_level", "INFO"),
+            queue_size=int(logging_config.get("queue_size", 10000)),
+            overflow=logging_config.get("overflow", "drop_oldest"),
+            batch_size=int(logging_config.get("batch_size", 256)),
+            max_bytes=int(float(logging_config.get("max_size_mb", 10)) * 1024 * 1024),
+            rotate_interval=float(logging_config.get("rotate_hours", 24)) * 3600,
+            keep_segments=int(logging_config.get("keep_segments", 7)),
+            compress=bool(logging_config.get("compress", True)),
+            index_tokens=bool(logging_config.get("index_tokens", True)),
+            log_format=logging_config.get("format", "text")
+        )
         
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -45,16 +82,32 @@ class ForelkaBot:
         
         check_root_warning()
         
+        self.loop = asyncio.get_event_loop()
+        
+        # Per-module CPU, task and memory accounting
+        self.commands.accounting.install(asyncio.get_event_loop())
+        self.commands.accounting.start_memory_tracing(
+            int(self.config.get_commands_config().get("trace_memory_frames", 0))
+        )
+        
         await self.db.initialize()
         await self.modules.load_all()
+        await self._start_watcher()
         
         accounts = await self.db.get_all_accounts()
         if not accounts:
             logger.warning("⚠️  No accounts configured. Please add accounts first.")
             return
         
+        # Load roles, settings and module flags of every account up front
+        account_ids = [account['id'] for account in accounts]
+        await self.permissions.load()
+        await self.db.load_settings(account_ids)
+        modules = await self.db.get_modules_for_accounts(account_ids)
+        
         for account in accounts:
-            await self._start_client(account)
+            disabled_modules = [row['module_name'] for row in modules[account['id']] if not row['enabled']]
+            await self._start_client(account, disabled_modules)
         
         if not self.clients:
             logger.error("❌ No clients started successfully")
@@ -63,10 +116,51 @@ class ForelkaBot:
         self.running = True
         logger.info(f"✅ Forelka started with {len(self.clients)} account(s)")
         
+        self._start_web_interface()
         await self._send_startup_notifications()
         await idle()
     
-    async def _start_client(self, account: Dict[str, Any]):
+    def _start_web_interface(self):
+        """Serve the web interface from a daemon thread, attached to this bot"""
+        if not self.config.get_web_config().get('enabled', True):
+            return
+        
+        try:
+            from ..web.app import run_web_server
+        except ImportError as e:
+            logger.warning(f"⚠️  Web interface unavailable: {e}")
+            return
+        
+        threading.Thread(target=run_web_server, args=(self,), name="forelka-web", daemon=True).start()
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        """Command counters, latency percentiles, queue depth and module resources"""
+        stats = self.commands.metrics.snapshot()
+        stats['queue_depth'] = self.commands.queue_depth()
+        stats['resources'] = await self.modules.get_resource_usage()
+        return stats
+    
+    async def _start_watcher(self):
+        """Reload modules as their files change"""
+        modules_config = self.config.get_modules_config()
+        if not modules_config.get('watch', True):
+            return
+        
+        self.watcher = ModuleWatcher(
+            [self.modules.modules_dir, self.modules.loaded_modules_dir],
+            self._on_modules_changed,
+            poll_interval=float(modules_config.get('watch_poll_interval', 2.0))
+        )
+        await self.watcher.start()
+        logger.info(f"👀 Watching module files ({self.watcher.mode})")
+    
+    async def _on_modules_changed(self, paths):
+        actions = await self.modules.sync(paths)
+        if actions:
+            logger.info("🔄 Module files changed: " +
+                        ", ".join(f"{name} {action}" for name, action in sorted(actions.items())))
+    
+    async def _start_client(self, account: Dict[str, Any], disabled_modules: Optional[List[str]] = None):
         try:
             session_name = f"forelka-{account['user_id']}"
             client = Client(
@@ -81,10 +175,12 @@ class ForelkaBot:
             
             client.account_id = account['id']
             client.user_id = account['user_id']
-            client.prefix = account.get('prefix', '.')
-            client.owners = await self.db.get_owners(account['id'])
+            client.prefix = str(await self.db.get_setting(account['id'], "prefix", account.get('prefix', '.')))
+            client.owners = self.permissions.get_owners(account['id'])
             client.bot = self
             
+            await self._compile_commands(client, disabled_modules)
+            
             # Create log chat if not exists
             await self._create_log_chat(client)
             
@@ -93,9 +189,20 @@ class ForelkaBot:
                 await self._setup_inline_bot(client)
             
             client.add_handler(
-                self.commands.create_message_handler(),
+                MessageHandler(
+                    self.commands.create_message_handler(),
+                    self.commands.build_filter(client.account_id)
+                ),
                 group=0
             )
+            # Module event subscriptions see commands too, in their own group
+            client.add_handler(
+                MessageHandler(
+                    self.commands.events.create_message_handler(),
+                    self.commands.events.build_filter(client.account_id)
+                ),
+                group=1
+            )
             
             self.clients[account['user_id']] = client
             logger.info(f"✅ Client started for user {account['user_id']}")
@@ -103,6 +210,46 @@ class ForelkaBot:
         except Exception as e:
             logger.error(f"❌ Failed to start client for user {account.get('user_id', 'unknown')}: {e}")
     
+    async def restore_database(self, backup_path: str):
+        """Swap in a database backup and reload dependent state, clients stay connected"""
+        await self.db.restore(backup_path)
+        await self.reload_state()
+    
+    async def reload_state(self):
+        """Reload owners, prefixes, aliases and module flags from the database"""
+        accounts = {account['id']: account for account in await self.db.get_all_accounts()}
+        account_ids = [client.account_id for client in self.clients.values()]
+        
+        await self.permissions.load()
+        await self.db.load_settings(account_ids)
+        modules = await self.db.get_modules_for_accounts(account_ids)
+        
+        for client in self.clients.values():
+            account = accounts.get(client.account_id)
+            if account is None:
+                logger.warning(f"⚠️  Account {client.account_id} is running but missing from the database")
+                account = {}
+            
+            client.prefix = str(await self.db.get_setting(client.account_id, "prefix", account.get('prefix', '.')))
+            disabled_modules = [row['module_name'] for row in modules[client.account_id] if not row['enabled']]
+            await self._compile_commands(client, disabled_modules)
+            self.commands.refresh_filter(client.account_id)
+        
+        logger.info(f"✅ Reloaded state of {len(account_ids)} account(s)")
+    
+    async def _compile_commands(self, client, disabled_modules: Optional[List[str]] = None):
+        """Compile the account's command dispatch index"""
+        alias_settings = await self.db.get_settings_by_prefix(client.account_id, "alias_")
+        aliases = {
+            key[len("alias_"):]: str(value)
+            for key, value in alias_settings.items()
+            if value
+        }
+        if disabled_modules is None:
+            disabled_modules = await self.db.get_disabled_modules(client.account_id)
+        
+        self.commands.compile_account(client.account_id, client.prefix, aliases, disabled_modules)
+    
     async def _create_log_chat(self, client):
         """Create a dedicated log chat for the account"""
         try:
@@ -168,6 +315,15 @@ class ForelkaBot:
         
         self.running = False
         
+        if self.watcher is not None:
+            await self.watcher.stop()
+            self.watcher = None
+        
+        await self.commands.scheduler.shutdown()
+        
+        if self.workers is not None:
+            await self.workers.stop()
+        
         for user_id, client in self.clients.items():
             try:
                 await client.stop()
@@ -176,6 +332,7 @@ class ForelkaBot:
                 logger.error(f"❌ Failed to stop client for user {user_id}: {e}")
         
         self.clients.clear()
+        await self.db.flush()
         await self.db.close()
         
         logger.info("👋 Forelka stopped")
@@ -200,6 +357,8 @@ class ForelkaBot:
             del self.clients[user_id]
         
         await self.db.remove_account(account['id'])
+        self.permissions.forget_account(account['id'])
+        self.commands.drop_account(account['id'])
         logger.info(f"✅ Removed account {user_id}")
         return True
     
@@ -213,10 +372,11 @@ class ForelkaBot:
         return self.clients.get(user_id)
     
     async def reload_modules(self):
+        """Reload changed modules in place, commands stay available throughout"""
         logger.info("🔄 Reloading modules...")
-        await self.modules.unload_all()
-        await self.modules.load_all()
-        logger.info("✅ Modules reloaded")
+        actions = await self.modules.sync()
+        logger.info(f"✅ Modules reloaded ({len(actions)} changed)")
+        return actions
     
     async def broadcast_message(self, message: str):
         for user_id, client in self.clients.items():
@@ -3,12 +3,23 @@ Command handler for Forelka Userbot with improved architecture
 """
 
 import re
+import time
 import asyncio
+import logging
 from typing import Dict, List, Optional, Callable, Any, Tuple
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from pyrogram.enums import ParseMode
 
+from .dispatch import DispatchIndex
+from .scheduler import CommandScheduler
+from .metrics import CommandMetrics
+from .accounting import ModuleAccounting
+from .events import EventRouter
+from .logger import command_context
+
+logger = logging.getLogger(__name__)
+
 
 class CommandHandler:
     """Improved command handler with better architecture"""
@@ -17,11 +28,26 @@ class CommandHandler:
         self.bot = bot
         self.commands: Dict[str, Dict[str, Any]] = {}
         self.aliases: Dict[str, str] = {}
+        self.indexes: Dict[int, DispatchIndex] = {}
+        self.filters: Dict[int, filters.Filter] = {}
+        self.metrics = CommandMetrics()
+        self.accounting = ModuleAccounting()
+        
+        commands_config = self.bot.config.get_commands_config()
+        self.scheduler = CommandScheduler(
+            commands_config.get("max_concurrency", 8),
+            commands_config.get("timeout", 120)
+        )
+        self.events = EventRouter(self)
     
     def register_command(self, name: str, func: Callable, module: str, 
                         description: str = "", usage: str = "", 
-                        owner_only: bool = False, admin_only: bool = False):
-        """Register a new command"""
+                        owner_only: bool = False, admin_only: bool = False,
+                        timeout: Optional[float] = None):
+        """Register a new command
+        
+        timeout overrides the scheduler default, 0 runs the command without a limit.
+        """
         self.commands[name.lower()] = {
             "func": func,
             "module": module,
@@ -29,12 +55,37 @@ class CommandHandler:
             "usage": usage,
             "owner_only": owner_only,
             "admin_only": admin_only,
+            "timeout": timeout,
             "registered_at": asyncio.get_event_loop().time()
         }
+        
+        for index in self.indexes.values():
+            index.refresh_command(name.lower())
     
-    def register_alias(self, alias: str, command: str):
-        """Register a command alias"""
-        self.aliases[alias.lower()] = command.lower()
+    def register_alias(self, alias: str, command: str, account_id: Optional[int] = None):
+        """Register a command alias, global unless account_id is given"""
+        alias, command = alias.lower(), command.lower()
+        
+        if account_id is not None:
+            self.get_index(account_id).add_alias(alias, command)
+            return
+        
+        self.aliases[alias] = command
+        for index in self.indexes.values():
+            index.refresh_alias(alias)
+    
+    def unregister_alias(self, alias: str, account_id: Optional[int] = None):
+        """Unregister a command alias"""
+        alias = alias.lower()
+        
+        if account_id is not None:
+            if account_id in self.indexes:
+                self.indexes[account_id].remove_alias(alias)
+            return
+        
+        if self.aliases.pop(alias, None) is not None:
+            for index in self.indexes.values():
+                index.refresh_alias(alias)
     
     def unregister_command(self, name: str):
         """Unregister a command"""
@@ -49,49 +100,193 @@ class CommandHandler:
         
         for alias in aliases_to_remove:
             del self.aliases[alias]
+        
+        for index in self.indexes.values():
+            index.refresh_command(name.lower())
+            for alias in aliases_to_remove:
+                index.refresh_alias(alias)
+    
+    def subscribe(self, module: str, callback: Callable, **kwargs) -> int:
+        """Subscribe a module callback to messages, see EventRouter.subscribe"""
+        return self.events.subscribe(module, callback, **kwargs)
+    
+    def unsubscribe(self, subscription_id: int) -> bool:
+        return self.events.unsubscribe(subscription_id)
+    
+    def replace_module(self, module: str, register: Callable[[], None]):
+        """Run the register step of a (new version of a) module as one swap
+        
+        Commands the new version registers replace the old ones in place,
+        old commands it no longer registers are removed afterwards. If
+        register raises, the old commands, aliases and event subscriptions
+        are put back. Nothing awaits in between, so dispatch never sees a gap.
+        """
+        old_commands = {name: cmd for name, cmd in self.commands.items() if cmd["module"] == module}
+        old_aliases = dict(self.aliases)
+        old_subscriptions = set(self.events.module_subscriptions(module))
+        
+        try:
+            register()
+        except Exception:
+            for subscription_id in set(self.events.module_subscriptions(module)) - old_subscriptions:
+                self.events.unsubscribe(subscription_id)
+            
+            touched = {name for name, cmd in self.commands.items() if cmd["module"] == module}
+            for name in touched - set(old_commands):
+                del self.commands[name]
+            self.commands.update(old_commands)
+            
+            changed_aliases = set(self.aliases) | set(old_aliases)
+            self.aliases.clear()
+            self.aliases.update(old_aliases)
+            
+            for index in self.indexes.values():
+                for name in touched | set(old_commands):
+                    index.refresh_command(name)
+                for alias in changed_aliases:
+                    index.refresh_alias(alias)
+            raise
+        
+        # Re-registered commands are new entries, the untouched ones are stale
+        for name, cmd in old_commands.items():
+            if self.commands.get(name) is cmd:
+                self.unregister_command(name)
+        for subscription_id in old_subscriptions:
+            self.events.unsubscribe(subscription_id)
+    
+    def compile_account(self, account_id: int, prefix: str = ".",
+                        aliases: Optional[Dict[str, str]] = None,
+                        disabled_modules: Optional[List[str]] = None) -> DispatchIndex:
+        """Compile the dispatch index of an account"""
+        index = DispatchIndex(account_id, prefix, self.commands, self.aliases)
+        index.aliases.update({alias.lower(): cmd.lower() for alias, cmd in (aliases or {}).items()})
+        index.disabled_modules.update(disabled_modules or [])
+        index.rebuild()
+        
+        self.indexes[account_id] = index
+        return index
+    
+    def get_index(self, account_id: Optional[int], prefix: str = ".") -> DispatchIndex:
+        """Get the dispatch index of an account, compiling it on first use"""
+        index = self.indexes.get(account_id)
+        if index is None:
+            index = self.compile_account(account_id, prefix)
+        return index
+    
+    def set_prefix(self, account_id: int, prefix: str):
+        """Change the command prefix of an account"""
+        self.get_index(account_id, prefix).set_prefix(prefix)
+        self.refresh_filter(account_id)
+    
+    def drop_account(self, account_id: int):
+        """Forget the dispatch index of a removed account"""
+        self.indexes.pop(account_id, None)
+        self.filters.pop(account_id, None)
+    
+    def build_filter(self, account_id: int) -> filters.Filter:
+        """Build the ingestion filter of an account
+        
+        Only text messages starting with the account prefix and sent by the
+        account itself or one of its owners reach the command handler.
+        """
+        async def is_command(flt, client: Client, message: Message) -> bool:
+            text = message.text
+            if not text or not text.startswith(flt.prefix):
+                return False
+            
+            if message.outgoing:
+                return True
+            
+            return message.from_user is not None and message.from_user.id in flt.owners
+        
+        command_filter = filters.create(is_command, "ForelkaCommandFilter",
+                                        prefix=".", owners=frozenset())
+        self.filters[account_id] = command_filter
+        self.refresh_filter(account_id)
+        return command_filter
+    
+    def refresh_filter(self, account_id: int):
+        """Recompile the account filter after a prefix or owner change"""
+        command_filter = self.filters.get(account_id)
+        if command_filter is None:
+            return
+        
+        command_filter.prefix = self.get_index(account_id).prefix
+        command_filter.owners = frozenset(self.bot.permissions.get_owners(account_id))
+    
+    def set_module_enabled(self, account_id: int, module: str, enabled: bool):
+        """Enable or disable a module's commands for an account"""
+        self.get_index(account_id).set_module_enabled(module, enabled)
     
     def create_message_handler(self):
         """Create a message handler for commands"""
         async def handle_message(client: Client, message: Message):
             """Handle incoming messages and process commands"""
-            if not message.text:
+            text = message.text
+            if not text:
                 return
             
-            # Get account-specific prefix
-            prefix = getattr(client, 'prefix', '.')
-            if not message.text.startswith(prefix):
-                return
+            # Resolve against the account's compiled index
+            account_id = getattr(client, 'account_id', None)
+            index = self.indexes.get(account_id)
+            if index is None:
+                index = self.get_index(account_id, getattr(client, 'prefix', '.'))
             
-            # Parse command
-            command_text = message.text[len(prefix):].strip()
-            if not command_text:
+            match = index.resolve(text)
+            if match is None:
                 return
             
-            parts = command_text.split(maxsplit=1)
-            cmd_name = parts[0].lower()
-            args = parts[1].split() if len(parts) > 1 else []
+            # Tokenize arguments only for matched commands
+            cmd_name, command, args_start = match
+            args = text[args_start:].split()
             
-            # Check for aliases
-            if cmd_name in self.aliases:
-                cmd_name = self.aliases[cmd_name]
+            async def on_timeout(timeout: float):
+                error = asyncio.TimeoutError(f"Timed out after {timeout}s")
+                await self._handle_command_error(client, message, cmd_name, error)
             
-            # Check if command exists
-            if cmd_name not in self.commands:
-                return
-            
-            command = self.commands[cmd_name]
-            
-            # Check permissions
+            # Run off the update worker, ordered per chat
+            chat_id = message.chat.id if message.chat else None
+            self.scheduler.submit(
+                account_id, chat_id, cmd_name,
+                lambda: self._execute(client, message, cmd_name, command, args),
+                command.get("timeout"), on_timeout
+            )
+        
+        return handle_message
+    
+    async def _execute(self, client: Client, message: Message, cmd_name: str,
+                       command: Dict[str, Any], args: List[str]):
+        """Check permissions and run a resolved command"""
+        module = command.get("module", "unknown")
+        # Structured log records of this task carry the command's context
+        context = command_context.set((getattr(client, 'account_id', None), module, cmd_name, time.perf_counter()))
+        try:
             if not await self._check_permissions(client, message, command):
                 return
             
-            # Execute command
+            failed = True
+            started = time.perf_counter()
             try:
-                await command["func"](client, message, args)
+                await self.accounting.run(module, command["func"](client, message, args))
+                failed = False
             except Exception as e:
                 await self._handle_command_error(client, message, cmd_name, e)
-        
-        return handle_message
+            finally:
+                # Timeouts and cancellations count as failures too
+                duration_ms = (time.perf_counter() - started) * 1000
+                self.metrics.record(cmd_name, module, duration_ms, failed)
+                logger.debug(f"Command {cmd_name} finished in {duration_ms:.1f} ms")
+        finally:
+            command_context.reset(context)
+    
+    def queue_depth(self, account_id: Optional[int] = None) -> int:
+        """Number of commands waiting to run"""
+        return self.scheduler.queue_depth(account_id)
+    
+    def cancel_commands(self, account_id: Optional[int] = None, chat_id: Any = None,
+                        command: Optional[str] = None) -> int:
+        """Cancel in-flight commands"""
+        return self.scheduler.cancel(account_id, chat_id, command)
     
     async def _check_permissions(self, client: Client, message: Message, command: Dict[str, Any]) -> bool:
         """Check if user has permission to execute command"""
@@ -100,7 +295,7 @@ class CommandHandler:
         
         # Check if command requires owner permissions
         if command.get("owner_only", False):
-            if not await self.bot.db.is_owner(account_id, user_id):
+            if not self.bot.permissions.is_owner(account_id, user_id):
                 await message.reply(
                     "❌ <b>Access denied</b>\n"
                     "This command is only available to account owners.",
@@ -111,7 +306,7 @@ class CommandHandler:
         # Check if command requires admin permissions
         if command.get("admin_only", False):
             # For now, admins are also owners
-            if not await self.bot.db.is_owner(account_id, user_id):
+            if not self.bot.permissions.is_owner(account_id, user_id):
                 await message.reply(
                     "❌ <b>Access denied</b>\n"
                     "This command is only available to admins.",
@@ -138,8 +333,6 @@ class CommandHandler:
             pass  # Ignore if we can't send the error message
         
         # Log the error
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"Command {command_name} failed: {error}", exc_info=True)
     
     def get_command_list(self, account_id: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -198,11 +391,17 @@ class CommandHandler:
         
         return sorted(results, key=lambda x: x["name"])
     
-    def get_aliases(self) -> Dict[str, str]:
-        """Get all command aliases"""
-        return dict(self.aliases)
+    def get_aliases(self, account_id: Optional[int] = None) -> Dict[str, str]:
+        """Get all command aliases, including the account's own ones"""
+        aliases = dict(self.aliases)
+        if account_id in self.indexes:
+            aliases.update(self.indexes[account_id].aliases)
+        return aliases
     
     def clear_commands(self):
         """Clear all registered commands and aliases"""
         self.commands.clear()
-        self.aliases.clear()
\ No newline at end of file
+        self.aliases.clear()
+        
+        for index in self.indexes.values():
+            index.rebuild()
\ No newline at end of file
@@ -33,7 +33,45 @@ class ConfigManager:
             "modules": {
                 "auto_load": True,
                 "modules_dir": "modules",
-                "loaded_modules_dir": "loaded_modules"
+                "loaded_modules_dir": "loaded_modules",
+                "lazy_load": False,
+                "watch": True,
+                "watch_poll_interval": 2.0
+            },
+            "commands": {
+                "max_concurrency": 8,
+                "timeout": 120,
+                "trace_memory_frames": 0
+            },
+            "backups": {
+                "dir": "backups",
+                "chunk_size_kib": 64,
+                "keep_last": 10,
+                "keep_days": 30
+            },
+            "workers": {
+                "processes": 2,
+                "restart_delay": 1.0
+            },
+            "database": {
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "cache_size_kib": 8192,
+                "temp_store": "MEMORY",
+                "readers": 2,
+                "flush_interval": 0.5,
+                "flush_threshold": 256
+            },
+            "logging": {
+                "queue_size": 10000,
+                "overflow": "drop_oldest",
+                "batch_size": 256,
+                "max_size_mb": 10,
+                "rotate_hours": 24,
+                "keep_segments": 7,
+                "compress": True,
+                "index_tokens": True,
+                "format": "text"
             }
         }
         
@@ -101,6 +139,26 @@ class ConfigManager:
         """Get modules configuration"""
         return self.get("modules", {})
     
+    def get_commands_config(self) -> Dict[str, Any]:
+        """Get command execution configuration"""
+        return self.get("commands", {})
+    
+    def get_backups_config(self) -> Dict[str, Any]:
+        """Get snapshot store configuration"""
+        return self.get("backups", {})
+    
+    def get_workers_config(self) -> Dict[str, Any]:
+        """Get heavy module worker pool configuration"""
+        return self.get("workers", {})
+    
+    def get_database_config(self) -> Dict[str, Any]:
+        """Get SQLite pragma and write buffering configuration"""
+        return self.get("database", {})
+    
+    def get_logging_config(self) -> Dict[str, Any]:
+        """Get log pipeline configuration"""
+        return self.get("logging", {})
+    
     def reset_to_defaults(self):
         """Reset configuration to defaults"""
         self.config = {
@@ -120,7 +178,45 @@ class ConfigManager:
             "modules": {
                 "auto_load": True,
                 "modules_dir": "modules",
-                "loaded_modules_dir": "loaded_modules"
+                "loaded_modules_dir": "loaded_modules",
+                "lazy_load": False,
+                "watch": True,
+                "watch_poll_interval": 2.0
+            },
+            "commands": {
+                "max_concurrency": 8,
+                "timeout": 120,
+                "trace_memory_frames": 0
+            },
+            "backups": {
+                "dir": "backups",
+                "chunk_size_kib": 64,
+                "keep_last": 10,
+                "keep_days": 30
+            },
+            "workers": {
+                "processes": 2,
+                "restart_delay": 1.0
+            },
+            "database": {
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "cache_size_kib": 8192,
+                "temp_store": "MEMORY",
+                "readers": 2,
+                "flush_interval": 0.5,
+                "flush_threshold": 256
+            },
+            "logging": {
+                "queue_size": 10000,
+                "overflow": "drop_oldest",
+                "batch_size": 256,
+                "max_size_mb": 10,
+                "rotate_hours": 24,
+                "keep_segments": 7,
+                "compress": True,
+                "index_tokens": True,
+                "format": "text"
             }
         }
         self._save_config(self.config)
@@ -144,7 +240,45 @@ class ConfigManager:
             "modules": {
                 "auto_load": True,
                 "modules_dir": "modules",
-                "loaded_modules_dir": "loaded_modules"
+                "loaded_modules_dir": "loaded_modules",
+                "lazy_load": False,
+                "watch": True,
+                "watch_poll_interval": 2.0
+            },
+            "commands": {
+                "max_concurrency": 8,
+                "timeout": 120,
+                "trace_memory_frames": 0
+            },
+            "backups": {
+                "dir": "backups",
+                "chunk_size_kib": 64,
+                "keep_last": 10,
+                "keep_days": 30
+            },
+            "workers": {
+                "processes": 2,
+                "restart_delay": 1.0
+            },
+            "database": {
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "cache_size_kib": 8192,
+                "temp_store": "MEMORY",
+                "readers": 2,
+                "flush_interval": 0.5,
+                "flush_threshold": 256
+            },
+            "logging": {
+                "queue_size": 10000,
+                "overflow": "drop_oldest",
+                "batch_size": 256,
+                "max_size_mb": 10,
+                "rotate_hours": 24,
+                "keep_segments": 7,
+                "compress": True,
+                "index_tokens": True,
+                "format": "text"
             }
         }
         
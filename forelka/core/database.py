@@ -1,92 +1,306 @@
 import sqlite3
 import asyncio
+import json
+import logging
 import threading
-from typing import Dict, List, Optional, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Callable, Tuple, TypeVar
 from contextlib import asynccontextmanager
 import os
 
+from .migrations import apply_pragmas, get_schema_version, migrate
+
+# Tables a file must have to be restored as the bot database
+REQUIRED_TABLES = ("accounts", "owners", "settings", "modules")
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Marks a buffered setting deletion
+_DELETED = object()
+
+# Bound parameters per IN (...) list, below SQLite's oldest default limit
+_IN_CHUNK = 500
+
+
+def _chunks(values: List[Any], size: int = _IN_CHUNK):
+    """Split values into IN (...) sized lists"""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _placeholders(values: List[Any]) -> str:
+    return ", ".join("?" for _ in values)
+
+
+def encode_setting(value: Any) -> str:
+    """Serialize a setting value as compact JSON"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def decode_setting(raw: Optional[str], encoded: bool = True) -> Any:
+    """Deserialize a setting value, legacy plain-text values stay strings"""
+    if raw is None or not encoded:
+        return raw
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "forelka.db"):
+    """SQLite storage running every query off the event loop
+    
+    Writes are serialized on a single dedicated thread, reads run on a
+    small pool of threads with their own connections. The database uses
+    WAL journaling so readers are never blocked by the writer, and the
+    schema is brought up to date by the versioned steps in ``migrations``.
+    
+    Settings and module registrations are buffered: repeated writes to the
+    same key are merged and flushed in one transaction after
+    ``flush_interval`` seconds or once ``flush_threshold`` writes are
+    pending. Readers of this instance always see buffered values, a batch
+    being committed included.
+    
+    Setting values keep their type (JSON serialized, legacy plain-text rows
+    stay strings) and every account's settings are loaded once into an
+    in-memory snapshot that serves reads.
+    """
+    
+    def __init__(self, db_path: str = "forelka.db", readers: int = 2,
+                 flush_interval: float = 0.5, flush_threshold: int = 256,
+                 synchronous: str = "NORMAL", cache_size_kib: int = 8192,
+                 journal_mode: str = "WAL", temp_store: str = "MEMORY"):
         self.db_path = db_path
+        self.readers = max(1, readers)
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.synchronous = synchronous
+        self.cache_size_kib = cache_size_kib
+        self.journal_mode = journal_mode
+        self.temp_store = temp_store
+        self.schema_version = 0
+        self._pending_settings: Dict[Tuple[int, str], Any] = {}
+        self._pending_modules: Dict[Tuple[int, str], Tuple[str, str, str]] = {}
+        # Batches handed to the writer thread and not committed yet
+        self._inflight_settings: Dict[Tuple[int, str], Any] = {}
+        self._inflight_modules: Dict[Tuple[int, str], Tuple[str, str, str]] = {}
+        # Batches committed while a settings read was running, see _read_settings
+        self._committed_settings: Dict[Tuple[int, str], Any] = {}
+        self._settings_reads = 0
+        self._restoring = False
+        self._settings: Dict[int, Dict[str, Any]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
         self._lock = threading.Lock()
         self._conn = None
+        self._local = threading.local()
+        self._generation = 0
+        self._connections: List[sqlite3.Connection] = []
+        self._write_executor: Optional[ThreadPoolExecutor] = None
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        self._owner_listeners: List[Callable[[int, int, Optional[bool]], None]] = []
         self._init_tables()
     
+    @classmethod
+    def from_config(cls, config) -> "DatabaseManager":
+        """Database of a ConfigManager: database_path and the "database" section"""
+        options = config.get_database_config()
+        return cls(
+            config.get("database_path", "forelka.db"),
+            readers=int(options.get("readers", 2)),
+            flush_interval=float(options.get("flush_interval", 0.5)),
+            flush_threshold=int(options.get("flush_threshold", 256)),
+            synchronous=options.get("synchronous", "NORMAL"),
+            cache_size_kib=int(options.get("cache_size_kib", 8192)),
+            journal_mode=options.get("journal_mode", "WAL"),
+            temp_store=options.get("temp_store", "MEMORY")
+        )
+    
+    def _pragmas(self, conn: sqlite3.Connection):
+        apply_pragmas(conn, self.synchronous, self.cache_size_kib, self.journal_mode, self.temp_store)
+    
     def _init_tables(self):
         with self._lock:
             conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS accounts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER UNIQUE NOT NULL,
-                    api_id TEXT NOT NULL,
-                    api_hash TEXT NOT NULL,
-                    prefix TEXT DEFAULT '.',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS owners (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    account_id INTEGER NOT NULL,
-                    owner_id INTEGER NOT NULL,
-                    is_admin BOOLEAN DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (account_id) REFERENCES accounts (id) ON DELETE CASCADE,
-                    UNIQUE(account_id, owner_id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS settings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    account_id INTEGER NOT NULL,
-                    key TEXT NOT NULL,
-                    value TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (account_id) REFERENCES accounts (id) ON DELETE CASCADE,
-                    UNIQUE(account_id, key)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS modules (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    account_id INTEGER NOT NULL,
-                    module_name TEXT NOT NULL,
-                    enabled BOOLEAN DEFAULT 1,
-                    version TEXT,
-                    developer TEXT,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (account_id) REFERENCES accounts (id) ON DELETE CASCADE,
-                    UNIQUE(account_id, module_name)
-                )
-            """)
-            
-            conn.commit()
+            self._pragmas(conn)
+            self.schema_version = migrate(conn)
             conn.close()
     
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        self._pragmas(conn)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+    
+    def _start_executors(self):
+        with self._lock:
+            if self._write_executor is None:
+                self._write_executor = ThreadPoolExecutor(1, thread_name_prefix="forelka-db-write")
+                self._read_executor = ThreadPoolExecutor(self.readers, thread_name_prefix="forelka-db-read")
+    
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Connection of the calling executor thread, reopened after a restore"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation != self._generation:
+            with self._lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
+            conn.close()
+            conn = None
+        
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            self._local.generation = self._generation
+        return conn
+    
+    def _execute(self, func: Callable[[sqlite3.Cursor], T], write: bool) -> T:
+        """Run a query function on the calling executor thread"""
+        conn = self._thread_connection()
+        
+        cursor = conn.cursor()
+        try:
+            result = func(cursor)
+            if write:
+                conn.commit()
+            return result
+        except Exception:
+            if write:
+                conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    
+    async def _read(self, func: Callable[[sqlite3.Cursor], T]) -> T:
+        if self._read_executor is None:
+            self._start_executors()
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._read_executor, self._execute, func, False)
+    
+    async def _write(self, func: Callable[[sqlite3.Cursor], T]) -> T:
+        if self._write_executor is None:
+            self._start_executors()
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._write_executor, self._execute, func, True)
+    
     async def initialize(self):
-        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self._conn.row_factory = sqlite3.Row
+        self._start_executors()
+    
+    def _schedule_flush(self, retry: bool = False):
+        pending = len(self._pending_settings) + len(self._pending_modules)
+        loop = asyncio.get_event_loop()
+        
+        if pending >= self.flush_threshold and not retry:
+            asyncio.ensure_future(self._background_flush())
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                self.flush_interval, lambda: asyncio.ensure_future(self._background_flush())
+            )
+    
+    async def _background_flush(self):
+        try:
+            await self.flush()
+        except Exception:
+            # Already logged, the writes were put back; try again after the interval
+            self._schedule_flush(retry=True)
+    
+    async def flush(self):
+        """Write all buffered settings and module registrations in one transaction
+        
+        With nothing buffered, waits for batches other flushes are still
+        committing.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        if self._restoring:
+            return  # Dropped when the restore finishes, see restore()
+        
+        if not self._pending_settings and not self._pending_modules:
+            if self._inflight_settings or self._inflight_modules:
+                # The writer thread runs jobs in order, an empty one waits for them
+                await self._write(lambda cursor: None)
+            return
+        
+        settings, self._pending_settings = self._pending_settings, {}
+        modules, self._pending_modules = self._pending_modules, {}
+        self._inflight_settings.update(settings)
+        self._inflight_modules.update(modules)
+        
+        upserts = [(a, k, v) for (a, k), v in settings.items() if v is not _DELETED]
+        deletes = [(a, k) for (a, k), v in settings.items() if v is _DELETED]
+        registrations = [(a, m) + info for (a, m), info in modules.items()]
+        
+        def query(cursor):
+            cursor.executemany("""
+                INSERT OR REPLACE INTO settings (account_id, key, value, encoded, updated_at)
+                VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)
+            """, upserts)
+            cursor.executemany("""
+                DELETE FROM settings WHERE account_id = ? AND key = ?
+            """, deletes)
+            # An upsert keeps the enabled flag, REPLACE would reset it to 1
+            cursor.executemany("""
+                INSERT INTO modules (account_id, module_name, version, developer, description, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(account_id, module_name) DO UPDATE SET
+                    version = excluded.version,
+                    developer = excluded.developer,
+                    description = excluded.description,
+                    updated_at = CURRENT_TIMESTAMP
+            """, registrations)
+        
+        try:
+            await self._write(query)
+        except Exception as e:
+            # Keep unflushed writes unless they were superseded meanwhile
+            for key, value in settings.items():
+                self._pending_settings.setdefault(key, value)
+            for key, info in modules.items():
+                self._pending_modules.setdefault(key, info)
+            logger.error(f"Failed to flush {len(settings) + len(modules)} buffered write(s): {e}")
+            raise
+        else:
+            if self._settings_reads:
+                self._committed_settings.update(settings)
+        finally:
+            # Later flushes of the same keys stay in flight
+            for key, value in settings.items():
+                if self._inflight_settings.get(key) is value:
+                    del self._inflight_settings[key]
+            for key, info in modules.items():
+                if self._inflight_modules.get(key) is info:
+                    del self._inflight_modules[key]
     
     async def close(self):
-        if self._conn:
-            self._conn.close()
+        await self.flush()
+        
+        with self._lock:
+            write_executor, read_executor = self._write_executor, self._read_executor
+            self._write_executor = self._read_executor = None
+        
+        for executor in (write_executor, read_executor):
+            if executor is not None:
+                executor.shutdown(wait=True)
+        
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._local = threading.local()
             self._conn = None
+        
+        self._settings.clear()
     
     @asynccontextmanager
     async def get_cursor(self):
+        """Cursor on the event loop thread, kept for modules using raw SQL"""
         if not self._conn:
-            await self.initialize()
+            self._conn = self._connect()
         
         cursor = self._conn.cursor()
         try:
@@ -98,111 +312,483 @@ class DatabaseManager:
         finally:
             cursor.close()
     
+    def _backup_to(self, target_path: str, pages: int,
+                   progress: Optional[Callable[[int, int], None]]) -> Dict[str, Any]:
+        """Copy the database page by page into target_path and verify the copy"""
+        started = time.monotonic()
+        partial_path = f"{target_path}.partial"
+        
+        source = sqlite3.connect(self.db_path, timeout=30)
+        target = sqlite3.connect(partial_path)
+        try:
+            # A read transaction pins one WAL snapshot for the whole copy,
+            # so commits made meanwhile neither tear nor restart it
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            
+            def on_step(status, remaining, total):
+                if progress is not None:
+                    progress(total - remaining, total)
+            
+            source.backup(target, pages=pages, progress=on_step)
+            source.rollback()
+            
+            result = target.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                raise sqlite3.DatabaseError(f"Backup integrity check failed: {result}")
+            
+            # Make the copy a single self-contained file
+            target.execute("PRAGMA journal_mode=DELETE")
+            page_count = target.execute("PRAGMA page_count").fetchone()[0]
+        except Exception:
+            target.close()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            source.close()
+        
+        target.close()
+        os.replace(partial_path, target_path)
+        
+        return {
+            "path": target_path,
+            "pages": page_count,
+            "size": os.path.getsize(target_path),
+            "elapsed": time.monotonic() - started
+        }
+    
+    async def backup(self, target_path: str, pages: int = 256,
+                     progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Create a consistent copy of the live database without blocking the loop
+        
+        Buffered writes are flushed first, then the SQLite online backup API
+        copies ``pages`` pages per step on a worker thread. ``progress`` is
+        called on the event loop with (copied pages, total pages). The copy
+        passes an integrity check before it appears at target_path.
+        """
+        await self.flush()
+        
+        loop = asyncio.get_event_loop()
+        
+        def on_progress(copied: int, total: int):
+            loop.call_soon_threadsafe(progress, copied, total)
+        
+        result = await loop.run_in_executor(
+            None, self._backup_to, target_path, pages, on_progress if progress else None
+        )
+        logger.info(f"Backed up {result['pages']} pages to {target_path} in {result['elapsed']:.2f}s")
+        return result
+    
+    @staticmethod
+    def validate_backup(path: str) -> int:
+        """Check that a file is an intact bot database, returns its schema version"""
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                raise sqlite3.DatabaseError(f"Integrity check failed: {result}")
+            
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            missing = [table for table in REQUIRED_TABLES if table not in tables]
+            if missing:
+                raise sqlite3.DatabaseError(f"Not a Forelka database, missing tables: {', '.join(missing)}")
+            
+            return get_schema_version(conn)
+        finally:
+            conn.close()
+    
+    def _restore_from(self, source_path: str) -> int:
+        """Replace the database contents on the writer thread"""
+        conn = self._thread_connection()
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+        try:
+            # One backup step is one write transaction on the live file:
+            # readers switch from the old to the new contents atomically
+            # and the WAL stays consistent, unlike renaming files under it
+            source.backup(conn)
+        finally:
+            source.close()
+        
+        version = migrate(conn)
+        
+        # Every thread reopens its connection on next use
+        self._generation += 1
+        return version
+    
+    async def restore(self, source_path: str) -> int:
+        """Restore the database from a backup file while the bot keeps running
+        
+        The backup is validated first, buffered writes are flushed, and the
+        swap runs as a job of the writer thread, so writes issued meanwhile
+        wait behind it. Settings and module registrations buffered from
+        then until the swap is done are discarded rather than flushed over
+        the restored data. Returns the schema version after migrating the
+        restored data. Cached settings are dropped, callers reload the
+        rest of their state.
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.validate_backup, source_path)
+        await self.flush()
+        
+        if self._write_executor is None:
+            self._start_executors()
+        
+        # No await between the flush and queuing the swap but the flush's
+        # own, writes buffered during it belong to the replaced data too
+        self._restoring = True
+        try:
+            self._discard_buffered()
+            self.schema_version = await loop.run_in_executor(
+                self._write_executor, self._restore_from, source_path
+            )
+        finally:
+            self._restoring = False
+            self._discard_buffered()
+        
+        if self._conn is not None:
+            with self._lock:
+                if self._conn in self._connections:
+                    self._connections.remove(self._conn)
+            self._conn.close()
+            self._conn = None
+        
+        self.invalidate_settings()
+        logger.info(f"Restored database from {source_path}")
+        return self.schema_version
+    
+    def _discard_buffered(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._pending_settings.clear()
+        self._pending_modules.clear()
+        self._committed_settings.clear()
+    
     async def add_account(self, user_id: int, api_id: str, api_hash: str, prefix: str = ".") -> int:
-        async with self.get_cursor() as cursor:
+        def query(cursor):
             cursor.execute("""
                 INSERT OR REPLACE INTO accounts (user_id, api_id, api_hash, prefix)
                 VALUES (?, ?, ?, ?)
             """, (user_id, api_id, api_hash, prefix))
             return cursor.lastrowid
+        
+        return await self._write(query)
     
     async def get_account_by_user_id(self, user_id: int) -> Optional[Dict[str, Any]]:
-        async with self.get_cursor() as cursor:
+        def query(cursor):
             cursor.execute("SELECT * FROM accounts WHERE user_id = ?", (user_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
+        
+        return await self._read(query)
     
     async def get_account_by_id(self, account_id: int) -> Optional[Dict[str, Any]]:
-        async with self.get_cursor() as cursor:
+        def query(cursor):
             cursor.execute("SELECT * FROM accounts WHERE id = ?", (account_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
+        
+        return await self._read(query)
     
     async def get_all_accounts(self) -> List[Dict[str, Any]]:
-        async with self.get_cursor() as cursor:
+        def query(cursor):
             cursor.execute("SELECT * FROM accounts")
             return [dict(row) for row in cursor.fetchall()]
+        
+        return await self._read(query)
     
     async def remove_account(self, account_id: int):
-        async with self.get_cursor() as cursor:
+        def query(cursor):
             cursor.execute("DELETE FROM accounts WHERE id = ?", (account_id,))
+        
+        return await self._write(query)
+    
+    def add_owner_listener(self, callback: Callable[[int, int, Optional[bool]], None]):
+        """Subscribe to owner changes, is_admin is None for removals"""
+        self._owner_listeners.append(callback)
+    
+    def _notify_owner_listeners(self, account_id: int, owner_id: int, is_admin: Optional[bool]):
+        for callback in self._owner_listeners:
+            callback(account_id, owner_id, is_admin)
     
     async def add_owner(self, account_id: int, owner_id: int, is_admin: bool = False):
-        async with self.get_cursor() as cursor:
+        def query(cursor):
             cursor.execute("""
                 INSERT OR REPLACE INTO owners (account_id, owner_id, is_admin)
                 VALUES (?, ?, ?)
             """, (account_id, owner_id, is_admin))
+        
+        await self._write(query)
+        self._notify_owner_listeners(account_id, owner_id, bool(is_admin))
     
     async def remove_owner(self, account_id: int, owner_id: int):
-        async with self.get_cursor() as cursor:
+        def query(cursor):
             cursor.execute("""
                 DELETE FROM owners WHERE account_id = ? AND owner_id = ?
             """, (account_id, owner_id))
+        
+        await self._write(query)
+        self._notify_owner_listeners(account_id, owner_id, None)
     
     async def get_owners(self, account_id: int) -> List[int]:
-        async with self.get_cursor() as cursor:
+        def query(cursor):
             cursor.execute("SELECT owner_id FROM owners WHERE account_id = ?", (account_id,))
             return [row[0] for row in cursor.fetchall()]
+        
+        return await self._read(query)
+    
+    async def get_owner_roles(self, account_ids: Optional[List[int]] = None) -> Dict[int, Dict[int, bool]]:
+        """Get {account_id: {owner_id: is_admin}} for the given accounts in one query"""
+        def query(cursor):
+            roles: Dict[int, Dict[int, bool]] = {}
+            
+            if account_ids is None:
+                cursor.execute("SELECT account_id, owner_id, is_admin FROM owners")
+                rows = cursor.fetchall()
+            else:
+                rows = []
+                for chunk in _chunks(list(account_ids)):
+                    cursor.execute(f"""
+                        SELECT account_id, owner_id, is_admin FROM owners
+                        WHERE account_id IN ({_placeholders(chunk)})
+                    """, chunk)
+                    rows.extend(cursor.fetchall())
+            
+            for row in rows:
+                roles.setdefault(row[0], {})[row[1]] = bool(row[2])
+            return roles
+        
+        return await self._read(query)
+    
+    async def get_owners_for_accounts(self, account_ids: List[int]) -> Dict[int, List[int]]:
+        """Get {account_id: [owner_id, ...]} for many accounts in one query"""
+        roles = await self.get_owner_roles(account_ids)
+        return {account_id: list(roles.get(account_id, {})) for account_id in account_ids}
     
     async def is_owner(self, account_id: int, user_id: int) -> bool:
-        async with self.get_cursor() as cursor:
+        def query(cursor):
             cursor.execute("""
                 SELECT 1 FROM owners WHERE account_id = ? AND owner_id = ?
             """, (account_id, user_id))
             return cursor.fetchone() is not None
+        
+        return await self._read(query)
+    
+    async def _read_settings(self, query: Callable[[sqlite3.Cursor], Dict[int, Dict[str, Any]]],
+                             keys: Optional[List[str]] = None) -> Dict[int, Dict[str, Any]]:
+        """Read settings rows and apply the writes they may not contain yet
+        
+        A batch committed while the query ran may or may not be in its
+        rows, so such batches are kept until no settings read is running
+        and applied like buffered ones.
+        """
+        self._settings_reads += 1
+        try:
+            loaded = await self._read(query)
+            self._overlay_pending(loaded, keys)
+            return loaded
+        finally:
+            self._settings_reads -= 1
+            if not self._settings_reads:
+                self._committed_settings.clear()
+    
+    def _overlay_pending(self, snapshots: Dict[int, Dict[str, Any]], keys: Optional[List[str]] = None):
+        """Apply committed, in-flight and buffered writes, oldest first, over rows just read"""
+        for writes in (self._committed_settings, self._inflight_settings, self._pending_settings):
+            for (account_id, key), raw in list(writes.items()):
+                snapshot = snapshots.get(account_id)
+                if snapshot is None or (keys is not None and key not in keys):
+                    continue
+                if raw is _DELETED:
+                    snapshot.pop(key, None)
+                else:
+                    snapshot[key] = decode_setting(raw)
+    
+    async def load_settings(self, account_ids: List[int]):
+        """Load the settings snapshots of many accounts in one query"""
+        missing = [account_id for account_id in dict.fromkeys(account_ids)
+                   if account_id not in self._settings]
+        if not missing:
+            return
+        
+        def query(cursor):
+            loaded: Dict[int, Dict[str, Any]] = {account_id: {} for account_id in missing}
+            for chunk in _chunks(missing):
+                cursor.execute(f"""
+                    SELECT account_id, key, value, encoded FROM settings
+                    WHERE account_id IN ({_placeholders(chunk)})
+                """, chunk)
+                for row in cursor.fetchall():
+                    loaded[row[0]][row[1]] = decode_setting(row[2], row[3])
+            return loaded
+        
+        loaded = await self._read_settings(query)
+        for account_id, snapshot in loaded.items():
+            self._settings.setdefault(account_id, snapshot)
+    
+    async def _account_settings(self, account_id: int) -> Dict[str, Any]:
+        """Get the settings snapshot of an account, loading it with one query"""
+        snapshot = self._settings.get(account_id)
+        if snapshot is None:
+            await self.load_settings([account_id])
+            snapshot = self._settings.setdefault(account_id, {})
+        return snapshot
+    
+    def invalidate_settings(self, account_id: Optional[int] = None):
+        """Drop cached settings snapshots so the next read reloads them"""
+        if account_id is None:
+            self._settings.clear()
+        else:
+            self._settings.pop(account_id, None)
     
     async def set_setting(self, account_id: int, key: str, value: Any):
-        async with self.get_cursor() as cursor:
-            cursor.execute("""
-                INSERT OR REPLACE INTO settings (account_id, key, value, updated_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-            """, (account_id, key, str(value)))
+        raw = encode_setting(value)
+        self._pending_settings[(account_id, key)] = raw
+        
+        snapshot = self._settings.get(account_id)
+        if snapshot is not None:
+            snapshot[key] = decode_setting(raw)
+        
+        self._schedule_flush()
     
     async def get_setting(self, account_id: int, key: str, default: Any = None) -> Any:
-        async with self.get_cursor() as cursor:
-            cursor.execute("""
-                SELECT value FROM settings WHERE account_id = ? AND key = ?
-            """, (account_id, key))
-            row = cursor.fetchone()
-            return row[0] if row else default
+        return (await self._account_settings(account_id)).get(key, default)
+    
+    async def delete_setting(self, account_id: int, key: str):
+        self._pending_settings[(account_id, key)] = _DELETED
+        
+        snapshot = self._settings.get(account_id)
+        if snapshot is not None:
+            snapshot.pop(key, None)
+        
+        self._schedule_flush()
     
     async def get_all_settings(self, account_id: int) -> Dict[str, Any]:
-        async with self.get_cursor() as cursor:
-            cursor.execute("SELECT key, value FROM settings WHERE account_id = ?", (account_id,))
-            return {row[0]: row[1] for row in cursor.fetchall()}
+        return dict(await self._account_settings(account_id))
+    
+    async def get_settings_by_prefix(self, account_id: int, prefix: str) -> Dict[str, Any]:
+        """Get the settings whose key starts with prefix"""
+        snapshot = await self._account_settings(account_id)
+        return {key: value for key, value in snapshot.items() if key.startswith(prefix)}
+    
+    async def get_settings_for_keys(self, account_ids: List[int], keys: List[str]) -> Dict[int, Dict[str, Any]]:
+        """Get {account_id: {key: value}} of the given keys for many accounts
+        
+        Accounts with a loaded snapshot are served from memory, the rest
+        are read with one query without loading their full snapshots.
+        """
+        keys = list(dict.fromkeys(keys))
+        result: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        
+        for account_id in dict.fromkeys(account_ids):
+            snapshot = self._settings.get(account_id)
+            if snapshot is None:
+                missing.append(account_id)
+            else:
+                result[account_id] = {key: snapshot[key] for key in keys if key in snapshot}
+        
+        if not missing or not keys:
+            result.update((account_id, {}) for account_id in missing)
+            return result
+        
+        def query(cursor):
+            loaded: Dict[int, Dict[str, Any]] = {account_id: {} for account_id in missing}
+            for chunk in _chunks(missing, max(1, _IN_CHUNK - len(keys))):
+                cursor.execute(f"""
+                    SELECT account_id, key, value, encoded FROM settings
+                    WHERE account_id IN ({_placeholders(chunk)}) AND key IN ({_placeholders(keys)})
+                """, chunk + keys)
+                for row in cursor.fetchall():
+                    loaded[row[0]][row[1]] = decode_setting(row[2], row[3])
+            return loaded
+        
+        loaded = await self._read_settings(query, keys)
+        result.update(loaded)
+        return result
     
     async def register_module(self, account_id: int, module_name: str, version: str = "1.0", 
                             developer: str = "Unknown", description: str = ""):
-        async with self.get_cursor() as cursor:
-            cursor.execute("""
-                INSERT OR REPLACE INTO modules (account_id, module_name, version, developer, description, updated_at)
-                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (account_id, module_name, version, developer, description))
+        self._pending_modules[(account_id, module_name)] = (version, developer, description)
+        self._schedule_flush()
     
     async def enable_module(self, account_id: int, module_name: str):
-        async with self.get_cursor() as cursor:
+        await self.flush()
+        
+        def query(cursor):
             cursor.execute("""
                 UPDATE modules SET enabled = 1 WHERE account_id = ? AND module_name = ?
             """, (account_id, module_name))
+        
+        return await self._write(query)
     
     async def disable_module(self, account_id: int, module_name: str):
-        async with self.get_cursor() as cursor:
+        await self.flush()
+        
+        def query(cursor):
             cursor.execute("""
                 UPDATE modules SET enabled = 0 WHERE account_id = ? AND module_name = ?
             """, (account_id, module_name))
+        
+        return await self._write(query)
     
     async def get_enabled_modules(self, account_id: int) -> List[str]:
-        async with self.get_cursor() as cursor:
+        if self._pending_modules or self._inflight_modules:
+            await self.flush()
+        
+        def query(cursor):
             cursor.execute("""
                 SELECT module_name FROM modules WHERE account_id = ? AND enabled = 1
             """, (account_id,))
             return [row[0] for row in cursor.fetchall()]
+        
+        return await self._read(query)
+    
+    async def get_disabled_modules(self, account_id: int) -> List[str]:
+        if self._pending_modules or self._inflight_modules:
+            await self.flush()
+        
+        def query(cursor):
+            cursor.execute("""
+                SELECT module_name FROM modules WHERE account_id = ? AND enabled = 0
+            """, (account_id,))
+            return [row[0] for row in cursor.fetchall()]
+        
+        return await self._read(query)
     
     async def get_module_info(self, account_id: int, module_name: str) -> Optional[Dict[str, Any]]:
-        async with self.get_cursor() as cursor:
+        if self._pending_modules or self._inflight_modules:
+            await self.flush()
+        
+        def query(cursor):
             cursor.execute("""
                 SELECT * FROM modules WHERE account_id = ? AND module_name = ?
             """, (account_id, module_name))
             row = cursor.fetchone()
-            return dict(row) if row else None
\ No newline at end of file
+            return dict(row) if row else None
+        
+        return await self._read(query)
+    
+    async def get_modules_for_accounts(self, account_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Get {account_id: [module row, ...]} for many accounts in one query"""
+        if self._pending_modules or self._inflight_modules:
+            await self.flush()
+        
+        ids = list(dict.fromkeys(account_ids))
+        
+        def query(cursor):
+            grouped: Dict[int, List[Dict[str, Any]]] = {account_id: [] for account_id in ids}
+            for chunk in _chunks(ids):
+                cursor.execute(f"""
+                    SELECT * FROM modules WHERE account_id IN ({_placeholders(chunk)})
+                    ORDER BY account_id, module_name
+                """, chunk)
+                for row in cursor.fetchall():
+                    grouped[row["account_id"]].append(dict(row))
+            return grouped
+        
+        return await self._read(query)
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+Per-account command dispatch index for Forelka Userbot
+"""
+
+import re
+from typing import Dict, Iterable, Optional, Pattern, Set, Tuple, Any
+
+
+class DispatchIndex:
+    """Compiled command table of a single account
+    
+    Every token the account can type (command names, global aliases and
+    account aliases) maps straight to its command spec, so resolving a
+    message is one regex match and one dict lookup.
+    """
+    
+    def __init__(self, account_id: Optional[int], prefix: str,
+                 commands: Dict[str, Dict[str, Any]], global_aliases: Dict[str, str]):
+        self.account_id = account_id
+        self.commands = commands
+        self.global_aliases = global_aliases
+        self.aliases: Dict[str, str] = {}
+        self.disabled_modules: Set[str] = set()
+        
+        self._table: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.prefix = prefix
+        self._pattern: Pattern = self._compile_pattern(prefix)
+    
+    @staticmethod
+    def _compile_pattern(prefix: str) -> Pattern:
+        return re.compile(re.escape(prefix) + r"\s*(\S+)")
+    
+    def set_prefix(self, prefix: str):
+        """Change the command prefix of the account"""
+        self.prefix = prefix
+        self._pattern = self._compile_pattern(prefix)
+    
+    def rebuild(self):
+        """Recompile the whole table from the registry"""
+        self._table.clear()
+        tokens = set(self.commands) | set(self.global_aliases) | set(self.aliases)
+        for token in tokens:
+            self._refresh_token(token)
+    
+    def _target(self, token: str) -> str:
+        if token in self.aliases:
+            return self.aliases[token]
+        return self.global_aliases.get(token, token)
+    
+    def _refresh_token(self, token: str):
+        name = self._target(token)
+        command = self.commands.get(name)
+        
+        if command is None or command.get("module") in self.disabled_modules:
+            self._table.pop(token, None)
+        else:
+            self._table[token] = (name, command)
+    
+    def _tokens_for(self, name: str) -> Iterable[str]:
+        """Tokens that may resolve to the given command name"""
+        tokens = {name}
+        tokens.update(alias for alias, target in self.global_aliases.items() if target == name)
+        tokens.update(alias for alias, target in self.aliases.items() if target == name)
+        return tokens
+    
+    def refresh_command(self, name: str):
+        """Update every entry that points to a (un)registered command"""
+        for token in self._tokens_for(name):
+            self._refresh_token(token)
+    
+    def refresh_alias(self, alias: str):
+        """Update the entry of a changed global alias"""
+        self._refresh_token(alias)
+    
+    def add_alias(self, alias: str, command: str):
+        """Add an account alias"""
+        self.aliases[alias] = command
+        self._refresh_token(alias)
+    
+    def remove_alias(self, alias: str):
+        """Remove an account alias"""
+        if self.aliases.pop(alias, None) is not None:
+            self._refresh_token(alias)
+    
+    def set_module_enabled(self, module: str, enabled: bool):
+        """Enable or disable every command of a module for the account"""
+        if enabled:
+            self.disabled_modules.discard(module)
+        else:
+            self.disabled_modules.add(module)
+        
+        for name, command in self.commands.items():
+            if command.get("module") == module:
+                self.refresh_command(name)
+    
+    def resolve(self, text: str) -> Optional[Tuple[str, Dict[str, Any], int]]:
+        """Resolve message text to (command name, spec, arguments offset)"""
+        match = self._pattern.match(text)
+        if match is None:
+            return None
+        
+        entry = self._table.get(match.group(1).lower())
+        if entry is None:
+            return None
+        
+        return entry[0], entry[1], match.end()
+    
+    def __contains__(self, token: str) -> bool:
+        return token in self._table
+    
+    def __len__(self) -> int:
+        return len(self._table)
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+Message event subscriptions for Forelka Userbot
+"""
+
+import itertools
+import logging
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Pattern, Set, Tuple, Union
+
+from pyrogram import Client, filters
+from pyrogram.types import Message
+
+from .logger import command_context
+
+logger = logging.getLogger(__name__)
+
+# \1, (?P=name) and (?(1)...) break once patterns are joined and renumbered
+_GROUP_REFERENCE = re.compile(r"\\\d|\(\?P=|\(\?\(")
+
+
+class Subscription:
+    """Filters of one module callback, None means "any" """
+    
+    __slots__ = ("id", "module", "callback", "chats", "users", "regex", "media",
+                 "outgoing", "accounts", "timeout")
+    
+    def __init__(self, subscription_id: int, module: str, callback: Callable,
+                 chats: Optional[Set[int]] = None, users: Optional[Set[int]] = None,
+                 regex: Optional[Pattern] = None, media: Optional[Set[str]] = None,
+                 outgoing: Optional[bool] = None, accounts: Optional[Set[int]] = None,
+                 timeout: Optional[float] = None):
+        self.id = subscription_id
+        self.module = module
+        self.callback = callback
+        self.chats = chats
+        self.users = users
+        self.regex = regex
+        self.media = media
+        self.outgoing = outgoing
+        self.accounts = accounts
+        self.timeout = timeout
+    
+    def matches(self, chat_id: Any, user_id: Any, media: str, text: Optional[str],
+                outgoing: bool) -> Tuple[bool, Optional[re.Match]]:
+        """Check every filter, returns (matched, regex match)"""
+        if self.chats is not None and chat_id not in self.chats:
+            return False, None
+        if self.users is not None and user_id not in self.users:
+            return False, None
+        if self.media is not None and media not in self.media:
+            return False, None
+        if self.outgoing is not None and outgoing != self.outgoing:
+            return False, None
+        
+        if self.regex is None:
+            return True, None
+        match = self.regex.search(text) if text else None
+        return match is not None, match
+
+
+class MatchingStage:
+    """Subscriptions of one account compiled for matching
+    
+    Each subscription is indexed by its most selective filter: chat ids,
+    then sender ids, then media type. An update only checks the buckets
+    of its chat, sender and media plus the unindexed rest, and the regexes
+    of the rest are first tried as one combined pattern, so updates that
+    concern nobody cost a few dict lookups. Patterns that refer to their
+    own groups by number or name cannot be combined, they are always
+    tried one by one.
+    """
+    
+    def __init__(self, subscriptions: Iterable[Subscription]):
+        self.by_chat: Dict[Any, List[Subscription]] = {}
+        self.by_user: Dict[Any, List[Subscription]] = {}
+        self.by_media: Dict[str, List[Subscription]] = {}
+        self.plain: List[Subscription] = []
+        self.textual: List[Subscription] = []
+        # Textual subscriptions the prefilter does not cover
+        self.unfiltered: List[Subscription] = []
+        self.prefilter: Optional[Pattern] = None
+        
+        for subscription in subscriptions:
+            if subscription.chats is not None:
+                for chat_id in subscription.chats:
+                    self.by_chat.setdefault(chat_id, []).append(subscription)
+            elif subscription.users is not None:
+                for user_id in subscription.users:
+                    self.by_user.setdefault(user_id, []).append(subscription)
+            elif subscription.media is not None:
+                for media in subscription.media:
+                    self.by_media.setdefault(media, []).append(subscription)
+            elif subscription.regex is not None:
+                self.textual.append(subscription)
+            else:
+                self.plain.append(subscription)
+        
+        combinable = [s for s in self.textual if not _GROUP_REFERENCE.search(s.regex.pattern)]
+        patterns = {s.regex.pattern: s.regex.flags for s in combinable}
+        if patterns and len(set(patterns.values())) == 1:
+            try:
+                self.prefilter = re.compile("|".join(f"(?:{p})" for p in patterns),
+                                            next(iter(patterns.values())))
+            except re.error:
+                self.prefilter = None  # e.g. global inline flags, check one by one
+        
+        if self.prefilter is None:
+            self.unfiltered = self.textual
+        else:
+            self.unfiltered = [s for s in self.textual if s not in combinable]
+    
+    def match(self, message: Message) -> List[Tuple[Subscription, Optional[re.Match]]]:
+        """Subscriptions that want the message, in subscription order"""
+        chat_id = message.chat.id if message.chat else None
+        sender = message.from_user or message.sender_chat
+        user_id = sender.id if sender else None
+        media = message.media
+        media = getattr(media, "value", media) or ("text" if message.text else "")
+        text = message.text or message.caption
+        outgoing = bool(message.outgoing)
+        
+        candidates = list(self.plain)
+        candidates += self.by_chat.get(chat_id, ())
+        candidates += self.by_user.get(user_id, ())
+        candidates += self.by_media.get(media, ())
+        if self.textual and text:
+            if self.prefilter is None or self.prefilter.search(text):
+                candidates += self.textual
+            else:
+                candidates += self.unfiltered
+        
+        matched = []
+        for subscription in sorted(candidates, key=lambda s: s.id):
+            ok, regex_match = subscription.matches(chat_id, user_id, media, text, outgoing)
+            if ok:
+                matched.append((subscription, regex_match))
+        return matched
+
+
+def _id_set(values) -> Optional[Set[Any]]:
+    if values is None:
+        return None
+    if isinstance(values, (int, str)):
+        values = [values]
+    return set(values)
+
+
+class EventRouter:
+    """Module subscriptions to ordinary messages
+    
+    Every account has a single message handler; its matching stage is
+    compiled on first use after subscriptions change and fans each update
+    out to the matching callbacks only. Callbacks are called as
+    ``callback(client, message, match)``, match being the regex match or
+    None, and run through the command scheduler, ordered per chat.
+    """
+    
+    def __init__(self, handler):
+        self.handler = handler
+        self.subscriptions: Dict[int, Subscription] = {}
+        self._stages: Dict[Optional[int], MatchingStage] = {}
+        self._ids = itertools.count(1)
+    
+    def subscribe(self, module: str, callback: Callable,
+                  chats: Union[int, Iterable[int], None] = None,
+                  users: Union[int, Iterable[int], None] = None,
+                  regex: Union[str, Pattern, None] = None,
+                  media: Union[str, Iterable[str], None] = None,
+                  outgoing: Optional[bool] = None,
+                  accounts: Union[int, Iterable[int], None] = None,
+                  timeout: Optional[float] = None) -> int:
+        """Subscribe a module callback, returns the subscription id
+        
+        media takes pyrogram media type values ("photo", "video",
+        "document", ...) or "text" for plain text messages.
+        """
+        if isinstance(regex, str):
+            regex = re.compile(regex)
+        
+        media_types = _id_set(media)
+        subscription = Subscription(
+            next(self._ids), module, callback,
+            chats=_id_set(chats), users=_id_set(users), regex=regex,
+            media={str(getattr(m, "value", m)) for m in media_types} if media_types is not None else None,
+            outgoing=outgoing, accounts=_id_set(accounts), timeout=timeout
+        )
+        self.subscriptions[subscription.id] = subscription
+        self._stages.clear()
+        return subscription.id
+    
+    def unsubscribe(self, subscription_id: int) -> bool:
+        if self.subscriptions.pop(subscription_id, None) is None:
+            return False
+        self._stages.clear()
+        return True
+    
+    def unsubscribe_module(self, module: str) -> int:
+        """Drop every subscription of a module"""
+        ids = self.module_subscriptions(module)
+        for subscription_id in ids:
+            del self.subscriptions[subscription_id]
+        if ids:
+            self._stages.clear()
+        return len(ids)
+    
+    def module_subscriptions(self, module: str) -> List[int]:
+        return [s.id for s in self.subscriptions.values() if s.module == module]
+    
+    def stage(self, account_id: Optional[int]) -> MatchingStage:
+        """Compiled matching stage of an account"""
+        stage = self._stages.get(account_id)
+        if stage is None:
+            stage = self._stages[account_id] = MatchingStage(
+                s for s in self.subscriptions.values()
+                if s.accounts is None or account_id in s.accounts
+            )
+        return stage
+    
+    def build_filter(self, account_id: int) -> filters.Filter:
+        """Let updates through only while the account has subscribers"""
+        async def has_subscribers(flt, client: Client, message: Message) -> bool:
+            stage = self.stage(account_id)
+            return bool(stage.plain or stage.textual or stage.by_chat or stage.by_user or stage.by_media)
+        
+        return filters.create(has_subscribers, "ForelkaEventFilter")
+    
+    def create_message_handler(self):
+        """Create the per-account message handler of subscriptions"""
+        async def handle_event(client: Client, message: Message):
+            account_id = getattr(client, 'account_id', None)
+            matched = self.stage(account_id).match(message)
+            if not matched:
+                return
+            
+            disabled = self.handler.get_index(account_id).disabled_modules
+            chat_id = message.chat.id if message.chat else None
+            
+            for subscription, match in matched:
+                if subscription.module in disabled:
+                    continue
+                
+                # Ordered per chat among events, without waiting for commands
+                self.handler.scheduler.submit(
+                    account_id, ("event", chat_id), f"event:{subscription.module}",
+                    lambda s=subscription, m=match: self._run(client, message, s, m),
+                    subscription.timeout
+                )
+        
+        return handle_event
+    
+    async def _run(self, client: Client, message: Message, subscription: Subscription,
+                   match: Optional[re.Match]):
+        name = f"event:{subscription.module}"
+        failed = True
+        started = time.perf_counter()
+        context = command_context.set((getattr(client, 'account_id', None), subscription.module, name, started))
+        try:
+            await self.handler.accounting.run(subscription.module, subscription.callback(client, message, match))
+            failed = False
+        except Exception as e:
+            logger.error(f"Event handler of module {subscription.module} failed: {e}", exc_info=e)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.handler.metrics.record(name, subscription.module, duration_ms, failed)
+            command_context.reset(context)
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+Reading the log of Forelka Userbot across rotated segments
+"""
+
+import gzip
+import json
+import os
+import re
+from collections import deque
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+DEFAULT_LOG_FILE = "forelka.log"
+
+# Tail reads step back from the end of the file this much at a time
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# Context fields of structured (JSON) records, see logger.log_context
+CONTEXT_FIELDS = ("account", "module", "command", "latency_ms")
+
+# forelka.log.20240131-235959, forelka.log.20240131-235959-2.gz, ...
+_SEGMENT_SUFFIX = re.compile(r"\.(\d{8}-\d{6}(?:-\d+)?)(\.gz)?$")
+
+
+def segment_name(log_file: str, stamp: str) -> str:
+    """Free name for a segment rotated at stamp (%Y%m%d-%H%M%S)"""
+    name, counter = f"{log_file}.{stamp}", 1
+    while os.path.exists(name) or os.path.exists(name + ".gz"):
+        counter += 1
+        name = f"{log_file}.{stamp}-{counter}"
+    return name
+
+
+def index_path(path: str) -> str:
+    """Sidecar search index of a segment, shared by its plain and gzipped forms"""
+    if path.endswith(".gz"):
+        path = path[:-3]
+    return path + ".idx"
+
+
+def rotated_segments(log_file: str = DEFAULT_LOG_FILE) -> List[str]:
+    """Rotated segments of a log, oldest first
+    
+    A segment that is being compressed exists twice for a moment, the
+    plain file is used then.
+    """
+    directory = os.path.dirname(log_file) or "."
+    base = os.path.basename(log_file)
+    
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    
+    segments = {}
+    for name in names:
+        if not name.startswith(base):
+            continue
+        match = _SEGMENT_SUFFIX.fullmatch(name[len(base):])
+        if match is None:
+            continue
+        stamp = match.group(1)
+        if stamp not in segments or not match.group(2):
+            segments[stamp] = os.path.join(directory, name)
+    
+    def order(stamp: str):
+        return stamp[:15], int(stamp[16:] or 1)
+    
+    return [segments[stamp] for stamp in sorted(segments, key=order)]
+
+
+def log_segments(log_file: str = DEFAULT_LOG_FILE) -> List[str]:
+    """Rotated segments and the current file, oldest first"""
+    segments = rotated_segments(log_file)
+    if os.path.exists(log_file):
+        segments.append(log_file)
+    return segments
+
+
+def log_exists(log_file: str = DEFAULT_LOG_FILE) -> bool:
+    return bool(log_segments(log_file))
+
+
+def open_segment(path: str) -> IO[str]:
+    """Open a segment as text, compressed or not
+    
+    Falls back to the compressed file when the plain one was compressed
+    since it was listed.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    try:
+        return open(path, "r", encoding="utf-8", errors="replace")
+    except FileNotFoundError:
+        if not _SEGMENT_SUFFIX.search(path):
+            raise
+        return gzip.open(path + ".gz", "rt", encoding="utf-8", errors="replace")
+
+
+def iter_lines(log_file: str = DEFAULT_LOG_FILE) -> Iterator[str]:
+    """Every line of the log, segments read as one stream"""
+    for path in log_segments(log_file):
+        try:
+            with open_segment(path) as f:
+                yield from f
+        except FileNotFoundError:
+            continue  # Removed by retention meanwhile
+
+
+def _tail_plain(path: str, count: int, block_size: int = TAIL_BLOCK_SIZE) -> List[str]:
+    """Last count lines of an uncompressed file, read backwards in blocks"""
+    blocks: List[bytes] = []
+    newlines = 0
+    
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        # One newline more than lines wanted marks where the first one starts
+        while position > 0 and newlines <= count:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+    
+    lines = b"".join(reversed(blocks)).decode("utf-8", errors="replace").splitlines(keepends=True)
+    if position > 0:
+        lines = lines[1:]  # Partial, possibly cut inside a character
+    return lines[-count:]
+
+
+def _tail_compressed(path: str, count: int) -> List[str]:
+    """gzip cannot seek backwards, the segment is streamed through once"""
+    with open_segment(path) as f:
+        return list(deque(f, maxlen=count))
+
+
+def tail_lines(log_file: str = DEFAULT_LOG_FILE, count: int = 100) -> List[str]:
+    """Last count lines of the log, reading segments from the newest
+    
+    The current file and plain segments are read backwards from their end,
+    so the cost depends on the lines asked for, not on the file size.
+    Compressed segments are only read when the newer ones are too short.
+    """
+    lines: List[str] = []
+    if count <= 0:
+        return lines
+    
+    for path in reversed(log_segments(log_file)):
+        wanted = count - len(lines)
+        if wanted <= 0:
+            break
+        try:
+            if path.endswith(".gz"):
+                segment = _tail_compressed(path, wanted)
+            else:
+                segment = _tail_plain(path, wanted)
+        except FileNotFoundError:
+            if path.endswith(".gz") or not _SEGMENT_SUFFIX.search(path):
+                continue  # Removed by retention meanwhile
+            segment = _tail_compressed(path + ".gz", wanted)
+        
+        if lines and segment and not segment[-1].endswith("\n"):
+            segment[-1] += "\n"
+        lines[:0] = segment
+    return lines
+
+
+def parse_structured(line: str) -> Optional[Dict[str, Any]]:
+    """Fields of a JSON log line, None for text lines"""
+    if not line.startswith("{"):
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def render_line(line: str) -> str:
+    """A JSON log line in the text layout, context fields appended; text lines as they are"""
+    entry = parse_structured(line)
+    if entry is None:
+        return line
+    
+    text = f"{entry.get('time')} - {entry.get('logger')} - {entry.get('level')} - {entry.get('message')}"
+    context = " ".join(f"{field}={entry[field]}" for field in CONTEXT_FIELDS if field in entry)
+    if context:
+        text += f" [{context}]"
+    if entry.get("exc"):
+        text += "\n" + entry["exc"]
+    return text + "\n" if line.endswith("\n") else text
\ No newline at end of file
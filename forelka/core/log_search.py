@@ -0,0 +1,672 @@
+"""
+Indexed search over the log of Forelka Userbot
+"""
+
+import base64
+import gzip
+import json
+import os
+import re
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .log_reader import (CONTEXT_FIELDS, DEFAULT_LOG_FILE, index_path, log_segments, open_segment,
+                         parse_structured, render_line)
+
+# Lines are indexed in blocks of about this many bytes
+INDEX_BLOCK_SIZE = 64 * 1024
+
+BLOOM_HASHES = 4
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+# "2024-01-31 23:59:59 - name - LEVEL - message", see TerminalLogger
+_RECORD = re.compile(r"(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) - (.+?) - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - ")
+# {"time": ..., "level": ..., "logger": ..., see logger.JsonFormatter
+_JSON_RECORD = re.compile(r'\{"time": "([^"]+)", "level": "(DEBUG|INFO|WARNING|ERROR|CRITICAL)", '
+                          r'"logger": "((?:[^"\\]|\\.)*)"')
+
+# Context fields the index keeps the values of, see logger.log_context
+FIELDS = ("account", "module", "command")
+# A block with more distinct values of a field than this matches any value
+FIELD_VALUES_LIMIT = 64
+
+_REGEX_SPECIAL = set(".^$*+?{}[]\\|()")
+_RELATIVE_TIME = re.compile(r"(\d+)([smhdw])")
+_TIME_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_record(line: str) -> Optional[Tuple[str, str, str]]:
+    """(time, logger, level) of a line that starts a log record
+    
+    Other lines (tracebacks, captured prints) belong to the record
+    before them.
+    """
+    match = _RECORD.match(line)
+    if match is not None:
+        return match.group(1), match.group(2), match.group(3)
+    
+    match = _JSON_RECORD.match(line)
+    if match is not None:
+        return match.group(1), match.group(3), match.group(2)
+    return None
+
+
+def _first_record(path: str, limit: int = INDEX_BLOCK_SIZE) -> Optional[Tuple[str, str]]:
+    """(time, line) of the first record of a segment, looked for in its first limit bytes"""
+    try:
+        with open_segment(path) as f:
+            read = 0
+            for line in f:
+                record = parse_record(line)
+                if record is not None:
+                    return record[0], line
+                read += len(line)
+                if read >= limit:
+                    break
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def first_record_time(path: str) -> Optional[str]:
+    """Time of the first record of a segment"""
+    first = _first_record(path)
+    return first[0] if first is not None else None
+
+
+def _level_bit(level: Optional[str]) -> int:
+    return 1 << (LEVELS[level] // 10) if level else 1
+
+
+def _level_mask(min_level: str) -> int:
+    mask = 0
+    for level, number in LEVELS.items():
+        if number >= LEVELS[min_level]:
+            mask |= _level_bit(level)
+    return mask
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _bloom_positions(trigram: str, size: int) -> Iterable[int]:
+    data = trigram.encode("utf-8")
+    first = zlib.crc32(data)
+    step = zlib.crc32(data, 0x5BD1E995) | 1
+    return ((first + i * step) % size for i in range(BLOOM_HASHES))
+
+
+def _build_bloom(grams: Set[str]) -> bytes:
+    # About ten bits per trigram keeps false positives near 1%
+    size = 256
+    while size < len(grams) * 10 and size < 1 << 19:
+        size <<= 1
+    
+    bits = bytearray(size // 8)
+    for gram in grams:
+        for position in _bloom_positions(gram, size):
+            bits[position >> 3] |= 1 << (position & 7)
+    return bytes(bits)
+
+
+def _bloom_contains(bits: bytes, grams: Iterable[str]) -> bool:
+    size = len(bits) * 8
+    return all(
+        bits[position >> 3] & (1 << (position & 7))
+        for gram in grams for position in _bloom_positions(gram, size)
+    )
+
+
+def regex_literals(pattern: str) -> List[str]:
+    """Literal runs every match of a regex must contain
+    
+    Conservative: alternations give nothing, groups and classes are
+    skipped, and a character followed by an optional quantifier is not
+    required.
+    """
+    if "|" in pattern:
+        return []
+    
+    runs, current, depth, i = [], "", 0, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            i += 2
+            if depth == 0 and not escaped.isalnum():
+                current += escaped
+                continue
+            runs.append(current)
+            current = ""
+            continue
+        
+        i += 1
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth = max(0, depth - 1)
+        elif depth == 0 and char not in _REGEX_SPECIAL:
+            current += char
+            continue
+        elif char in "?*{":
+            current = current[:-1]
+            if char == "{":
+                i = pattern.find("}", i) + 1 or len(pattern)
+        
+        runs.append(current)
+        current = ""
+    
+    runs.append(current)
+    return [run for run in runs if len(run) >= 3]
+
+
+def normalize_time(value: Any, end: bool = False) -> Optional[str]:
+    """Log timestamp string for a datetime, "2024-01-31[ 23:59[:59]]" or "2h" ago
+    
+    A bare date means its start, or its end when end is true.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    
+    value = str(value).strip().replace("T", " ")
+    relative = _RELATIVE_TIME.fullmatch(value)
+    if relative is not None:
+        delta = timedelta(**{_TIME_UNITS[relative.group(2)]: int(relative.group(1))})
+        return (datetime.now() - delta).strftime("%Y-%m-%d %H:%M:%S")
+    
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            moment = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and end:
+            moment += timedelta(days=1, seconds=-1)
+        elif fmt == "%Y-%m-%d %H:%M" and end:
+            moment += timedelta(seconds=59)
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+    
+    raise ValueError(f"Unknown time {value!r}, use 2024-01-31, 2024-01-31T12:00 or 2h")
+
+
+def parse_query(query: str) -> Dict[str, Any]:
+    """Search arguments from "level:error since:2h module:notes after:CURSOR text or /regex/" """
+    options: Dict[str, Any] = {}
+    words = []
+    
+    for word in query.split():
+        key, _, value = word.partition(":")
+        key = key.lower()
+        if value and key == "level":
+            options["level"] = value.upper()
+        elif value and key in ("since", "until"):
+            options[key] = value
+        elif value and key == "after":
+            options["cursor"] = value
+        elif value and key in FIELDS:
+            options.setdefault("fields", {})[key] = value
+        else:
+            words.append(word)
+    
+    text = " ".join(words)
+    if len(text) > 1 and text.startswith("/") and text.endswith("/"):
+        options["regex"] = text[1:-1]
+    elif text:
+        options["text"] = text
+    return options
+
+
+class _BlockBuilder:
+    """Summary of consecutive lines: byte range, times, levels, trigrams and context fields"""
+    
+    def __init__(self, start: int, ts: Optional[str], level: Optional[str], tokens: bool):
+        self.start = self.end = start
+        self.ts, self.level = ts, level
+        self.first = self.last = ts
+        self.start_ts, self.start_level = ts, level
+        self.levels = 0
+        self.grams: Optional[Set[str]] = set() if tokens else None
+        self.fields: Dict[str, Optional[Set[str]]] = {}
+    
+    def add(self, line: str, size: int):
+        record = parse_record(line)
+        if record is not None:
+            self.ts, _, self.level = record
+            if self.first is None:
+                self.first = self.ts
+            self.last = self.ts
+            if line.startswith("{"):
+                self._add_fields(parse_structured(line))
+        
+        self.levels |= _level_bit(self.level)
+        if self.grams is not None:
+            self.grams.update(trigrams(line.lower()))
+        self.end += size
+    
+    def _add_fields(self, entry: Optional[Dict[str, Any]]):
+        if entry is None:
+            return
+        for field in FIELDS:
+            if field not in entry:
+                continue
+            values = self.fields.setdefault(field, set())
+            if values is None:
+                continue
+            values.add(str(entry[field]))
+            if len(values) > FIELD_VALUES_LIMIT:
+                self.fields[field] = None
+    
+    def entry(self) -> Dict[str, Any]:
+        entry = {
+            "start": self.start, "end": self.end,
+            "ts": self.start_ts, "level": self.start_level,
+            "first": self.first, "last": self.last,
+            "levels": self.levels, "end_level": self.level
+        }
+        if self.grams is not None:
+            entry["bloom"] = base64.b64encode(_build_bloom(self.grams)).decode("ascii")
+        if self.fields:
+            entry["fields"] = {field: "*" if values is None else sorted(values)
+                               for field, values in self.fields.items()}
+        return entry
+
+
+def _index_lines(lines: Iterable[str], start: int, ts: Optional[str] = None,
+                 level: Optional[str] = None, tokens: bool = True) -> List[Dict[str, Any]]:
+    """Index entries of lines that start at byte offset start"""
+    entries = []
+    block = _BlockBuilder(start, ts, level, tokens)
+    for line in lines:
+        block.add(line, len(line.encode("utf-8")))
+        if block.end - block.start >= INDEX_BLOCK_SIZE:
+            entries.append(block.entry())
+            block = _BlockBuilder(block.end, block.ts, block.level, tokens)
+    if block.end > block.start:
+        entries.append(block.entry())
+    return entries
+
+
+def _read_index(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break  # Being appended right now
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class LogIndexWriter:
+    """Indexes the log file as the log writer thread appends to it
+    
+    Entries go to a sidecar (see log_reader.index_path), one JSON line per
+    block, and move with the file when it is rotated. Lines written before
+    the index existed are indexed by the search when needed.
+    """
+    
+    def __init__(self, log_file: str = DEFAULT_LOG_FILE, tokens: bool = True):
+        self.log_file = log_file
+        self.tokens = tokens
+        self._sidecar = None
+        self._block: Optional[_BlockBuilder] = None
+    
+    def open(self, size: int):
+        """Continue the index of the log file, which is size bytes long"""
+        path = index_path(self.log_file)
+        entries = _read_index(path)
+        
+        ts = level = None
+        if entries and entries[-1]["end"] > size:
+            entries = []  # The file was replaced or truncated
+            os.remove(path)
+        elif entries and entries[-1]["end"] == size:
+            ts, level = entries[-1]["last"], entries[-1]["end_level"]
+        
+        self._sidecar = open(path, "a", encoding="utf-8")
+        self._block = _BlockBuilder(size, ts, level, self.tokens)
+    
+    def append(self, text: str):
+        """Index text just written at the end of the log file"""
+        block = self._block
+        for line in text.splitlines(keepends=True):
+            block.add(line, len(line.encode("utf-8")))
+            if block.end - block.start >= INDEX_BLOCK_SIZE:
+                self._store(block)
+                block = self._block = _BlockBuilder(block.end, block.ts, block.level, self.tokens)
+    
+    def _store(self, block: _BlockBuilder):
+        self._sidecar.write(json.dumps(block.entry()) + "\n")
+        self._sidecar.flush()
+    
+    def close(self):
+        if self._sidecar is None:
+            return
+        if self._block.end > self._block.start:
+            self._store(self._block)
+        self._sidecar.close()
+        self._sidecar = None
+    
+    def rotate(self, segment: str):
+        """The log file was renamed to segment, its index follows it"""
+        self.close()
+        try:
+            os.replace(index_path(self.log_file), index_path(segment))
+        except FileNotFoundError:
+            pass
+
+
+def _block_has_fields(block: Dict[str, Any], fields: Dict[str, str]) -> bool:
+    """Whether a block may hold a record with these field values"""
+    indexed = block.get("fields") or {}
+    for field, value in fields.items():
+        values = indexed.get(field)
+        if values is None:
+            return False
+        if values != "*" and value not in values:
+            return False
+    return True
+
+
+class LogSearch:
+    """Newest first search over all segments of the log
+    
+    Every segment is covered by index blocks; blocks whose time range,
+    levels, trigram filter or context field values rule out a match are
+    never read. Filters: text (case-insensitive substring), regex, minimal
+    level, a since/until time range and context fields of JSON records
+    (account, module, command). A page ends with a cursor that continues
+    with older lines.
+    """
+    
+    def __init__(self, log_file: str = DEFAULT_LOG_FILE):
+        self.log_file = log_file
+        self._indexes: Dict[str, Tuple[Tuple[int, int], List[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+    
+    def _segment_blocks(self, path: str) -> List[Dict[str, Any]]:
+        """Index blocks covering a segment
+        
+        A rotated segment without an index is indexed once and the index
+        saved. In the current file, lines from before the index existed
+        and the block still being written are unindexed "raw" blocks that
+        are simply read.
+        """
+        sidecar = index_path(path)
+        compressed = path.endswith(".gz")
+        current = path == self.log_file
+        try:
+            size = os.stat(path).st_size
+            key = (os.stat(sidecar).st_mtime_ns, size)
+        except FileNotFoundError:
+            if not os.path.exists(path):
+                return []
+            key = None
+        
+        with self._lock:
+            cached = self._indexes.get(path)
+        if cached is not None and key is not None and cached[0] == key:
+            return cached[1]
+        
+        entries = _read_index(sidecar) if key is not None else []
+        if compressed and not entries:
+            blocks = self._index_range(path, 0, None)
+        else:
+            blocks, covered = [], 0
+            for entry in entries:
+                if entry["start"] > covered:
+                    blocks.extend(self._gap(path, covered, entry["start"], blocks, current))
+                blocks.append(entry)
+                covered = entry["end"]
+            if not compressed and covered < size:
+                blocks.extend(self._gap(path, covered, size, blocks, current))
+        
+        if current:
+            return blocks
+        
+        if len(blocks) != len(entries):
+            # Rotated segments do not change, keep what was indexed now
+            self._save_index(sidecar, blocks)
+            try:
+                key = (os.stat(sidecar).st_mtime_ns, size)
+            except FileNotFoundError:
+                key = None
+        
+        if key is not None:
+            with self._lock:
+                self._indexes[path] = (key, blocks)
+        return blocks
+    
+    def _gap(self, path: str, start: int, end: int, blocks: List[Dict[str, Any]],
+             raw: bool) -> List[Dict[str, Any]]:
+        previous = blocks[-1] if blocks else None
+        ts, level = (previous["last"], previous["end_level"]) if previous else (None, None)
+        if raw:
+            return [{"start": start, "end": end, "ts": ts, "level": level, "raw": True}]
+        return self._index_range(path, start, end, ts, level)
+    
+    def _index_range(self, path: str, start: int, end: Optional[int],
+                     ts: Optional[str] = None, level: Optional[str] = None) -> List[Dict[str, Any]]:
+        data = self._read_range(path, [(start, end)])[0]
+        lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+        return _index_lines(lines, start, ts, level)
+    
+    @staticmethod
+    def _save_index(sidecar: str, blocks: List[Dict[str, Any]]):
+        partial = sidecar + ".tmp"
+        try:
+            with open(partial, "w", encoding="utf-8") as f:
+                for block in blocks:
+                    f.write(json.dumps(block) + "\n")
+            os.replace(partial, sidecar)
+        except OSError:
+            pass  # Read-only directory, index again next time
+    
+    @staticmethod
+    def _read_range(path: str, ranges: List[Tuple[int, Optional[int]]]) -> List[bytes]:
+        """Bytes of ascending (start, end) ranges of a plain or gzipped segment"""
+        opener = gzip.open if path.endswith(".gz") else open
+        chunks = []
+        with opener(path, "rb") as f:
+            for start, end in ranges:
+                f.seek(start)
+                chunks.append(f.read() if end is None else f.read(end - start))
+        return chunks
+    
+    @staticmethod
+    def _parse_cursor(cursor: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+        if not cursor:
+            return None, None
+        name, _, offset = cursor.rpartition(":")
+        if not name or not offset.isdigit():
+            raise ValueError(f"Invalid cursor {cursor!r}")
+        return name, int(offset)
+    
+    def _segment_key(self, path: str) -> str:
+        """Name of a segment in cursors
+        
+        The current file is renamed by rotation, so its key carries the
+        time and a checksum of its first record:
+        forelka.log@20240131235959-1a2b3c4d.
+        """
+        name = os.path.basename(path)
+        if path == self.log_file:
+            return f"{name}@{self._file_stamp(path)}"
+        return name[:-3] if name.endswith(".gz") else name
+    
+    @staticmethod
+    def _file_stamp(path: str) -> str:
+        first = _first_record(path)
+        if first is None:
+            return "0"
+        started, line = first
+        digits = re.sub(r"\D", "", started)
+        return f"{digits}-{zlib.crc32(line.encode('utf-8')):08x}"
+    
+    def _resolve_cursor(self, cursor_segment: str, segments: List[str], keys: List[str]):
+        """Point keys at the segment a cursor of the current file is in now
+        
+        A cursor taken before a rotation names the current file, whose
+        lines have moved to a rotated segment since. Raises ValueError
+        when that segment is gone or the cursor names no known file.
+        """
+        name, _, stamp = cursor_segment.partition("@")
+        if name == os.path.basename(self.log_file):
+            for i, path in enumerate(segments):
+                if path != self.log_file and self._file_stamp(path) == stamp:
+                    keys[i] = cursor_segment
+                    return
+        raise ValueError(f"Stale cursor {cursor_segment!r}, the log it points into was rotated away")
+    
+    def search(self, text: Optional[str] = None, regex: Optional[str] = None,
+               level: Optional[str] = None, since: Any = None, until: Any = None,
+               limit: int = 20, cursor: Optional[str] = None,
+               fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """One page of matching lines, newest first
+        
+        Returns {"results": [{"time", "level", "logger", "line", "cursor",
+        "message", "fields"}], "cursor": str or None}; pass the cursor back
+        for the next page. JSON records are returned rendered as text lines
+        with their fields parsed out, text lines with fields empty and the
+        message None. Raises ValueError for an invalid regex, level, time,
+        field or cursor.
+        """
+        needle = text.lower() if text else None
+        try:
+            pattern = re.compile(regex) if regex else None
+        except re.error as e:
+            raise ValueError(f"Invalid regex: {e}")
+        
+        if level is not None and level.upper() not in LEVELS:
+            raise ValueError(f"Unknown level {level!r}, expected one of {', '.join(LEVELS)}")
+        level_mask = _level_mask(level.upper()) if level else None
+        since, until = normalize_time(since), normalize_time(until, end=True)
+        
+        fields = {field: str(value) for field, value in (fields or {}).items() if value not in (None, "")}
+        for field in fields:
+            if field not in FIELDS:
+                raise ValueError(f"Unknown field {field!r}, expected one of {', '.join(FIELDS)}")
+        
+        grams = trigrams(needle) if needle else set()
+        if regex:
+            for literal in regex_literals(regex):
+                grams |= trigrams(literal.lower())
+        
+        cursor_segment, cursor_offset = self._parse_cursor(cursor)
+        segments = list(reversed(log_segments(self.log_file)))
+        keys = [self._segment_key(path) for path in segments]
+        if cursor_segment is not None:
+            if cursor_segment not in keys and "@" in cursor_segment:
+                self._resolve_cursor(cursor_segment, segments, keys)
+            start = keys.index(cursor_segment) if cursor_segment in keys else len(keys)
+            segments, keys = segments[start:], keys[start:]
+        
+        results: List[Dict[str, Any]] = []
+        limit = max(1, limit)
+        
+        for path, key in zip(segments, keys):
+            before = cursor_offset if key == cursor_segment else None
+            
+            candidates = []
+            for block in self._segment_blocks(path):
+                if before is not None and block["start"] >= before:
+                    continue
+                if block.get("raw"):
+                    candidates.append(block)
+                    continue
+                if level_mask is not None and not block["levels"] & level_mask:
+                    continue
+                if since is not None and (block["last"] is None or block["last"] < since):
+                    continue
+                if until is not None and (block["first"] is None or block["first"] > until):
+                    continue
+                if grams and "bloom" in block and not _bloom_contains(base64.b64decode(block["bloom"]), grams):
+                    continue
+                if fields and not _block_has_fields(block, fields):
+                    continue
+                candidates.append(block)
+            if not candidates:
+                continue
+            
+            try:
+                chunks = self._read_range(path, [(block["start"], block["end"]) for block in candidates])
+            except FileNotFoundError:
+                continue  # Rotated away or pruned meanwhile
+            
+            for block, data in zip(reversed(candidates), reversed(chunks)):
+                matches = self._match_block(block, data, key, needle, pattern, level_mask, since, until,
+                                            before, fields)
+                for match in reversed(matches):
+                    results.append(match)
+                    if len(results) >= limit:
+                        return {"results": results, "cursor": match["cursor"]}
+        
+        return {"results": results, "cursor": None}
+    
+    @staticmethod
+    def _match_block(block: Dict[str, Any], data: bytes, key: str, needle: Optional[str],
+                     pattern, level_mask: Optional[int], since: Optional[str], until: Optional[str],
+                     before: Optional[int], fields: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Matching lines of one block, oldest first
+        
+        JSON lines are only parsed when fields are filtered on or they
+        match; a line that is not a JSON record has no fields.
+        """
+        matches = []
+        ts, level, logger = block["ts"], block["level"], None
+        offset = block["start"]
+        
+        for line in data.decode("utf-8", errors="replace").splitlines(keepends=True):
+            line_offset = offset
+            offset += len(line.encode("utf-8"))
+            
+            record = parse_record(line)
+            if record is not None:
+                ts, logger, level = record
+            
+            if before is not None and line_offset >= before:
+                break
+            if level_mask is not None and not _level_bit(level) & level_mask:
+                continue
+            if since is not None and (ts is None or ts < since):
+                continue
+            if until is not None and (ts is None or ts > until):
+                continue
+            if needle is not None and needle not in line.lower():
+                continue
+            if pattern is not None and not pattern.search(line):
+                continue
+            
+            entry = parse_structured(line) if record is not None and line.startswith("{") else None
+            if fields and (entry is None or any(str(entry.get(f)) != v for f, v in fields.items())):
+                continue
+            
+            matches.append({
+                "time": ts,
+                "level": level,
+                "logger": logger,
+                "line": render_line(line).rstrip("\n") if entry is not None else line.rstrip("\n"),
+                "message": entry.get("message") if entry is not None else None,
+                "fields": {f: entry[f] for f in CONTEXT_FIELDS if f in entry} if entry is not None else {},
+                "cursor": f"{key}:{line_offset}"
+            })
+        return matches
+
+
+_searches: Dict[str, LogSearch] = {}
+
+
+def get_log_search(log_file: str = DEFAULT_LOG_FILE) -> LogSearch:
+    """Shared search of a log, keeps the indexes of rotated segments cached"""
+    search = _searches.get(log_file)
+    if search is None:
+        search = _searches[log_file] = LogSearch(log_file)
+    return search
\ No newline at end of file
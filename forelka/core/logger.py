@@ -2,19 +2,371 @@
 Logging configuration for Forelka Userbot
 """
 
+import atexit
+import contextvars
+import gzip
+import json
 import logging
+import queue
+import shutil
 import sys
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional, TextIO, Union
+
+from .accounting import current_module
+from .log_reader import DEFAULT_LOG_FILE, index_path, rotated_segments, segment_name
+from .log_search import LogIndexWriter, first_record_time
+
+OVERFLOW_POLICIES = ("block", "drop_new", "drop_oldest")
+LOG_FORMATS = ("text", "json")
+
+# (account id, module, command, perf_counter at start) of the running command
+command_context: contextvars.ContextVar = contextvars.ContextVar("forelka_command", default=None)
+
+
+def log_context() -> Dict[str, Any]:
+    """Fields of the command (or module task) the caller runs in"""
+    command = command_context.get()
+    if command is None:
+        module = current_module.get()
+        return {"module": module} if module is not None else {}
+    
+    account, module, name, started = command
+    context = {"module": module, "command": name,
+               "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+    if account is not None:
+        context["account"] = account
+    return context
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, context fields included
+    
+    The first keys are always time, level and logger, in that order, so
+    readers can pick them out without parsing the whole line.
+    """
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(getattr(record, "context", None) or {})
+        
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _Request:
+    """Flush or rotation asked of the writer thread"""
+    
+    __slots__ = ("kind", "done", "result")
+    
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.done = threading.Event()
+        self.result = None
+
+
+class LogPipeline:
+    """Bounded queue of log output drained by one writer thread
+    
+    Producers only put a record (or a captured chunk of stdout) into the
+    queue. The writer thread formats whatever has accumulated, up to
+    ``batch_size`` entries, and writes it with one call to the log file,
+    which stays open, and to the terminal. When the queue is full the
+    overflow policy applies: "block" waits for room, "drop_new" discards
+    the new entry and "drop_oldest" the oldest queued one; the number of
+    dropped entries is written to the log afterwards.
+    
+    The writer also rotates the file once it would exceed ``max_bytes``
+    or is ``rotate_interval`` seconds old: it is renamed to a timestamped
+    segment (see log_reader) and gzipped in another thread, keeping the
+    newest ``keep_segments``. Zero disables each of these. Written lines
+    are indexed for log_search as they go, with trigram filters when
+    ``index_tokens`` is set.
+    """
+    
+    def __init__(self, log_file: str, formatter: logging.Formatter,
+                 console: Optional[TextIO] = None, queue_size: int = 10000,
+                 overflow: str = "drop_oldest", batch_size: int = 256,
+                 max_bytes: int = 0, rotate_interval: float = 0,
+                 keep_segments: int = 7, compress: bool = True, index_tokens: bool = True):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        
+        self.log_file = log_file
+        self.formatter = formatter
+        self.console = console
+        self.overflow = overflow
+        self.batch_size = max(1, batch_size)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.keep_segments = keep_segments
+        self.compress = compress
+        self.dropped = 0
+        
+        self._closed = False
+        self._pending: List[_Request] = []
+        self._pending_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(max(1, queue_size))
+        
+        self._file = open(log_file, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        self._indexer = LogIndexWriter(log_file, index_tokens)
+        self._indexer.open(self._size)
+        self._rollover_at = self._file_started() + rotate_interval
+        
+        # Segments left uncompressed by a previous run
+        self._archiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="forelka-log-archiver")
+        for segment in rotated_segments(log_file):
+            if not segment.endswith(".gz"):
+                self._archiver.submit(self._archive, segment)
+        
+        self._thread = threading.Thread(target=self._writer, name="forelka-log-writer", daemon=True)
+        self._thread.start()
+    
+    def put(self, entry: Union[logging.LogRecord, str]):
+        """Queue a log record or a piece of text, never raises"""
+        if self._closed:
+            return
+        if self.overflow == "block":
+            self._queue.put(entry)
+            return
+        
+        while True:
+            try:
+                self._queue.put_nowait(entry)
+                return
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow == "drop_new":
+                    return
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+    
+    def _request(self, kind: str, timeout: float) -> _Request:
+        request = _Request(kind)
+        if not self._thread.is_alive():
+            return request
+        
+        with self._pending_lock:
+            self._pending.append(request)
+        # Wakes the writer; if "drop_oldest" discards it, the queue is busy anyway
+        self._queue.put(request)
+        request.done.wait(timeout)
+        return request
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything queued so far is written"""
+        return self._request("flush", timeout).done.is_set()
+    
+    def rotate(self, timeout: float = 5.0) -> Optional[str]:
+        """Start a new file after what is queued so far, returns the old file's segment"""
+        return self._request("rotate", timeout).result
+    
+    def close(self, timeout: float = 5.0):
+        """Write what is queued and stop the writer"""
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        if not self._file.closed:
+            self._file.close()
+            self._indexer.close()
+        self._archiver.shutdown(wait=True)
+    
+    def _format(self, entry: Union[logging.LogRecord, str]) -> str:
+        if isinstance(entry, str):
+            return entry
+        try:
+            return self.formatter.format(entry) + "\n"
+        except Exception as e:
+            return f"Failed to format log record {entry.msg!r}: {e}\n"
+    
+    def _write(self, chunks: List[str]):
+        if not chunks:
+            return
+        
+        text = "".join(chunks)
+        size = len(text.encode('utf-8'))
+        if self._size and ((self.max_bytes and self._size + size > self.max_bytes)
+                           or (self.rotate_interval and time.time() >= self._rollover_at)):
+            self._rotate()
+        
+        try:
+            self._file.write(text)
+            self._file.flush()
+            self._size += size
+            self._indexer.append(text)
+        except (OSError, ValueError):
+            pass  # Full disk, the terminal still gets it
+        
+        if self.console is not None:
+            try:
+                self.console.write(text)
+                self.console.flush()
+            except (OSError, ValueError):
+                pass  # Closed terminal
+    
+    def _complete(self, request: _Request):
+        with self._pending_lock:
+            if request not in self._pending:
+                return  # Done already, its wake-up entry came late
+            self._pending.remove(request)
+        
+        if request.kind == "rotate":
+            request.result = self._rotate()
+        request.done.set()
+    
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            chunks = []
+            for entry in batch:
+                if isinstance(entry, _Request):
+                    self._write(chunks)
+                    chunks = []
+                    self._complete(entry)
+                elif entry is not None:
+                    chunks.append(self._format(entry))
+            
+            dropped, self.dropped = self.dropped, 0
+            if dropped:
+                chunks.append(self._format(logging.LogRecord(
+                    __name__, logging.WARNING, "", 0,
+                    f"⚠️ {dropped} log message(s) dropped, the log queue was full", None, None
+                )))
+            self._write(chunks)
+            
+            # Requests whose wake-up entry was dropped
+            drained = self._queue.empty()
+            if drained:
+                with self._pending_lock:
+                    pending = list(self._pending)
+                for request in pending:
+                    self._complete(request)
+            
+            if self._closed and (drained or None in batch):
+                return
+    
+    def _file_started(self) -> float:
+        """When the current file got its first record, now for an empty one
+        
+        Restarts keep appending to the file, so its age is not the age of
+        the process.
+        """
+        started = first_record_time(self.log_file) if self._size else None
+        if started is None:
+            return time.time()
+        try:
+            return datetime.strptime(started, "%Y-%m-%d %H:%M:%S").timestamp()
+        except ValueError:
+            return time.time()
+    
+    def _rotate(self) -> Optional[str]:
+        """Rename the current file to a segment and reopen, in the writer thread"""
+        self._rollover_at = time.time() + self.rotate_interval
+        if not self._size:
+            return None
+        
+        self._file.close()
+        segment = segment_name(self.log_file, time.strftime("%Y%m%d-%H%M%S"))
+        self._indexer.close()
+        try:
+            os.replace(self.log_file, segment)
+            self._indexer.rotate(segment)
+        except OSError as e:
+            segment = None
+            sys.__stderr__.write(f"Log rotation failed: {e}\n")
+        
+        self._file = open(self.log_file, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        self._indexer.open(self._size)
+        
+        if segment is not None:
+            self._archiver.submit(self._archive, segment)
+        return segment
+    
+    def _archive(self, segment: str):
+        """Compress a rotated segment and drop the oldest ones"""
+        try:
+            if self.compress:
+                partial = segment + ".gz.tmp"
+                with open(segment, 'rb') as src, gzip.open(partial, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(partial, segment + ".gz")
+                os.remove(segment)
+            
+            if self.keep_segments > 0:
+                for old in rotated_segments(self.log_file)[:-self.keep_segments]:
+                    os.remove(old)
+                    if os.path.exists(index_path(old)):
+                        os.remove(index_path(old))
+        except OSError as e:
+            sys.__stderr__.write(f"Log segment {segment} archiving failed: {e}\n")
+
+
+class PipelineHandler(logging.Handler):
+    """Logging handler that hands records to a LogPipeline"""
+    
+    def __init__(self, pipeline: LogPipeline, level: int = logging.NOTSET,
+                 capture_context: bool = False):
+        super().__init__(level)
+        self.pipeline = pipeline
+        self.capture_context = capture_context
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            # Arguments may change before the writer gets to them
+            if record.args:
+                record.msg = record.getMessage()
+                record.args = None
+            # Context variables are only visible in the caller's task
+            if self.capture_context:
+                record.context = log_context()
+            self.pipeline.put(record)
+        except Exception:
+            self.handleError(record)
 
 
 class TerminalLogger:
-    """Custom logger that writes to both terminal and file"""
+    """Custom logger that writes to both terminal and file
+    
+    Captures stdout and stderr; complete lines go through the log pipeline
+    like log records do. With the "json" format every line is a JSON
+    object carrying the command context, printed lines become records of
+    the "stdout" logger.
+    """
     
-    def __init__(self, log_file: str = "forelka.log", level: str = "INFO"):
+    def __init__(self, log_file: str = DEFAULT_LOG_FILE, level: str = "INFO",
+                 log_format: str = "text", **pipeline_options: Any):
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format {log_format!r}, expected one of {LOG_FORMATS}")
+        
         self.log_file = log_file
         self.level = level
+        self.structured = log_format == "json"
         self.ignore_list = [
             "PERSISTENT_TIMESTAMP_OUTDATED",
             "updates.GetChannelDifference",
@@ -22,33 +374,31 @@ class TerminalLogger:
             "Retrying \"updates.GetChannelDifference\"",
             "disable_web_page_preview"
         ]
+        self._partial = ""
+        self._lock = threading.Lock()
+        
+        # Create formatter
+        if self.structured:
+            formatter = JsonFormatter(datefmt='%Y-%m-%d %H:%M:%S')
+        else:
+            formatter = logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
+        self.pipeline = LogPipeline(log_file, formatter, sys.__stdout__, **pipeline_options)
         
         # Setup logging
         self._setup_logging()
     
     def _setup_logging(self):
         """Setup logging configuration"""
-        # Create formatter
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        
-        # Setup file handler
-        file_handler = logging.FileHandler(self.log_file, encoding='utf-8')
-        file_handler.setLevel(getattr(logging, self.level))
-        file_handler.setFormatter(formatter)
-        
-        # Setup console handler
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(getattr(logging, self.level))
-        console_handler.setFormatter(formatter)
+        # One handler feeds both the file and the terminal
+        self.handler = PipelineHandler(self.pipeline, getattr(logging, self.level), self.structured)
         
         # Setup logger
         logger = logging.getLogger()
         logger.setLevel(getattr(logging, self.level))
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+        logger.addHandler(self.handler)
         
         # Redirect stdout/stderr to our logger
         sys.stdout = self
@@ -56,32 +406,66 @@ class TerminalLogger:
     
     def write(self, message: str):
         """Write message to log"""
-        if not message.strip():
-            return
+        with self._lock:
+            text = self._partial + message
+            lines = text.split("\n")
+            self._partial = lines.pop()
         
-        # Check if message should be ignored
-        if any(x in message for x in self.ignore_list):
+        for line in lines:
+            if not line.strip():
+                continue
+            
+            # Check if message should be ignored
+            if any(x in line for x in self.ignore_list):
+                continue
+            
+            self._put_line(line)
+    
+    def _put_line(self, line: str):
+        if not self.structured:
+            self.pipeline.put(line + "\n")
             return
         
-        # Write to original terminal
-        sys.__stdout__.write(message)
-        
-        # Write to log file
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(message)
+        record = logging.LogRecord("stdout", logging.INFO, "", 0, line, None, None)
+        record.context = log_context()
+        self.pipeline.put(record)
     
     def flush(self):
-        """Flush output"""
-        sys.__stdout__.flush()
+        """Flush output, a pending partial line included"""
+        with self._lock:
+            text, self._partial = self._partial, ""
+        if text.strip() and not any(x in text for x in self.ignore_list):
+            self._put_line(text)
+    
+    def close(self):
+        """Write out everything queued, restore the real stdout and stderr"""
+        self.flush()
+        logging.getLogger().removeHandler(self.handler)
+        if sys.stdout is self:
+            sys.stdout = sys.__stdout__
+        if sys.stderr is self:
+            sys.stderr = sys.__stderr__
+        self.pipeline.close()
     
     def __getattr__(self, name):
         """Delegate other attributes to original stdout"""
         return getattr(sys.__stdout__, name)
 
 
-def setup_logger(level: str = "INFO", log_file: str = "forelka.log"):
-    """Setup logging for the application"""
-    TerminalLogger(log_file, level)
+_terminal: Optional[TerminalLogger] = None
+
+
+def setup_logger(level: str = "INFO", log_file: str = DEFAULT_LOG_FILE, log_format: str = "text",
+                 **pipeline_options: Any):
+    """Setup logging for the application
+    
+    log_format is "text" or "json"; pipeline_options are passed to
+    LogPipeline (queue, overflow and rotation settings).
+    """
+    global _terminal
+    if _terminal is None:
+        _terminal = TerminalLogger(log_file, level, log_format, **pipeline_options)
+        atexit.register(shutdown_logger)
     
     # Suppress some verbose logs
     logging.getLogger("pyrogram").setLevel(logging.WARNING)
@@ -94,6 +478,24 @@ def setup_logger(level: str = "INFO", log_file: str = "forelka.log"):
     logger.info(f"📊 Log level: {level}")
 
 
+def rotate_logs(timeout: float = 5.0) -> Optional[str]:
+    """Start a new log file now, returns the segment the old one became
+    
+    Blocks until the writer thread has rotated, call it off the event loop.
+    """
+    if _terminal is None:
+        return None
+    return _terminal.pipeline.rotate(timeout)
+
+
+def shutdown_logger():
+    """Write out queued log output and close the log file"""
+    global _terminal
+    if _terminal is not None:
+        _terminal.close()
+        _terminal = None
+
+
 def get_logger(name: str) -> logging.Logger:
     """Get a logger instance"""
     return logging.getLogger(name)
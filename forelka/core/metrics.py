@@ -0,0 +1,100 @@
+"""
+Command metrics for Forelka Userbot
+"""
+
+import bisect
+from typing import Any, Dict, List, Tuple
+
+# Upper bounds of the latency buckets in milliseconds
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (
+    1, 2, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, 30000, 60000, float("inf")
+)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with call and error counters"""
+
+    __slots__ = ("buckets", "count", "errors", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float, error: bool = False):
+        """Record one call"""
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+        if error:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        """Approximate percentile, the upper bound of the matching bucket"""
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for bound, bucket in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get a JSON friendly summary"""
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.count, 4) if self.count else 0.0,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "max_ms": round(self.max_ms, 2)
+        }
+
+
+class CommandMetrics:
+    """Per-command and per-module latency histograms"""
+
+    def __init__(self):
+        self.commands: Dict[str, LatencyHistogram] = {}
+        self.modules: Dict[str, LatencyHistogram] = {}
+
+    def record(self, command: str, module: str, duration_ms: float, error: bool = False):
+        """Record one command execution"""
+        histogram = self.commands.get(command)
+        if histogram is None:
+            histogram = self.commands[command] = LatencyHistogram()
+        histogram.observe(duration_ms, error)
+
+        histogram = self.modules.get(module)
+        if histogram is None:
+            histogram = self.modules[module] = LatencyHistogram()
+        histogram.observe(duration_ms, error)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Get summaries of every command and module"""
+        return {
+            "commands": {name: h.snapshot() for name, h in self.commands.items()},
+            "modules": {name: h.snapshot() for name, h in self.modules.items()}
+        }
+
+    def top(self, by: str = "p95_ms", limit: int = 5, kind: str = "commands") -> List[Tuple[str, Dict[str, Any]]]:
+        """Get the slowest commands (or modules) by a summary field"""
+        source = self.commands if kind == "commands" else self.modules
+        summaries = [(name, h.snapshot()) for name, h in source.items()]
+        summaries.sort(key=lambda item: item[1][by], reverse=True)
+        return summaries[:limit]
+
+    def reset(self):
+        """Forget all recorded data"""
+        self.commands.clear()
+        self.modules.clear()
\ No newline at end of file
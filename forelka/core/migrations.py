@@ -0,0 +1,198 @@
+"""
+Database schema migrations for Forelka Userbot
+"""
+
+import logging
+import sqlite3
+from typing import Callable, List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    """One schema step, ``apply`` must be safe to run again"""
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Cursor], None]
+
+
+def _initial_tables(cursor: sqlite3.Cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER UNIQUE NOT NULL,
+            api_id TEXT NOT NULL,
+            api_hash TEXT NOT NULL,
+            prefix TEXT DEFAULT '.',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS owners (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            owner_id INTEGER NOT NULL,
+            is_admin BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (account_id) REFERENCES accounts (id) ON DELETE CASCADE,
+            UNIQUE(account_id, owner_id)
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (account_id) REFERENCES accounts (id) ON DELETE CASCADE,
+            UNIQUE(account_id, key)
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS modules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            module_name TEXT NOT NULL,
+            enabled BOOLEAN DEFAULT 1,
+            version TEXT,
+            developer TEXT,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (account_id) REFERENCES accounts (id) ON DELETE CASCADE,
+            UNIQUE(account_id, module_name)
+        )
+    """)
+
+
+def _hot_query_indexes(cursor: sqlite3.Cursor):
+    # get_enabled_modules / get_disabled_modules read only the index
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_modules_account_enabled
+        ON modules (account_id, enabled, module_name)
+    """)
+    
+    # is_owner by user across accounts; lookups by account use the
+    # UNIQUE(account_id, owner_id) index
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_owners_owner
+        ON owners (owner_id, account_id)
+    """)
+
+
+def _setting_value_encoding(cursor: sqlite3.Cursor):
+    # Values stored before typed settings are plain text ("1" is a string),
+    # only rows flagged as encoded hold JSON
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(settings)").fetchall()}
+    if "encoded" not in columns:
+        cursor.execute("ALTER TABLE settings ADD COLUMN encoded BOOLEAN NOT NULL DEFAULT 0")
+
+
+def _drop_redundant_indexes(cursor: sqlite3.Cursor):
+    # The UNIQUE(account_id, ...) autoindexes serve these lookups; the
+    # covering copies only added is_admin, or a second copy of every
+    # setting value, to each write
+    for name in ("idx_owners_account_roles", "idx_settings_account_key_value",
+                 "idx_settings_account_key_value_encoded"):
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial tables", _initial_tables),
+    Migration(2, "indexes for hot queries", _hot_query_indexes),
+    Migration(3, "flag JSON encoded setting values", _setting_value_encoding),
+    Migration(4, "drop redundant covering indexes", _drop_redundant_indexes),
+]
+
+
+JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+TEMP_STORES = ("DEFAULT", "FILE", "MEMORY")
+
+
+def _choice(name: str, value: str, choices) -> str:
+    value = str(value).upper()
+    if value not in choices:
+        raise ValueError(f"Unknown {name} {value!r}, expected one of {', '.join(choices)}")
+    return value
+
+
+def apply_pragmas(conn: sqlite3.Connection, synchronous: str = "NORMAL", cache_size_kib: int = 8192,
+                  journal_mode: str = "WAL", temp_store: str = "MEMORY"):
+    """Tune a connection, the journal mode is persistent, the rest is per connection
+    
+    Readers only run next to the writer with WAL, other journal modes
+    make them wait for it.
+    """
+    conn.execute(f"PRAGMA journal_mode={_choice('journal_mode', journal_mode, JOURNAL_MODES)}")
+    conn.execute(f"PRAGMA synchronous={_choice('synchronous', synchronous, SYNCHRONOUS_MODES)}")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_size_kib)}")
+    conn.execute(f"PRAGMA temp_store={_choice('temp_store', temp_store, TEMP_STORES)}")
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Get the highest applied migration version, 0 for a new database"""
+    row = conn.execute("""
+        SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'
+    """).fetchone()
+    if row is None:
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, migrations: List[Migration] = MIGRATIONS) -> int:
+    """Apply pending migrations in order, returns the resulting version
+    
+    Every step runs in its own write transaction together with its
+    version row, so an interrupted upgrade resumes at the failed step.
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        known = max((m.version for m in migrations), default=0)
+        current = get_schema_version(conn)
+        if current > known:
+            logger.warning(f"Database schema version {current} is newer than this build ({known})")
+        
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version <= current:
+                continue
+            
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have applied it while we waited for the lock
+                cursor.execute("SELECT 1 FROM schema_version WHERE version = ?", (migration.version,))
+                if cursor.fetchone() is None:
+                    migration.apply(cursor)
+                    cursor.execute("""
+                        INSERT INTO schema_version (version, name) VALUES (?, ?)
+                    """, (migration.version, migration.name))
+                    logger.info(f"Applied database migration {migration.version}: {migration.name}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            finally:
+                cursor.close()
+            
+            current = migration.version
+        
+        return get_schema_version(conn)
+    finally:
+        conn.isolation_level = isolation_level
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+Persistent manifest index of module files
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class ModuleIndex:
+    """What is known about each module file, kept across restarts
+    
+    Entries are keyed by path and hold the file's mtime, size and SHA-256
+    together with everything read from it (requirements, metadata,
+    declared commands), the packages fingerprint its requirements were
+    satisfied under and the outcome of the last load. A file whose mtime
+    and size are unchanged is not read at all; a touched file with the
+    same hash keeps its entry.
+    
+    Stored as JSON in ``loaded_modules_dir/.index.json`` so that other
+    processes, like the web interface, can read it.
+    """
+    
+    FILENAME = ".index.json"
+    VERSION = 1
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+    
+    @classmethod
+    def for_directory(cls, loaded_modules_dir: str) -> "ModuleIndex":
+        return cls(os.path.join(loaded_modules_dir, cls.FILENAME))
+    
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normpath(path)
+    
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._entries = data["modules"] if data.get("version") == self.VERSION else {}
+            except (OSError, ValueError, KeyError, AttributeError):
+                self._entries = {}
+        return self._entries
+    
+    def lookup(self, path: str, stat: os.stat_result, file_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Entry of an unchanged file, by mtime and size or else by hash"""
+        with self._lock:
+            entry = self._load().get(self._key(path))
+            if entry is None:
+                return None
+            
+            if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                return entry
+            
+            if file_hash is not None and entry["hash"] == file_hash:
+                # Touched but not modified
+                entry["mtime_ns"], entry["size"] = stat.st_mtime_ns, stat.st_size
+                self._dirty = True
+                return entry
+            
+            return None
+    
+    def store(self, path: str, stat: os.stat_result, file_hash: str, parsed: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the entry of a new or changed file"""
+        entry = dict(parsed)
+        entry.update({
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": file_hash,
+            "environment": None,
+            "outcome": None
+        })
+        
+        with self._lock:
+            self._load()[self._key(path)] = entry
+            self._dirty = True
+        return entry
+    
+    def is_satisfied(self, path: str, file_hash: str, environment: str) -> bool:
+        """Whether the file's requirements were installed under this packages fingerprint"""
+        with self._lock:
+            entry = self._load().get(self._key(path))
+            return entry is not None and entry["hash"] == file_hash and entry["environment"] == environment
+    
+    def mark_satisfied(self, path: str, file_hash: str, environment: str):
+        with self._lock:
+            entry = self._load().get(self._key(path))
+            if entry is not None and entry["hash"] == file_hash:
+                entry["environment"] = environment
+                self._dirty = True
+    
+    def record_outcome(self, path: str, status: str, error: Optional[str] = None,
+                       metadata: Optional[Dict[str, Any]] = None, commands: Optional[List[str]] = None):
+        """Remember how the last load of a file went
+        
+        status is one of ``loaded``, ``lazy``, ``failed`` or ``unloaded``;
+        metadata and commands seen at runtime replace the parsed ones.
+        """
+        with self._lock:
+            entry = self._load().get(self._key(path))
+            if entry is None:
+                return
+            
+            entry["outcome"] = {"status": status, "error": error, "at": time.time()}
+            if metadata is not None:
+                entry["metadata"] = metadata
+            if commands is not None:
+                entry["commands"] = commands
+            self._dirty = True
+    
+    def retain(self, paths: Iterable[str]):
+        """Drop entries of files that no longer exist in the module directories"""
+        keep = {self._key(path) for path in paths}
+        with self._lock:
+            entries = self._load()
+            for key in [key for key in entries if key not in keep]:
+                del entries[key]
+                self._dirty = True
+    
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            
+            try:
+                partial = f"{self.path}.partial"
+                with open(partial, "w", encoding="utf-8") as f:
+                    json.dump({"version": self.VERSION, "modules": self._entries}, f, ensure_ascii=False)
+                os.replace(partial, self.path)
+                self._dirty = False
+            except OSError as e:
+                print(f"⚠️  Warning: Failed to save module index: {e}")
+    
+    def list_modules(self) -> List[Dict[str, Any]]:
+        """Metadata and last load outcome of every indexed module, by name"""
+        with self._lock:
+            entries = list(self._load().items())
+        
+        modules = []
+        for path, entry in entries:
+            metadata = entry.get("metadata") or {}
+            outcome = entry.get("outcome") or {}
+            modules.append({
+                "name": entry["name"],
+                "path": path,
+                "version": metadata.get("version", "1.0"),
+                "developer": metadata.get("developer", "Unknown"),
+                "description": metadata.get("description", "No description"),
+                "commands": entry.get("commands", []),
+                "requirements": entry.get("requirements", []),
+                "status": outcome.get("status", "unknown"),
+                "error": outcome.get("error"),
+                "updated_at": outcome.get("at")
+            })
+        
+        modules.sort(key=lambda module: module["name"])
+        return modules
\ No newline at end of file
@@ -3,63 +3,126 @@ Module loader for Forelka Userbot with improved architecture
 """
 
 import os
+import re
+import site
+import hashlib
+import importlib
+import importlib.metadata
 import importlib.util
 import sys
-import subprocess
 import asyncio
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, Iterable, List, Optional, Any, Callable, Tuple
 from pathlib import Path
 
+from .module_index import ModuleIndex
+from .module_stubs import describe_module
+
 
 class DependencyHandler:
     """Handle module dependencies"""
     
     @staticmethod
-    def get_requirements(path: str) -> List[str]:
+    def parse_requirements(source: str) -> List[str]:
+        """Extract requirements from module source"""
+        requirements = []
+        for line in source.splitlines():
+            line = line.strip()
+            if line.startswith("# requirements:") or line.startswith("# scope: pip:"):
+                value = line.split(":", 1)[1].strip()
+                if value.startswith("pip:"):
+                    value = value[len("pip:"):]
+                requirements.extend(value.split())
+        return requirements
+    
+    @classmethod
+    def get_requirements(cls, path: str) -> List[str]:
         """Extract requirements from module file"""
         if not path or not os.path.isfile(path):
             return []
         
-        requirements = []
         try:
             with open(path, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith("# requirements:") or line.startswith("# scope: pip:"):
-                        parts = line.split(":", 1)[1].strip().split()
-                        requirements.extend(parts)
+                return cls.parse_requirements(f.read())
         except Exception as e:
             print(f"⚠️  Warning: Failed to read requirements from {path}: {e}")
-        
-        return requirements
+            return []
     
-    @classmethod
-    def install_requirements(cls, path: str) -> bool:
-        """Install module requirements"""
-        requirements = cls.get_requirements(path)
-        if not requirements:
+    @staticmethod
+    def is_installed(requirement: str) -> bool:
+        """Check a requirement without importing it"""
+        name = re.split(r"[<>=!~\[;\s]", requirement, 1)[0]
+        try:
+            importlib.metadata.distribution(name)
             return True
+        except importlib.metadata.PackageNotFoundError:
+            pass
+        
+        try:
+            return importlib.util.find_spec(name.replace("-", "_")) is not None
+        except (ImportError, ValueError):
+            return False
+    
+    @staticmethod
+    def environment_fingerprint() -> str:
+        """Fingerprint of the installed packages, changes when pip adds or removes one"""
+        paths = {p for p in sys.path if p.endswith(("site-packages", "dist-packages"))}
+        paths.update(getattr(site, "getsitepackages", lambda: [])())
+        paths.add(site.getusersitepackages())
         
-        for req in requirements:
+        digest = hashlib.sha256(sys.version.encode())
+        for path in sorted(p for p in paths if p):
             try:
-                importlib.import_module(req)
-                print(f"✅ Dependency {req} already installed")
-            except ImportError:
-                try:
-                    print(f"📦 Installing dependency: {req}")
-                    subprocess.check_call([
-                        sys.executable, "-m", "pip", "install", req, "--quiet"
-                    ])
-                    print(f"✅ Installed {req}")
-                except subprocess.CalledProcessError as e:
-                    print(f"❌ Failed to install {req}: {e}")
-                    return False
+                digest.update(f"{path}:{os.stat(path).st_mtime_ns}".encode())
+            except OSError:
+                continue
+        return digest.hexdigest()
+    
+    @staticmethod
+    async def install(requirements: List[str]) -> bool:
+        """Install packages with a single pip run without blocking the event loop"""
+        print(f"📦 Installing dependencies: {', '.join(requirements)}")
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "pip", "install", "--quiet", *requirements,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        importlib.invalidate_caches()
         
+        if process.returncode != 0:
+            print(f"❌ Failed to install {', '.join(requirements)}: {stderr.decode(errors='replace').strip()}")
+            return False
+        
+        print(f"✅ Installed {', '.join(requirements)}")
         return True
 
 
 class ModuleLoader:
-    """Improved module loader with metadata support"""
+    """Improved module loader with metadata support
+    
+    Loading runs in three steps: every module file is read and its
+    requirements collected, missing packages of all modules are installed
+    with one pip run, then the modules are executed concurrently in worker
+    threads and registered one by one on the event loop. A module that
+    must run on the event loop thread declares ``# scope: main_thread``;
+    one that fails in a thread with RuntimeError or ValueError is tried
+    once more on the loop thread.
+    
+    In lazy mode (``modules.lazy_load``) modules whose ``register`` is
+    static get stub commands read from their source and are imported on
+    the first call of one of them. ``# scope: eager`` opts a module out.
+    
+    Commands of a module that sets ``__heavy__ = True`` run in the bot's
+    WorkerPool instead of on the event loop.
+    
+    What is read from the files and the load outcomes are kept in a
+    ModuleIndex, so unchanged modules are neither parsed nor have their
+    requirements checked again.
+    
+    sync() reloads only the modules whose files changed. A new version is
+    executed before anything is touched and its commands are swapped in
+    as one step, so a broken version leaves the old one in place.
+    """
     
     def __init__(self, bot):
         self.bot = bot
@@ -71,6 +134,11 @@ class ModuleLoader:
         self.modules_dir = modules_config.get("modules_dir", "modules")
         self.loaded_modules_dir = modules_config.get("loaded_modules_dir", "loaded_modules")
         self.auto_load = modules_config.get("auto_load", True)
+        self.lazy_load = modules_config.get("lazy_load", False)
+        self._lazy_locks: Dict[str, asyncio.Lock] = {}
+        self._sync_lock: Optional[asyncio.Lock] = None
+        
+        self.index = ModuleIndex.for_directory(self.loaded_modules_dir)
     
     async def load_all(self):
         """Load all modules from both directories"""
@@ -82,86 +150,412 @@ class ModuleLoader:
                 os.makedirs(directory, exist_ok=True)
         
         # Load modules from both directories
+        entries = []
         for directory in [self.modules_dir, self.loaded_modules_dir]:
-            await self._load_directory(directory)
+            entries.extend(self._scan_directory(directory))
+        
+        # The first directory wins when both have a module with the same name
+        unique = {}
+        for name, path in entries:
+            unique.setdefault(name, path)
+        
+        # Forget files that were removed since the last start
+        self.index.retain([path for _, path in entries] +
+                          [entry["path"] for entry in self.loaded_modules.values()])
+        
+        await self.load_modules(list(unique.items()))
         
         print(f"✅ Loaded {len(self.loaded_modules)} modules")
     
-    async def _load_directory(self, directory: str):
-        """Load modules from a specific directory"""
+    def _scan_directory(self, directory: str, include_loaded: bool = False) -> List[Tuple[str, str]]:
+        """Find module files of a directory that are not loaded yet"""
         if not os.path.exists(directory):
-            return
+            return []
         
-        for filename in os.listdir(directory):
+        entries = []
+        for filename in sorted(os.listdir(directory)):
             if filename.endswith(".py") and not filename.startswith("__"):
                 module_name = filename[:-3].lower()
-                module_path = os.path.join(directory, filename)
                 
-                if module_name in self.loaded_modules:
+                if module_name in self.loaded_modules and not include_loaded:
                     continue  # Already loaded
                 
-                await self.load_module(module_name, module_path)
+                entries.append((module_name, os.path.join(directory, filename)))
+        
+        return entries
     
-    async def load_module(self, name: str, path: str) -> bool:
-        """Load a single module"""
-        try:
-            # Install dependencies first
-            if not DependencyHandler.install_requirements(path):
-                print(f"❌ Failed to install dependencies for {name}")
-                return False
+    async def sync(self, paths: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """Reload modules whose files changed, returns {name: action}
+        
+        Only modules at the given paths are considered, or every module
+        when paths is None. New files are loaded, changed ones replaced
+        and modules whose file is gone unloaded.
+        """
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()  # Bound to the running loop
+        
+        async with self._sync_lock:
+            wanted: Dict[str, str] = {}
+            for directory in [self.modules_dir, self.loaded_modules_dir]:
+                for name, path in self._scan_directory(directory, include_loaded=True):
+                    wanted.setdefault(name, path)
             
-            # Load the module
-            spec = importlib.util.spec_from_file_location(f"module_{name}", path)
-            if not spec or not spec.loader:
-                print(f"❌ Failed to create module spec for {name}")
-                return False
+            changed = None if paths is None else {os.path.normpath(path) for path in paths}
+            actions: Dict[str, str] = {}
             
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
+            for name in [name for name in self.loaded_modules if name not in wanted]:
+                if await self.unload_module(name):
+                    actions[name] = "unloaded"
             
-            # Register the module
-            if hasattr(module, "register"):
-                try:
-                    module.register(self.bot, self.bot.commands, name)
-                    self.loaded_modules[name] = {
-                        "path": path,
-                        "module": module,
-                        "loaded_at": asyncio.get_event_loop().time()
-                    }
-                    self._extract_metadata(name, module)
-                    
-                    # Register in database
-                    account_id = 1  # Default account for now
-                    await self.bot.db.register_module(
-                        account_id, name,
-                        self.module_metadata[name].get("version", "1.0"),
-                        self.module_metadata[name].get("developer", "Unknown"),
-                        self.module_metadata[name].get("description", "")
-                    )
-                    
-                    print(f"✅ Loaded module: {name}")
-                    return True
-                    
-                except Exception as e:
-                    print(f"❌ Failed to register module {name}: {e}")
-                    return False
+            candidates = [
+                (name, path) for name, path in wanted.items()
+                if changed is None or os.path.normpath(path) in changed
+                or (name in self.loaded_modules and self.loaded_modules[name]["path"] != path)
+            ]
+            if not candidates:
+                return actions
+            
+            loop = asyncio.get_event_loop()
+            sources = await loop.run_in_executor(None, self._read_sources, candidates)
+            
+            pending = []
+            for source in sources:
+                entry = self.loaded_modules.get(source["name"])
+                if entry is None:
+                    pending.append((source, "loaded"))
+                elif entry["source"]["hash"] != source["hash"] or entry["path"] != source["path"]:
+                    pending.append((source, "reloaded"))
+            
+            if pending:
+                results = await self._load_sources([source for source, _ in pending])
+                for source, action in pending:
+                    actions[source["name"]] = action if results.get(source["name"]) else "failed"
+            
+            return actions
+    
+    def _read_source(self, name: str, path: str) -> Dict[str, Any]:
+        """Declarations of a module file, from the index while it is unchanged"""
+        stat = os.stat(path)
+        entry = self.index.lookup(path, stat)
+        
+        if entry is None:
+            with open(path, "rb") as f:
+                data = f.read()
+            
+            file_hash = hashlib.sha256(data).hexdigest()
+            entry = self.index.lookup(path, stat, file_hash)
+            
+            if entry is None:
+                text = data.decode("utf-8", errors="replace")
+                described = describe_module(text)
+                stub = described["stub"]
+                entry = self.index.store(path, stat, file_hash, {
+                    "name": name,
+                    "requirements": DependencyHandler.parse_requirements(text),
+                    "main_thread": "# scope: main_thread" in text,
+                    "eager": "# scope: eager" in text,
+                    "metadata": described["metadata"],
+                    "stub": stub,
+                    "commands": [spec["name"] for spec in stub["commands"]] if stub else []
+                })
+        
+        lazy = self.lazy_load and not entry["main_thread"] and not entry["eager"]
+        return {
+            "name": name,
+            "path": path,
+            "hash": entry["hash"],
+            "requirements": list(entry["requirements"]),
+            "main_thread": entry["main_thread"],
+            "stub": entry["stub"] if lazy else None
+        }
+    
+    def _read_sources(self, entries: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        sources = []
+        for name, path in entries:
+            try:
+                sources.append(self._read_source(name, path))
+            except OSError as e:
+                print(f"❌ Failed to read module {name}: {e}")
+        return sources
+    
+    def _missing_requirements(self, sources: List[Dict[str, Any]], environment: str) -> Dict[str, List[str]]:
+        """Requirements that are not installed, per module path"""
+        missing = {}
+        for source in sources:
+            if not source["requirements"]:
+                continue
+            if self.index.is_satisfied(source["path"], source["hash"], environment):
+                continue
+            
+            absent = [req for req in source["requirements"] if not DependencyHandler.is_installed(req)]
+            if absent:
+                missing[source["path"]] = absent
             else:
-                print(f"⚠️  Module {name} has no register function")
-                return False
+                self.index.mark_satisfied(source["path"], source["hash"], environment)
+        return missing
+    
+    async def _resolve_dependencies(self, sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Install what all modules are missing at once, returns the loadable modules"""
+        loop = asyncio.get_event_loop()
+        
+        environment = await loop.run_in_executor(None, DependencyHandler.environment_fingerprint)
+        missing = await loop.run_in_executor(None, self._missing_requirements, sources, environment)
+        
+        if missing:
+            requirements = sorted({req for absent in missing.values() for req in absent})
+            if await DependencyHandler.install(requirements):
+                # Packages changed, re-check only the modules that were missing some
+                environment = await loop.run_in_executor(None, DependencyHandler.environment_fingerprint)
+                retry = [source for source in sources if source["path"] in missing]
+                missing = await loop.run_in_executor(None, self._missing_requirements, retry, environment)
+        
+        for path, absent in missing.items():
+            source = next(source for source in sources if source["path"] == path)
+            self._record_failure(source, "install dependencies for", f"missing {', '.join(absent)}")
+        
+        return [source for source in sources if source["path"] not in missing]
+    
+    @staticmethod
+    def _exec_module(source: Dict[str, Any]):
+        """Execute a module file, returns the module object"""
+        spec = importlib.util.spec_from_file_location(f"module_{source['name']}", source["path"])
+        if not spec or not spec.loader:
+            raise ImportError(f"Failed to create module spec for {source['name']}")
+        
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    
+    async def _exec_in_thread(self, source: Dict[str, Any]):
+        """Execute a module in a worker thread, falling back to the loop thread
+        
+        Top-level code that needs the event loop thread (get_event_loop,
+        signal.signal, loop-bound objects) fails in a worker with
+        RuntimeError or ValueError; such a module is executed once more
+        on the loop thread.
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(None, self._exec_module, source)
+        except (RuntimeError, ValueError) as e:
+            print(f"⚠️  Module {source['name']} failed outside the main thread ({e}), "
+                  f"retrying on it; add '# scope: main_thread' to the module to skip the attempt")
+            return self._exec_module(source)
+    
+    async def load_modules(self, entries: List[Tuple[str, str]]) -> Dict[str, bool]:
+        """Load many modules at once, returns {name: loaded}"""
+        loop = asyncio.get_event_loop()
+        sources = await loop.run_in_executor(None, self._read_sources, entries)
+        
+        results = {name: False for name, _ in entries}
+        results.update(await self._load_sources(sources))
+        return results
+    
+    async def _load_sources(self, sources: List[Dict[str, Any]]) -> Dict[str, bool]:
+        """Load or replace read modules, returns {name: loaded}"""
+        loop = asyncio.get_event_loop()
+        results = {source["name"]: False for source in sources}
+        sources = await self._resolve_dependencies(sources)
+        
+        async def execute(source: Dict[str, Any]):
+            if source["stub"] is not None:
+                return None  # Imported on first use
+            if source["main_thread"]:
+                return self._exec_module(source)
+            return await self._exec_in_thread(source)
+        
+        modules = await asyncio.gather(*(execute(source) for source in sources), return_exceptions=True)
+        
+        # Registration touches shared state, keep it on the loop in scan order
+        for source, module in zip(sources, modules):
+            if isinstance(module, BaseException):
+                self._record_failure(source, "load module", module)
+                continue
+            if source["stub"] is not None:
+                results[source["name"]] = await self._register_stub(source)
+            else:
+                results[source["name"]] = await self._register_module(source, module)
+        
+        await loop.run_in_executor(None, self.index.save)
+        return results
+    
+    async def load_module(self, name: str, path: str) -> bool:
+        """Load a single module"""
+        results = await self.load_modules([(name, path)])
+        return results.get(name, False)
+    
+    async def _register_module(self, source: Dict[str, Any], module) -> bool:
+        """Call the module's register function and record it"""
+        name, path = source["name"], source["path"]
+        
+        # Register the module, replacing the commands of a loaded version
+        if hasattr(module, "register"):
+            try:
+                replaced = name in self.loaded_modules
                 
+                def register():
+                    module.register(self.bot, self.bot.commands, name)
+                    if getattr(module, "__heavy__", False):
+                        self._offload_module(name, source, module)
+                
+                self.bot.commands.replace_module(name, register)
+                self.loaded_modules[name] = {
+                    "path": path,
+                    "module": module,
+                    "source": source,
+                    "loaded_at": asyncio.get_event_loop().time()
+                }
+                metadata = self._extract_metadata(name, module, source["requirements"])
+                await self._record_module(name)
+                
+                self.index.record_outcome(
+                    path, "loaded",
+                    metadata={field: metadata[field] for field in ("version", "developer", "description")},
+                    commands=metadata["commands"]
+                )
+                print(f"✅ {'Reloaded' if replaced else 'Loaded'} module: {name}")
+                return True
+                
+            except Exception as e:
+                self._record_failure(source, "register module", e)
+                return False
+        else:
+            print(f"⚠️  Module {name} has no register function")
+            self.index.record_outcome(path, "failed", "No register function")
+            return False
+    
+    def _record_failure(self, source: Dict[str, Any], step: str, error: Any):
+        """Report a failed load, a loaded previous version stays in place"""
+        name = source["name"]
+        message = str(error)
+        if name in self.loaded_modules:
+            message += " (previous version kept)"
+        
+        print(f"❌ Failed to {step} {name}: {message}")
+        self.index.record_outcome(source["path"], "failed", message)
+    
+    def _offload_module(self, name: str, source: Dict[str, Any], module):
+        """Run the commands of a module declaring ``__heavy__`` in worker processes"""
+        workers = getattr(self.bot, "workers", None)
+        if workers is None:
+            print(f"⚠️  Module {name} is heavy but the worker pool is disabled")
+            return
+        
+        commands = {command_name: self.bot.commands.commands[command_name]
+                    for command_name in self._module_commands(name)}
+        offloaded = workers.offload(module, source, commands)
+        if offloaded:
+            print(f"⚙️  Module {name} runs {', '.join(offloaded)} in worker processes")
+    
+    def _module_commands(self, name: str) -> List[str]:
+        """Names of the commands a module registered"""
+        return [command_name for command_name, command in self.bot.commands.commands.items()
+                if command["module"] == name]
+    
+    async def _record_module(self, name: str):
+        """Register a loaded module in the database"""
+        account_id = 1  # Default account for now
+        await self.bot.db.register_module(
+            account_id, name,
+            self.module_metadata[name].get("version", "1.0"),
+            self.module_metadata[name].get("developer", "Unknown"),
+            self.module_metadata[name].get("description", "")
+        )
+    
+    async def _register_stub(self, source: Dict[str, Any]) -> bool:
+        """Register the statically read commands of a module without importing it"""
+        name, stub = source["name"], source["stub"]
+        
+        def register():
+            for spec in stub["commands"]:
+                self.bot.commands.register_command(
+                    spec["name"], self._make_stub(name, spec["name"].lower()), name,
+                    description=spec.get("description", ""),
+                    usage=spec.get("usage", ""),
+                    owner_only=bool(spec.get("owner_only", False)),
+                    admin_only=bool(spec.get("admin_only", False)),
+                    timeout=spec.get("timeout")
+                )
+            for alias, command in stub["aliases"]:
+                self.bot.commands.register_alias(alias, command)
+        
+        try:
+            self.bot.commands.replace_module(name, register)
         except Exception as e:
-            print(f"❌ Failed to load module {name}: {e}")
+            self._record_failure(source, "register module", e)
             return False
+        
+        self.loaded_modules[name] = {
+            "path": source["path"],
+            "module": None,
+            "source": source,
+            "loaded_at": None
+        }
+        self.module_metadata[name] = {
+            "name": name,
+            "developer": stub["metadata"].get("developer", "Unknown"),
+            "version": stub["metadata"].get("version", "1.0"),
+            "description": stub["metadata"].get("description", "No description"),
+            "commands": [spec["name"] for spec in stub["commands"]],
+            "requirements": source["requirements"],
+            "lazy": True
+        }
+        await self._record_module(name)
+        
+        self.index.record_outcome(source["path"], "lazy")
+        print(f"✅ Registered lazy module: {name}")
+        return True
     
-    def _extract_metadata(self, name: str, module) -> Dict[str, Any]:
+    def _make_stub(self, module_name: str, command_name: str) -> Callable:
+        """Command function that imports its module and runs the real command"""
+        async def lazy_command(client, message, args):
+            await self.import_lazy(module_name)
+            
+            command = self.bot.commands.commands.get(command_name)
+            if command is None or command["func"] is lazy_command:
+                raise RuntimeError(f"Module {module_name} did not register {command_name}")
+            return await command["func"](client, message, args)
+        
+        lazy_command.__lazy_module__ = module_name
+        return lazy_command
+    
+    async def import_lazy(self, name: str):
+        """Import a lazily registered module, its register replaces the stubs"""
+        lock = self._lazy_locks.get(name)
+        if lock is None:
+            lock = self._lazy_locks[name] = asyncio.Lock()
+        
+        async with lock:
+            entry = self.loaded_modules.get(name)
+            if entry is None:
+                raise ImportError(f"Module {name} is not loaded")
+            if entry["module"] is not None:
+                return
+            
+            loop = asyncio.get_event_loop()
+            try:
+                module = await self._exec_in_thread(entry["source"])
+            except Exception as e:
+                self.index.record_outcome(entry["path"], "failed", str(e))
+                raise
+            else:
+                if not await self._register_module(entry["source"], module):
+                    raise ImportError(f"Failed to register module {name}")
+            finally:
+                await loop.run_in_executor(None, self.index.save)
+    
+    def _extract_metadata(self, name: str, module, requirements: Optional[List[str]] = None) -> Dict[str, Any]:
         """Extract metadata from module"""
+        if requirements is None:
+            requirements = DependencyHandler.get_requirements(getattr(module, "__file__", "") or "")
+        
         metadata = {
             "name": name,
             "developer": getattr(module, "__developer__", "Unknown"),
             "version": getattr(module, "__version__", "1.0"),
             "description": getattr(module, "__description__", "No description"),
-            "commands": getattr(module, "__commands__", []),
-            "requirements": DependencyHandler.get_requirements(module.__file__ if hasattr(module, '__file__') else "")
+            "commands": getattr(module, "__commands__", None) or self._module_commands(name),
+            "requirements": requirements
         }
         
         self.module_metadata[name] = metadata
@@ -174,13 +568,22 @@ class ModuleLoader:
         
         try:
             module = self.loaded_modules[name]["module"]
-            if hasattr(module, "unregister"):
+            if module is not None and hasattr(module, "unregister"):
                 module.unregister(self.bot, self.bot.commands, name)
             
+            # Stub commands and whatever unregister left behind
+            for command_name in self._module_commands(name):
+                self.bot.commands.unregister_command(command_name)
+            self.bot.commands.events.unsubscribe_module(name)
+            
             # Remove from loaded modules
+            self.index.record_outcome(self.loaded_modules[name]["path"], "unloaded")
             del self.loaded_modules[name]
             if name in self.module_metadata:
                 del self.module_metadata[name]
+            self._lazy_locks.pop(name, None)
+            
+            await asyncio.get_event_loop().run_in_executor(None, self.index.save)
             
             print(f"✅ Unloaded module: {name}")
             return True
@@ -206,6 +609,21 @@ class ModuleLoader:
         """Get information about all loaded modules"""
         return list(self.module_metadata.values())
     
+    async def get_resource_usage(self) -> Dict[str, Dict[str, Any]]:
+        """CPU, wall time, tasks, memory and errors per module
+        
+        The tracemalloc snapshot is taken in an executor, the counters are
+        read on the event loop that updates them.
+        """
+        paths = {name: entry["path"] for name, entry in self.loaded_modules.items()}
+        accounting = self.bot.commands.accounting
+        memory = await asyncio.get_event_loop().run_in_executor(None, accounting.memory_usage, paths)
+        return accounting.snapshot(self.bot.commands.metrics, paths, memory)
+    
+    def list_indexed_modules(self) -> List[Dict[str, Any]]:
+        """Metadata and load outcome of every known module file, from the index"""
+        return self.index.list_modules()
+    
     def is_module_loaded(self, name: str) -> bool:
         """Check if module is loaded"""
         return name in self.loaded_modules
@@ -0,0 +1,194 @@
+"""
+Static command extraction for lazily imported modules
+"""
+
+import ast
+import sys
+from typing import Any, Dict, List, Optional
+
+METADATA_FIELDS = {
+    "__version__": "version",
+    "__developer__": "developer",
+    "__description__": "description"
+}
+
+# register_command(name, func, module, description, usage, owner_only, admin_only, timeout)
+COMMAND_ARGS = ("name", "func", "module", "description", "usage", "owner_only", "admin_only", "timeout")
+COMMAND_FIELDS = ("name", "description", "usage", "owner_only", "admin_only", "timeout")
+
+# @command(name, description, usage, owner_only, admin_only) from utils.decorators
+DECORATOR_ARGS = ("name", "description", "usage", "owner_only", "admin_only")
+
+_UNRESOLVED = object()
+
+
+def _decorator_info(function: ast.AST) -> Dict[str, Any]:
+    """Literal arguments of a function's @command(...) decorator"""
+    for decorator in function.decorator_list:
+        if not isinstance(decorator, ast.Call):
+            continue
+        
+        target = decorator.func
+        target_name = target.id if isinstance(target, ast.Name) else getattr(target, "attr", None)
+        if target_name != "command":
+            continue
+        
+        info = {}
+        values = list(zip(DECORATOR_ARGS, decorator.args))
+        values += [(kw.arg, kw.value) for kw in decorator.keywords if kw.arg in DECORATOR_ARGS]
+        for field, node in values:
+            try:
+                info[field] = ast.literal_eval(node)
+            except ValueError:
+                continue
+        return info
+    
+    return {}
+
+
+def _resolve(node: ast.AST, function_name: str, info: Dict[str, Any]) -> Any:
+    """Literal value, or ``func._command_info['key']`` taken from the decorator"""
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        pass
+    
+    if (isinstance(node, ast.Subscript)
+            and isinstance(node.value, ast.Attribute)
+            and node.value.attr == "_command_info"
+            and isinstance(node.value.value, ast.Name)
+            and node.value.value.id == function_name):
+        key = node.slice
+        if sys.version_info < (3, 9):
+            key = key.value  # Wrapped in ast.Index
+        if isinstance(key, ast.Constant) and key.value in info:
+            return info[key.value]
+    
+    return _UNRESOLVED
+
+
+def _command_spec(call: ast.Call, module_arg: str, functions: Dict[str, ast.AST]) -> Optional[Dict[str, Any]]:
+    """Static form of one register_command(...) call, None if it is not static"""
+    if len(call.args) > len(COMMAND_ARGS) or any(kw.arg is None for kw in call.keywords):
+        return None
+    
+    values = dict(zip(COMMAND_ARGS, call.args))
+    for kw in call.keywords:
+        if kw.arg not in COMMAND_ARGS or kw.arg in values:
+            return None
+        values[kw.arg] = kw.value
+    
+    func, module = values.get("func"), values.get("module")
+    if not (isinstance(func, ast.Name) and func.id in functions):
+        return None
+    if not (isinstance(module, ast.Name) and module.id == module_arg):
+        return None
+    
+    info = _decorator_info(functions[func.id])
+    spec: Dict[str, Any] = {"func": func.id}
+    for field in COMMAND_FIELDS:
+        if field not in values:
+            continue
+        value = _resolve(values[field], func.id, info)
+        if value is _UNRESOLVED:
+            return None
+        spec[field] = value
+    
+    if not isinstance(spec.get("name"), str):
+        return None
+    return spec
+
+
+def _extract_metadata(tree: ast.Module) -> Dict[str, Any]:
+    """Literal ``__version__``/``__developer__``/``__description__`` of a module"""
+    metadata: Dict[str, Any] = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            field = METADATA_FIELDS.get(node.targets[0].id)
+            if field is not None:
+                try:
+                    metadata[field] = ast.literal_eval(node.value)
+                except ValueError:
+                    pass
+    return metadata
+
+
+def _extract_commands(tree: ast.Module) -> Optional[Dict[str, Any]]:
+    """Commands and aliases of a module's register function, None if not static"""
+    functions: Dict[str, ast.AST] = {}
+    register = None
+    
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if node.name == "register":
+                register = node
+            else:
+                functions[node.name] = node
+    
+    if register is None or len(register.args.args) != 3:
+        return None
+    
+    handler_arg = register.args.args[1].arg
+    module_arg = register.args.args[2].arg
+    commands: List[Dict[str, Any]] = []
+    aliases: List[List[str]] = []
+    
+    for statement in register.body:
+        if not (isinstance(statement, ast.Expr) and isinstance(statement.value, (ast.Call, ast.Constant))):
+            return None
+        if isinstance(statement.value, ast.Constant):
+            continue  # Docstring
+        
+        call = statement.value
+        target = call.func
+        if not (isinstance(target, ast.Attribute)
+                and isinstance(target.value, ast.Name)
+                and target.value.id == handler_arg):
+            return None
+        
+        if target.attr == "register_command":
+            spec = _command_spec(call, module_arg, functions)
+            if spec is None:
+                return None
+            commands.append(spec)
+        elif target.attr == "register_alias" and len(call.args) == 2 and not call.keywords:
+            try:
+                aliases.append([ast.literal_eval(arg) for arg in call.args])
+            except ValueError:
+                return None
+        else:
+            return None
+    
+    if not commands:
+        return None
+    
+    return {"commands": commands, "aliases": aliases}
+
+
+def describe_module(source: str) -> Dict[str, Any]:
+    """Parse a module once, returns ``{"metadata", "stub"}``
+    
+    ``stub`` is what extract_stub returns, metadata is read even when
+    the commands are not static.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return {"metadata": {}, "stub": None}
+    
+    metadata = _extract_metadata(tree)
+    stub = _extract_commands(tree)
+    if stub is not None:
+        stub = dict(stub, metadata=metadata)
+    return {"metadata": metadata, "stub": stub}
+
+
+def extract_stub(source: str) -> Optional[Dict[str, Any]]:
+    """Read metadata and registered commands of a module without running it
+    
+    Returns ``{"metadata", "commands", "aliases"}`` when the module's
+    ``register`` function only calls ``register_command`` and
+    ``register_alias`` with values known statically, otherwise None and
+    the module has to be imported to be registered.
+    """
+    return describe_module(source)["stub"]
\ No newline at end of file
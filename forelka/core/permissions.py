@@ -0,0 +1,98 @@
+"""
+In-memory permission engine for Forelka Userbot
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class PermissionManager:
+    """Role table for owners and admins of every account
+    
+    The table is loaded from the database once and kept in sync through
+    the owner listeners of ``DatabaseManager``, so permission checks on
+    the command path never touch SQLite.
+    """
+    
+    def __init__(self, bot):
+        self.bot = bot
+        self.owners: Dict[int, Set[int]] = {}
+        self.admins: Dict[int, Set[int]] = {}
+        self._listeners: List[Callable[[int], None]] = []
+        
+        self.bot.db.add_owner_listener(self._on_owner_changed)
+    
+    def add_listener(self, callback: Callable[[int], None]):
+        """Subscribe to role changes of an account"""
+        self._listeners.append(callback)
+    
+    def _notify(self, account_id: int):
+        for callback in self._listeners:
+            callback(account_id)
+    
+    async def load(self, account_ids: Optional[List[int]] = None):
+        """Load roles for the given accounts (all accounts by default)"""
+        roles = await self.bot.db.get_owner_roles(account_ids)
+        
+        if account_ids is None:
+            # Refresh known accounts in place, client.owners holds these sets
+            account_ids = list(set(roles) | set(self.owners))
+        
+        for account_id in account_ids:
+            account_roles = roles.get(account_id, {})
+            self._owners_for(account_id).clear()
+            self._owners_for(account_id).update(account_roles)
+            self._admins_for(account_id).clear()
+            self._admins_for(account_id).update(
+                owner_id for owner_id, is_admin in account_roles.items() if is_admin
+            )
+            self._notify(account_id)
+        
+        logger.debug(f"Loaded roles for {len(account_ids)} account(s)")
+    
+    def _owners_for(self, account_id: int) -> Set[int]:
+        owners = self.owners.get(account_id)
+        if owners is None:
+            owners = self.owners[account_id] = set()
+        return owners
+    
+    def _admins_for(self, account_id: int) -> Set[int]:
+        admins = self.admins.get(account_id)
+        if admins is None:
+            admins = self.admins[account_id] = set()
+        return admins
+    
+    def _on_owner_changed(self, account_id: int, owner_id: int, is_admin: Optional[bool]):
+        """Apply an owner change made through the database"""
+        if is_admin is None:
+            self._owners_for(account_id).discard(owner_id)
+            self._admins_for(account_id).discard(owner_id)
+        else:
+            self._owners_for(account_id).add(owner_id)
+            if is_admin:
+                self._admins_for(account_id).add(owner_id)
+            else:
+                self._admins_for(account_id).discard(owner_id)
+        
+        self._notify(account_id)
+    
+    def is_owner(self, account_id: Optional[int], user_id: Optional[int]) -> bool:
+        """Check if user is an owner of the account"""
+        owners = self.owners.get(account_id)
+        return owners is not None and user_id in owners
+    
+    def is_admin(self, account_id: Optional[int], user_id: Optional[int]) -> bool:
+        """Check if user was granted admin permissions on the account"""
+        admins = self.admins.get(account_id)
+        return admins is not None and user_id in admins
+    
+    def get_owners(self, account_id: int) -> Set[int]:
+        """Get the live owner set of the account"""
+        return self._owners_for(account_id)
+    
+    def forget_account(self, account_id: int):
+        """Drop cached roles of a removed account"""
+        self.owners.pop(account_id, None)
+        self.admins.pop(account_id, None)
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Command scheduler for Forelka Userbot
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CommandScheduler:
+    """Run commands as tasks with bounded concurrency
+    
+    Commands of the same chat run one after another in arrival order,
+    different chats run in parallel up to ``max_concurrency`` commands per
+    account, and every command is cancelled once its timeout expires.
+    """
+    
+    def __init__(self, max_concurrency: int = 8, default_timeout: Optional[float] = 120.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.default_timeout = default_timeout
+        
+        self._semaphores: Dict[Optional[int], asyncio.Semaphore] = {}
+        self._chat_locks: Dict[Tuple[Optional[int], Any], asyncio.Lock] = {}
+        self._chat_refs: Dict[Tuple[Optional[int], Any], int] = {}
+        self._queued: Dict[Optional[int], int] = {}
+        self._tasks: Dict[asyncio.Task, Dict[str, Any]] = {}
+    
+    def submit(self, account_id: Optional[int], chat_id: Any, command: str,
+               func: Callable[[], Awaitable[Any]], timeout: Optional[float] = None,
+               on_timeout: Optional[Callable[[float], Awaitable[Any]]] = None) -> asyncio.Task:
+        """Schedule a command, timeout None uses the default and 0 disables it"""
+        if timeout is None:
+            timeout = self.default_timeout
+        
+        info = {
+            "account_id": account_id,
+            "chat_id": chat_id,
+            "command": command,
+            "timeout": timeout,
+            "queued_at": asyncio.get_event_loop().time(),
+            "started_at": None
+        }
+        
+        task = asyncio.ensure_future(self._run(info, func, on_timeout))
+        self._tasks[task] = info
+        task.add_done_callback(self._on_done)
+        return task
+    
+    def _on_done(self, task: asyncio.Task):
+        info = self._tasks.pop(task, {})
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Command {info.get('command')} crashed: {task.exception()}",
+                         exc_info=task.exception())
+    
+    async def _run(self, info: Dict[str, Any], func: Callable[[], Awaitable[Any]],
+                   on_timeout: Optional[Callable[[float], Awaitable[Any]]]):
+        account_id = info["account_id"]
+        key = (account_id, info["chat_id"])
+        
+        lock = self._chat_locks.get(key)
+        if lock is None:
+            lock = self._chat_locks[key] = asyncio.Lock()
+        self._chat_refs[key] = self._chat_refs.get(key, 0) + 1
+        
+        semaphore = self._semaphores.get(account_id)
+        if semaphore is None:
+            semaphore = self._semaphores[account_id] = asyncio.Semaphore(self.max_concurrency)
+        
+        self._queued[account_id] = self._queued.get(account_id, 0) + 1
+        queued = True
+        
+        try:
+            async with lock:
+                async with semaphore:
+                    self._queued[account_id] -= 1
+                    queued = False
+                    info["started_at"] = asyncio.get_event_loop().time()
+                    
+                    if not info["timeout"]:
+                        return await func()
+                    
+                    try:
+                        return await asyncio.wait_for(func(), info["timeout"])
+                    except asyncio.TimeoutError:
+                        logger.warning(f"Command {info['command']} timed out after {info['timeout']}s")
+                        if on_timeout is not None:
+                            await on_timeout(info["timeout"])
+        finally:
+            if queued:
+                self._queued[account_id] -= 1
+            
+            self._chat_refs[key] -= 1
+            if not self._chat_refs[key]:
+                del self._chat_refs[key]
+                del self._chat_locks[key]
+    
+    def queue_depth(self, account_id: Optional[int] = None) -> int:
+        """Number of commands waiting for their chat or a free slot"""
+        if account_id is not None:
+            return self._queued.get(account_id, 0)
+        return sum(self._queued.values())
+    
+    def in_flight(self, account_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Describe scheduled commands, running and queued"""
+        return [
+            dict(info) for info in self._tasks.values()
+            if account_id is None or info["account_id"] == account_id
+        ]
+    
+    def cancel(self, account_id: Optional[int] = None, chat_id: Any = None,
+               command: Optional[str] = None) -> int:
+        """Cancel matching commands, returns the number of cancelled tasks"""
+        cancelled = 0
+        
+        for task, info in list(self._tasks.items()):
+            if account_id is not None and info["account_id"] != account_id:
+                continue
+            if chat_id is not None and info["chat_id"] != chat_id:
+                continue
+            if command is not None and info["command"] != command:
+                continue
+            
+            if task.cancel():
+                cancelled += 1
+        
+        if cancelled:
+            logger.info(f"Cancelled {cancelled} command(s)")
+        return cancelled
+    
+    async def join(self):
+        """Wait until every scheduled command has finished"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+    
+    async def shutdown(self):
+        """Cancel every scheduled command and wait for them to exit"""
+        self.cancel()
+        await self.join()
\ No newline at end of file
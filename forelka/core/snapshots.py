@@ -0,0 +1,296 @@
+"""
+Deduplicated snapshot store for Forelka Userbot
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def copy_sqlite(source_path: str, target_path: str):
+    """Consistent copy of a SQLite file that another process may be writing"""
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+class SnapshotStore:
+    """Content-addressed store of file snapshots
+    
+    Files are split into fixed-size chunks (a multiple of the SQLite page
+    size, so a changed page only changes its own chunk), every unique
+    chunk is stored once, zlib compressed, under its SHA-256, and each
+    snapshot is a JSON manifest listing the chunks of its files.
+    
+    Layout of ``root``::
+    
+        chunks/ab/abcdef...   compressed chunk data
+        manifests/<id>.json   one manifest per snapshot
+        index.json            snapshot summaries, newest last
+    
+    Methods block on file I/O, run them in an executor from async code.
+    """
+    
+    def __init__(self, root: str = "backups", chunk_size: int = 64 * 1024, level: int = 6):
+        self.root = root
+        self.chunk_size = max(4096, chunk_size - chunk_size % 4096)
+        self.level = level
+        self._lock = threading.Lock()
+        self._index: Optional[List[Dict[str, Any]]] = None
+        
+        for directory in (self._chunks_dir, self._manifests_dir):
+            os.makedirs(directory, exist_ok=True)
+    
+    @property
+    def _chunks_dir(self) -> str:
+        return os.path.join(self.root, "chunks")
+    
+    @property
+    def _manifests_dir(self) -> str:
+        return os.path.join(self.root, "manifests")
+    
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.root, "index.json")
+    
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self._chunks_dir, digest[:2], digest)
+    
+    def _manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self._manifests_dir, f"{snapshot_id}.json")
+    
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        partial = f"{path}.partial"
+        with open(partial, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+    
+    @staticmethod
+    def _summary(manifest: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": manifest["id"],
+            "created_at": manifest["created_at"],
+            "label": manifest.get("label", ""),
+            "files": len(manifest["files"]),
+            "size": sum(entry["size"] for entry in manifest["files"]),
+            "stored": manifest.get("stored", 0)
+        }
+    
+    def _load_index(self) -> List[Dict[str, Any]]:
+        if self._index is not None:
+            return self._index
+        
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                self._index = json.load(f)["snapshots"]
+        except (OSError, ValueError, KeyError):
+            # Missing or damaged index, the manifests are the source of truth
+            self._index = []
+            for name in os.listdir(self._manifests_dir):
+                if name.endswith(".json"):
+                    manifest = self.get_manifest(name[:-len(".json")])
+                    if manifest is not None:
+                        self._index.append(self._summary(manifest))
+            self._index.sort(key=lambda summary: summary["created_at"])
+            if self._index:
+                self._save_index()
+        
+        return self._index
+    
+    def _save_index(self):
+        data = json.dumps({"snapshots": self._index}, ensure_ascii=False, indent=1)
+        self._write_atomic(self._index_path, data.encode("utf-8"))
+    
+    def _store_file(self, path: str) -> Dict[str, Any]:
+        """Store the chunks of one file, returns its manifest entry"""
+        chunks = []
+        stored = 0
+        whole = hashlib.sha256()
+        
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                
+                whole.update(data)
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append(digest)
+                
+                chunk_path = self._chunk_path(digest)
+                if not os.path.exists(chunk_path):
+                    compressed = zlib.compress(data, self.level)
+                    os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+                    self._write_atomic(chunk_path, compressed)
+                    stored += len(compressed)
+        
+        stat = os.stat(path)
+        return {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": whole.hexdigest(),
+            "chunks": chunks,
+            "stored": stored
+        }
+    
+    def create(self, files: Dict[str, str], label: str = "") -> Dict[str, Any]:
+        """Snapshot files given as {name in snapshot: path on disk}"""
+        with self._lock:
+            index = self._load_index()
+            created_at = time.time()
+            
+            snapshot_id = time.strftime("%Y%m%d_%H%M%S", time.localtime(created_at))
+            taken = {summary["id"] for summary in index}
+            suffix = 1
+            while snapshot_id in taken or os.path.exists(self._manifest_path(snapshot_id)):
+                suffix += 1
+                snapshot_id = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(created_at))}-{suffix}"
+            
+            entries = []
+            for name, path in sorted(files.items()):
+                entry = self._store_file(path)
+                entry["name"] = name
+                entries.append(entry)
+            
+            manifest = {
+                "id": snapshot_id,
+                "created_at": created_at,
+                "label": label,
+                "chunk_size": self.chunk_size,
+                "stored": sum(entry.pop("stored") for entry in entries),
+                "files": entries
+            }
+            
+            # Chunks first, then the manifest, then the index
+            self._write_atomic(self._manifest_path(snapshot_id),
+                               json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+            summary = self._summary(manifest)
+            index.append(summary)
+            self._save_index()
+        
+        logger.info(f"Snapshot {snapshot_id}: {summary['files']} file(s), "
+                    f"{summary['size']} bytes, {summary['stored']} new bytes stored")
+        return summary
+    
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """Snapshot summaries, newest first"""
+        with self._lock:
+            return [dict(summary) for summary in reversed(self._load_index())]
+    
+    def get_manifest(self, snapshot_id: str) -> Optional[Dict[str, Any]]:
+        """Full manifest of a snapshot, None if it does not exist"""
+        if os.path.basename(snapshot_id) != snapshot_id or snapshot_id.startswith("."):
+            return None
+        
+        try:
+            with open(self._manifest_path(snapshot_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def extract(self, snapshot_id: str, name: str, target_path: str) -> str:
+        """Rebuild one file of a snapshot at target_path, verifying its hash"""
+        manifest = self.get_manifest(snapshot_id)
+        if manifest is None:
+            raise KeyError(f"Snapshot {snapshot_id} not found")
+        
+        entry = next((e for e in manifest["files"] if e["name"] == name), None)
+        if entry is None:
+            raise KeyError(f"File {name} is not in snapshot {snapshot_id}")
+        
+        partial = f"{target_path}.partial"
+        whole = hashlib.sha256()
+        try:
+            with open(partial, "wb") as out:
+                for digest in entry["chunks"]:
+                    with open(self._chunk_path(digest), "rb") as f:
+                        data = zlib.decompress(f.read())
+                    whole.update(data)
+                    out.write(data)
+            
+            if whole.hexdigest() != entry["sha256"]:
+                raise ValueError(f"File {name} of snapshot {snapshot_id} is corrupted")
+            
+            os.replace(partial, target_path)
+        except Exception:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        
+        return target_path
+    
+    def prune(self, keep_last: int = 10, keep_days: float = 30) -> Dict[str, int]:
+        """Apply the retention policy and delete chunks no snapshot uses
+        
+        A snapshot is dropped when it is not among the newest ``keep_last``
+        or is older than ``keep_days``; 0 disables a rule. The newest
+        snapshot is always kept.
+        """
+        with self._lock:
+            index = self._load_index()
+            cutoff = time.time() - keep_days * 86400 if keep_days else None
+            
+            kept, dropped = [], []
+            for position, summary in enumerate(reversed(index)):
+                too_many = keep_last and position >= keep_last
+                too_old = cutoff is not None and summary["created_at"] < cutoff
+                if position and (too_many or too_old):
+                    dropped.append(summary)
+                else:
+                    kept.append(summary)
+            
+            if dropped:
+                self._index = list(reversed(kept))
+                self._save_index()
+                for summary in dropped:
+                    try:
+                        os.remove(self._manifest_path(summary["id"]))
+                    except FileNotFoundError:
+                        pass
+            
+            removed, freed = self._collect_garbage()
+        
+        if dropped or removed:
+            logger.info(f"Pruned {len(dropped)} snapshot(s), {removed} chunk(s), {freed} bytes")
+        return {"snapshots": len(dropped), "chunks": removed, "bytes": freed}
+    
+    def _collect_garbage(self):
+        """Delete chunks not referenced by any manifest on disk"""
+        referenced: Set[str] = set()
+        for name in os.listdir(self._manifests_dir):
+            if not name.endswith(".json"):
+                continue
+            manifest = self.get_manifest(name[:-len(".json")])
+            if manifest is None:
+                # Unreadable manifest, keep every chunk rather than guess
+                return 0, 0
+            for entry in manifest["files"]:
+                referenced.update(entry["chunks"])
+        
+        removed = freed = 0
+        for prefix in os.listdir(self._chunks_dir):
+            directory = os.path.join(self._chunks_dir, prefix)
+            for digest in os.listdir(directory):
+                if digest in referenced:
+                    continue
+                path = os.path.join(directory, digest)
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+        
+        return removed, freed
\ No newline at end of file
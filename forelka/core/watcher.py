@@ -0,0 +1,217 @@
+"""
+Module file watcher for Forelka Userbot
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+
+# struct inotify_event {int wd; uint32_t mask, cookie, len; char name[];}
+_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal inotify binding over ctypes, Linux only"""
+    
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        
+        self._watches: Dict[int, str] = {}
+    
+    def add_watch(self, directory: str, mask: int = WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self._watches[wd] = directory
+    
+    def read_events(self) -> Tuple[List[str], bool]:
+        """Paths of pending events, and whether the kernel queue overflowed"""
+        paths, overflow = [], False
+        
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif wd in self._watches and name:
+                    paths.append(os.path.join(self._watches[wd], os.fsdecode(name)))
+        
+        return paths, overflow
+    
+    def close(self):
+        os.close(self.fd)
+
+
+class ModuleWatcher:
+    """Report changed ``.py`` files of the module directories
+    
+    Uses inotify where available and polls mtimes otherwise. Events are
+    collected for ``debounce`` seconds, so an editor's burst of writes
+    becomes one callback with the set of changed paths; None means
+    "rescan everything" (the event queue overflowed). Callbacks never
+    overlap.
+    """
+    
+    def __init__(self, directories: Iterable[str],
+                 callback: Callable[[Optional[Set[str]]], Awaitable[None]],
+                 debounce: float = 0.5, poll_interval: float = 2.0):
+        self.directories = list(directories)
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        
+        self.mode: Optional[str] = None
+        self._inotify: Optional[Inotify] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._pending: Optional[Set[str]] = set()
+        self._lock = asyncio.Lock()
+    
+    @staticmethod
+    def _is_module(path: str) -> bool:
+        name = os.path.basename(path)
+        return name.endswith(".py") and not name.startswith(("__", "."))
+    
+    async def start(self):
+        loop = asyncio.get_event_loop()
+        
+        try:
+            inotify = Inotify()
+            try:
+                for directory in self.directories:
+                    inotify.add_watch(directory)
+            except OSError:
+                inotify.close()
+                raise
+        except (OSError, AttributeError) as e:
+            # AttributeError: libc without inotify_init1
+            logger.info(f"inotify unavailable ({e}), polling module files every {self.poll_interval}s")
+            self.mode = "poll"
+            previous = await loop.run_in_executor(None, self._snapshot)
+            self._poll_task = asyncio.ensure_future(self._poll(previous))
+            return
+        
+        self._inotify = inotify
+        self.mode = "inotify"
+        loop.add_reader(inotify.fd, self._on_readable)
+    
+    async def stop(self):
+        if self._inotify is not None:
+            asyncio.get_event_loop().remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        for task in (self._poll_task, self._flush_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._poll_task = self._flush_task = None
+    
+    def _on_readable(self):
+        paths, overflow = self._inotify.read_events()
+        
+        if overflow:
+            self._pending = None
+        elif self._pending is not None:
+            self._pending.update(path for path in paths if self._is_module(path))
+        
+        if self._pending is None or self._pending:
+            self._schedule_flush()
+    
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = asyncio.get_event_loop().call_later(self.debounce, self._start_flush)
+    
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.ensure_future(self._flush())
+    
+    async def _flush(self):
+        async with self._lock:
+            paths, self._pending = self._pending, set()
+            if paths is not None and not paths:
+                return
+            
+            try:
+                await self.callback(paths)
+            except Exception as e:
+                logger.error(f"Module reload after file change failed: {e}")
+    
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for directory in self.directories:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            
+            for entry in entries:
+                if not self._is_module(entry.path):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+    
+    async def _poll(self, previous: Dict[str, Tuple[int, int]]):
+        loop = asyncio.get_event_loop()
+        
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await loop.run_in_executor(None, self._snapshot)
+            
+            changed = {path for path in set(previous) | set(current) if previous.get(path) != current.get(path)}
+            previous = current
+            
+            if changed and self._pending is not None:
+                self._pending.update(changed)
+                self._schedule_flush()
\ No newline at end of file
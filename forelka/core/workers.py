@@ -0,0 +1,368 @@
+"""
+Process pool for CPU-heavy modules
+"""
+
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Handles of the objects every request starts with
+CLIENT_HANDLE = 0
+MESSAGE_HANDLE = 1
+
+
+class WorkerError(Exception):
+    """A command failed inside a worker process, or the worker died"""
+
+
+class _Handle:
+    """Reference to an object that lives in the main process"""
+    
+    __slots__ = ("id",)
+    
+    def __init__(self, handle_id: int):
+        self.id = handle_id
+
+
+# Worker side
+
+class RemoteObject:
+    """Proxy of a main process object inside a worker
+    
+    Attribute reads and method calls are sent to the main process. Plain
+    values come back as copies, anything that cannot be pickled (clients,
+    messages, chats) comes back as another RemoteObject. Methods that are
+    coroutines in the main process are awaitable here.
+    """
+    
+    def __init__(self, channel: "_WorkerChannel", handle_id: int):
+        object.__setattr__(self, "_channel", channel)
+        object.__setattr__(self, "_handle", handle_id)
+    
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._channel.request("getattr", self._handle, name)
+    
+    def __setattr__(self, name: str, value):
+        raise AttributeError("Objects of the main process are read only in a worker")
+    
+    def __repr__(self) -> str:
+        return f"<RemoteObject #{self._handle}>"
+
+
+class RemoteMethod:
+    """Bound method of a main process object"""
+    
+    def __init__(self, channel: "_WorkerChannel", handle_id: int, name: str):
+        self._channel = channel
+        self._handle = handle_id
+        self._name = name
+    
+    def __call__(self, *args, **kwargs):
+        return self._channel.request("call", self._handle, self._name, args, kwargs)
+
+
+async def _resolved(value):
+    return value
+
+
+class _WorkerChannel:
+    """Blocking request/response over the worker's pipe
+    
+    A worker runs one command at a time, so a remote call simply waits
+    for its answer.
+    """
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def _wrap(self, value):
+        if isinstance(value, RemoteObject):
+            return _Handle(value._handle)
+        if isinstance(value, (list, tuple)):
+            return type(value)(self._wrap(item) for item in value)
+        if isinstance(value, dict):
+            return {key: self._wrap(item) for key, item in value.items()}
+        return value
+    
+    def request(self, kind: str, handle_id: int, name: str, args: tuple = (), kwargs: Optional[dict] = None):
+        self.conn.send((kind, handle_id, name, self._wrap(args), self._wrap(kwargs or {})))
+        status, value, awaitable = self.conn.recv()
+        
+        if status == "error":
+            raise WorkerError(value)
+        if status == "method":
+            value = RemoteMethod(self, handle_id, name)
+        elif status == "handle":
+            value = RemoteObject(self, value)
+        
+        return _resolved(value) if awaitable else value
+
+
+def _worker_main(conn):
+    """Entry point of a worker process"""
+    from .module_loader import ModuleLoader
+    
+    channel = _WorkerChannel(conn)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    modules: Dict[str, Tuple[str, Any]] = {}
+    
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        
+        _, source, func_name, args = request
+        try:
+            cached = modules.get(source["path"])
+            if cached is None or cached[0] != source["hash"]:
+                cached = modules[source["path"]] = (source["hash"], ModuleLoader._exec_module(source))
+            
+            func = getattr(cached[1], func_name)
+            client = RemoteObject(channel, CLIENT_HANDLE)
+            message = RemoteObject(channel, MESSAGE_HANDLE)
+            loop.run_until_complete(func(client, message, args))
+            conn.send(("done", None, None, None, None))
+        except Exception as e:
+            conn.send(("failed", None, f"{type(e).__name__}: {e}", None, None))
+
+
+# Main process side
+
+class _Worker:
+    def __init__(self, context):
+        self.parent, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.started_at = time.time()
+    
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+    
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+        self.parent.close()
+
+
+class WorkerPool:
+    """Runs commands of modules declaring ``__heavy__ = True`` in worker processes
+    
+    A command is sent to an idle worker as (module source, function name,
+    args). Inside the worker ``client`` and ``message`` are RemoteObject
+    proxies, so the usual ``await message.edit(...)`` works while the
+    command's own computation runs outside the event loop. A worker that
+    crashes, or whose command is cancelled or times out, is killed and
+    replaced by the supervisor.
+    """
+    
+    def __init__(self, processes: int = 2, restart_delay: float = 1.0):
+        self.processes = max(1, processes)
+        self.restart_delay = restart_delay
+        self.restarts = 0
+        
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._supervisor: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._idle is not None
+    
+    async def start(self):
+        """Start the workers, done on the first heavy command"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        
+        async with self._start_lock:
+            if self.running:
+                return
+            
+            loop = asyncio.get_event_loop()
+            # One thread per worker waits for its answers
+            self._executor = ThreadPoolExecutor(max_workers=self.processes, thread_name_prefix="forelka-workers")
+            
+            idle = asyncio.Queue()
+            for _ in range(self.processes):
+                worker = await loop.run_in_executor(None, _Worker, self._context)
+                self._workers.append(worker)
+                idle.put_nowait(worker)
+            self._idle = idle
+            
+            self._supervisor = asyncio.ensure_future(self._supervise())
+            logger.info(f"⚙️  Started {self.processes} worker process(es) for heavy modules")
+    
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+            self._supervisor = None
+        
+        for worker in self._workers:
+            worker.kill()
+        self._workers.clear()
+        self._idle = None
+        
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+    
+    async def _replace(self, worker: _Worker):
+        """Kill a worker and start another one in its place"""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, worker.kill)
+        if worker in self._workers:
+            self._workers.remove(worker)
+        
+        self.restarts += 1
+        await asyncio.sleep(self.restart_delay)
+        
+        replacement = await loop.run_in_executor(None, _Worker, self._context)
+        self._workers.append(replacement)
+        if self._idle is not None:
+            self._idle.put_nowait(replacement)
+    
+    async def _supervise(self):
+        """Replace idle workers that died outside a request"""
+        while True:
+            await asyncio.sleep(5)
+            
+            dead = []
+            for _ in range(self._idle.qsize()):
+                worker = self._idle.get_nowait()
+                if worker.is_alive():
+                    self._idle.put_nowait(worker)
+                else:
+                    dead.append(worker)
+            
+            for worker in dead:
+                logger.warning(f"Worker process {worker.process.pid} died, restarting")
+                await self._replace(worker)
+    
+    async def _serve(self, handles: Dict[int, Any], request: tuple) -> tuple:
+        """Answer one getattr/call request of a worker"""
+        kind, handle_id, name, args, kwargs = request
+        
+        def unwrap(value):
+            if isinstance(value, _Handle):
+                return handles[value.id]
+            if isinstance(value, (list, tuple)):
+                return type(value)(unwrap(item) for item in value)
+            if isinstance(value, dict):
+                return {key: unwrap(item) for key, item in value.items()}
+            return value
+        
+        try:
+            target = handles[handle_id]
+            value = getattr(target, name)
+            awaitable = False
+            
+            if kind == "getattr":
+                if callable(value) and not isinstance(value, type):
+                    return ("method", None, False)
+            else:
+                value = value(*unwrap(args), **unwrap(kwargs))
+                if inspect.isawaitable(value):
+                    value = await value
+                    awaitable = True
+        except Exception as e:
+            return ("error", f"{type(e).__name__}: {e}", False)
+        
+        try:
+            pickle.dumps(value)
+            return ("value", value, awaitable)
+        except Exception:
+            handle_id = len(handles)
+            handles[handle_id] = value
+            return ("handle", handle_id, awaitable)
+    
+    async def run(self, source: Dict[str, Any], func_name: str, client, message, args: List[str]):
+        """Run a command function of a heavy module in a worker"""
+        if self._idle is None:
+            await self.start()
+        
+        loop = asyncio.get_event_loop()
+        worker = await self._idle.get()
+        handles: Dict[int, Any] = {CLIENT_HANDLE: client, MESSAGE_HANDLE: message}
+        healthy = False
+        
+        try:
+            worker.parent.send(("run", source, func_name, list(args)))
+            while True:
+                request = await loop.run_in_executor(self._executor, worker.parent.recv)
+                if request[0] == "done":
+                    healthy = True
+                    return
+                if request[0] == "failed":
+                    healthy = True
+                    raise WorkerError(request[2])
+                
+                worker.parent.send(await self._serve(handles, request))
+        except (EOFError, OSError) as e:
+            raise WorkerError(f"Worker process crashed: {str(e) or type(e).__name__}")
+        finally:
+            if self._idle is None:
+                pass  # Pool stopped meanwhile, stop() killed the worker
+            elif healthy and worker.is_alive():
+                self._idle.put_nowait(worker)
+            else:
+                # Crashed, cancelled or timed out mid-command, the worker state is unknown
+                asyncio.ensure_future(self._replace(worker))
+    
+    def wrap(self, source: Dict[str, Any], func: Callable) -> Callable:
+        """Command function that runs func in the pool"""
+        func_name = getattr(func, "__name__", None)
+        
+        @wraps(func)
+        async def heavy_command(client, message, args):
+            return await self.run(source, func_name, client, message, args)
+        
+        heavy_command.__heavy__ = True
+        return heavy_command
+    
+    def offload(self, module, source: Dict[str, Any], commands: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Point the registered commands of a heavy module at the pool
+        
+        Only functions reachable as attributes of the module can be found
+        again in a worker, others keep running on the event loop.
+        """
+        source = {"name": source["name"], "path": source["path"], "hash": source["hash"]}
+        offloaded = []
+        
+        for command_name, command in commands.items():
+            func = command["func"]
+            if getattr(module, getattr(func, "__name__", ""), None) is not func:
+                logger.warning(f"Command {command_name} of heavy module {source['name']} "
+                               f"is not a module level function, running it in process")
+                continue
+            command["func"] = self.wrap(source, func)
+            offloaded.append(command_name)
+        
+        return offloaded
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "processes": self.processes,
+            "alive": sum(1 for worker in self._workers if worker.is_alive()),
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "restarts": self.restarts
+        }
\ No newline at end of file
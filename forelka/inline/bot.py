@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command, CommandStart
 from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
@@ -12,6 +12,8 @@ from datetime import datetime
 
 from ..core.database import DatabaseManager
 from ..core.config import ConfigManager
+from ..core.log_reader import DEFAULT_LOG_FILE, log_exists, render_line, tail_lines
+from ..core.log_search import get_log_search, parse_query
 from ..utils.helpers import format_uptime
 
 
@@ -31,7 +33,7 @@ class ForelkaInlineBot:
         
         self.bot = Bot(token=self.token)
         self.dp = Dispatcher()
-        self.db = DatabaseManager(self.config.get("database_path", "forelka.db"))
+        self.db = DatabaseManager.from_config(self.config)
         
         self.START_TIME = time.time()
         self.CACHE = {}
@@ -81,7 +83,8 @@ class ForelkaInlineBot:
             "Используйте:\n"
             "- Пустой запрос — последние строки лога\n"
             "- status — статус юзербота\n"
-            "- search <слово> — поиск по логам"
+            "- search <слово> — поиск по логам\n"
+            "  (level:error, since:2h, until:2024-01-31, /regex/)"
         )
         await message.answer(help_text)
     
@@ -91,16 +94,19 @@ class ForelkaInlineBot:
             return
         
         query = inline_query.query.strip()
-        results = await self._get_inline_results(query)
-        await self.bot.answer_inline_query(inline_query.id, results, cache_time=1)
+        results, next_offset = await self._get_inline_results(query, inline_query.offset or "")
+        await self.bot.answer_inline_query(inline_query.id, results, cache_time=1, next_offset=next_offset)
     
-    async def _get_inline_results(self, query: str):
-        if query in self.CACHE:
-            cached_time, results = self.CACHE[query]
+    async def _get_inline_results(self, query: str, offset: str = ""):
+        """Results and the offset of the next page, "" when there is none"""
+        cache_key = f"{query}\n{offset}"
+        if cache_key in self.CACHE:
+            cached_time, results, next_offset = self.CACHE[cache_key]
             if time.time() - cached_time < self.CACHE_TTL:
-                return results
+                return results, next_offset
         
         results = []
+        next_offset = ""
         
         if query == "":
             text = await self._get_recent_logs(20)
@@ -123,12 +129,13 @@ class ForelkaInlineBot:
         elif query.lower().startswith("search "):
             keyword = query[7:].strip()
             if keyword:
-                text = await self._search_logs(keyword, 15)
+                # Scrolling the results loads older matches, the offset is the search cursor
+                text, next_offset = await self._search_logs(keyword, 15, offset or None)
             else:
                 text = "Введите ключевое слово после команды 'search'"
             
             results.append(InlineQueryResultArticle(
-                id="search",
+                id=f"search:{offset}"[:64],
                 title=f"🔍 Поиск: {keyword}" if keyword else self.strings['inline']['search'],
                 input_message_content=InputTextMessageContent(message_text=text),
                 description=f"Результаты поиска по '{keyword}'" if keyword else "Поиск в логах"
@@ -148,51 +155,48 @@ class ForelkaInlineBot:
                 description="Помощь"
             ))
         
-        self.CACHE[query] = (time.time(), results)
-        return results
+        self.CACHE[cache_key] = (time.time(), results, next_offset)
+        return results, next_offset
     
     async def _get_recent_logs(self, num_lines: int = 20) -> str:
-        log_file = 'forelka.log'
-        if not os.path.exists(log_file):
+        if not log_exists():
             return self.strings['inline']['log_file_missing']
         
         try:
-            with open(log_file, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            return "".join(lines[-num_lines:]).strip() or self.strings['inline']['log_empty']
+            lines = await asyncio.get_event_loop().run_in_executor(None, tail_lines, DEFAULT_LOG_FILE, num_lines)
+            return "".join(render_line(line) for line in lines).strip() or self.strings['inline']['log_empty']
         except Exception as e:
             return f"Ошибка чтения логов: {e}"
     
-    async def _search_logs(self, keyword: str, max_results: int = 10) -> str:
-        log_file = 'forelka.log'
-        if not os.path.exists(log_file):
-            return self.strings['inline']['log_file_missing']
+    async def _search_logs(self, keyword: str, max_results: int = 10,
+                           cursor: Optional[str] = None) -> Tuple[str, str]:
+        """Newest matches first, and the cursor of older ones ("" when done)"""
+        if not log_exists():
+            return self.strings['inline']['log_file_missing'], ""
         
-        keyword = keyword.lower()
-        found = []
+        options = parse_query(keyword)
+        if cursor:
+            options["cursor"] = cursor
         
         try:
-            with open(log_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    if keyword in line.lower():
-                        found.append(line.strip())
-                        if len(found) >= max_results:
-                            break
+            page = await asyncio.get_event_loop().run_in_executor(
+                None, lambda: get_log_search(DEFAULT_LOG_FILE).search(limit=max_results, **options)
+            )
             
-            if not found:
-                return self.strings['inline']['search_no_results'].format(keyword=keyword)
+            if not page["results"]:
+                return self.strings['inline']['search_no_results'].format(keyword=keyword), ""
             
-            return "\n".join(found)
+            return "\n".join(result["line"].strip() for result in page["results"]), page["cursor"] or ""
         except Exception as e:
-            return f"Ошибка поиска: {e}"
+            return f"Ошибка поиска: {e}", ""
     
     async def _get_status_text(self) -> str:
         uptime = format_uptime(time.time() - self.START_TIME)
-        log_exists = os.path.exists('forelka.log')
+        has_log = log_exists()
         
         return self.strings['inline']['status_text'].format(
             uptime=uptime,
-            log_status="есть" if log_exists else "отсутствует"
+            log_status="есть" if has_log else "отсутствует"
         )
     
     async def run(self):
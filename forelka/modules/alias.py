@@ -13,8 +13,7 @@ async def alias_cmd(client, message, args):
     
     if not args:
         # Show all aliases
-        aliases = await client.bot.db.get_all_settings(account_id)
-        alias_settings = {k: v for k, v in aliases.items() if k.startswith('alias_')}
+        alias_settings = await client.bot.db.get_settings_by_prefix(account_id, 'alias_')
         
         if not alias_settings:
             await message.edit(
@@ -35,7 +34,7 @@ async def alias_cmd(client, message, args):
         alias_name = args[0].lower()
         alias_key = f"alias_{alias_name}"
         
-        current_aliases = await client.bot.db.get_all_settings(account_id)
+        current_aliases = await client.bot.db.get_settings_by_prefix(account_id, 'alias_')
         if alias_key not in current_aliases:
             await message.edit(
                 f"❌ <b>Alias</b> <code>{alias_name}</code> <b>not found</b>",
@@ -43,7 +42,8 @@ async def alias_cmd(client, message, args):
             )
             return
         
-        await client.bot.db.set_setting(account_id, alias_key, None)
+        await client.bot.db.delete_setting(account_id, alias_key)
+        client.bot.commands.unregister_alias(alias_name, account_id)
         await message.edit(
             f"✅ <b>Deleted alias:</b> <code>{alias_name}</code>",
             parse_mode="HTML"
@@ -65,8 +65,8 @@ async def alias_cmd(client, message, args):
     alias_key = f"alias_{alias_name}"
     await client.bot.db.set_setting(account_id, alias_key, target_command)
     
-    # Update command handler aliases
-    client.bot.commands.register_alias(alias_name, target_command)
+    # Update the account's dispatch index
+    client.bot.commands.register_alias(alias_name, target_command, account_id)
     
     await message.edit(
         f"✅ <b>Created alias:</b> <code>{alias_name}</code> → <code>{target_command}</code>",
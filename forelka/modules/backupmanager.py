@@ -1,29 +1,98 @@
 import asyncio
+import glob
+import html
 import os
 import shutil
+import tempfile
 import time
-from typing import List
+from datetime import datetime
+from typing import Dict, List
 from pyrogram.types import Message
 
+from ..core.snapshots import copy_sqlite
 from ..utils.decorators import command, with_strings, owner_only
+from ..utils.helpers import format_size
 
+# Seconds between progress edits of the command message
+PROGRESS_INTERVAL = 2.0
 
-@command("backup", "Create a backup", ".backup")
+
+async def _collect_files(bot, staging: str, progress=None) -> Dict[str, str]:
+    """Consistent copies of the database and sessions plus module files"""
+    loop = asyncio.get_event_loop()
+    db_path = bot.db.db_path
+    
+    db_copy = os.path.join(staging, os.path.basename(db_path))
+    await bot.db.backup(db_copy, progress=progress)
+    files = {f"database/{os.path.basename(db_path)}": db_copy}
+    
+    for session in glob.glob("*.session"):
+        session_copy = os.path.join(staging, session)
+        await loop.run_in_executor(None, copy_sqlite, session, session_copy)
+        files[f"sessions/{session}"] = session_copy
+    
+    modules_dir = bot.modules.loaded_modules_dir
+    if os.path.isdir(modules_dir):
+        for name in os.listdir(modules_dir):
+            if name.endswith(".py"):
+                files[f"modules/{name}"] = os.path.join(modules_dir, name)
+    
+    return files
+
+
+@command("backup", "Create a backup", ".backup [label]")
 @with_strings
 @owner_only
 async def backup_cmd(client, message: Message, args: List[str]):
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
     db_path = client.bot.db.db_path
     
-    if os.path.exists(db_path):
-        backup_db = f"{db_path}.backup.{timestamp}"
-        shutil.copy2(db_path, backup_db)
-        await client.bot.messages.send_success(client, message, "backup.created", file=backup_db)
-    else:
+    if not os.path.exists(db_path):
         await client.bot.messages.send_error(client, message, "backup.file_not_found", file=db_path)
+        return
+    
+    last_report = time.monotonic()
+    
+    async def report(percent: int):
+        try:
+            await client.bot.messages.send_message(
+                client, message, client.bot.strings.get("backup.progress", percent=percent)
+            )
+        except Exception:
+            pass  # Progress is best effort, e.g. the message was not modified
+    
+    def on_progress(copied: int, total: int):
+        nonlocal last_report
+        now = time.monotonic()
+        if copied < total and now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            asyncio.ensure_future(report(copied * 100 // max(total, 1)))
+    
+    store = client.bot.snapshots
+    backups_config = client.bot.config.get_backups_config()
+    loop = asyncio.get_event_loop()
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=store.root)
+    
+    try:
+        files = await _collect_files(client.bot, staging, on_progress)
+        snapshot = await loop.run_in_executor(None, store.create, files, " ".join(args))
+        await loop.run_in_executor(
+            None, store.prune,
+            int(backups_config.get("keep_last", 10)), float(backups_config.get("keep_days", 30))
+        )
+    except Exception as e:
+        await client.bot.messages.send_error(client, message, "backup.failed", error=str(e))
+        return
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    
+    await client.bot.messages.send_success(
+        client, message, "backup.snapshot_created",
+        id=snapshot["id"], files=snapshot["files"],
+        size=format_size(snapshot["size"]), stored=format_size(snapshot["stored"])
+    )
 
 
-@command("restore", "Restore from backup", ".restore [backup_file]")
+@command("restore", "Restore from backup", ".restore [snapshot_id|backup_file]")
 @with_strings
 @owner_only
 async def restore_cmd(client, message: Message, args: List[str]):
@@ -32,48 +101,60 @@ async def restore_cmd(client, message: Message, args: List[str]):
         return
     
     backup_file = args[0]
+    db_path = client.bot.db.db_path
+    extracted = None
+    
+    # Snapshot ids are rebuilt from the store next to the database
+    manifest = client.bot.snapshots.get_manifest(backup_file)
+    if manifest is not None:
+        extracted = f"{db_path}.restore.{backup_file}"
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, client.bot.snapshots.extract,
+                backup_file, f"database/{os.path.basename(db_path)}", extracted
+            )
+        except Exception as e:
+            await client.bot.messages.send_error(client, message, "backup.restore_failed", error=str(e))
+            return
     
-    if not os.path.exists(backup_file):
+    source = extracted or backup_file
+    if not os.path.exists(source):
         await client.bot.messages.send_error(client, message, "backup.file_not_found", file=backup_file)
         return
     
     try:
         await client.bot.messages.send_message(client, message, client.bot.strings.get("backup.applying"))
         
-        db_path = client.bot.db.db_path
-        shutil.copy2(backup_file, db_path)
+        await client.bot.restore_database(source)
         
         await client.bot.messages.send_success(client, message, "backup.restored", file=backup_file)
         
     except Exception as e:
         await client.bot.messages.send_error(client, message, "backup.restore_failed", error=str(e))
+    finally:
+        if extracted is not None and os.path.exists(extracted):
+            os.remove(extracted)
 
 
 @command("listbackups", "List available backups", ".listbackups")
 @with_strings
 @owner_only
 async def list_backups_cmd(client, message: Message, args: List[str]):
-    import glob
+    snapshots = client.bot.snapshots.list_snapshots()
     
-    db_path = client.bot.db.db_path
-    backup_pattern = f"{db_path}.backup.*"
-    backups = glob.glob(backup_pattern)
-    
-    if not backups:
+    if not snapshots:
         await client.bot.messages.send_error(client, message, "backup.no_backups")
         return
     
-    backups.sort(key=os.path.getmtime, reverse=True)
-    
     backup_list = []
-    for backup in backups[:10]:
-        size = os.path.getsize(backup)
-        mtime = os.path.getmtime(backup)
-        from datetime import datetime
-        date_str = datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
-        size_str = f"{size / 1024 / 1024:.1f}MB" if size > 1024*1024 else f"{size / 1024:.1f}KB"
+    for snapshot in snapshots[:10]:
+        date_str = datetime.fromtimestamp(snapshot["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        label = f" {html.escape(snapshot['label'])}" if snapshot["label"] else ""
         
-        backup_list.append(f"• <code>{os.path.basename(backup)}</code> ({size_str}) - {date_str}")
+        backup_list.append(
+            f"• <code>{snapshot['id']}</code>{label} ({format_size(snapshot['size'])}, "
+            f"+{format_size(snapshot['stored'])}) - {date_str}"
+        )
     
     backup_text = f"{client.bot.strings.get('backup.available')}\n\n" + "\n".join(backup_list)
     await client.bot.messages.send_message(client, message, backup_text)
@@ -6,6 +6,10 @@ __developer__ = "Kirillusha"
 __version__ = "1.0"
 __description__ = "Load and manage modules"
 
+import html
+
+from ..utils.helpers import format_size
+
 
 async def load_cmd(client, message, args):
     """Load a module"""
@@ -76,24 +80,33 @@ async def unload_cmd(client, message, args):
 
 
 async def reload_cmd(client, message, args):
-    """Reload all modules"""
+    """Reload changed modules"""
     await message.edit(
         "🔄 <b>Reloading modules...</b>",
         parse_mode="HTML"
     )
     
-    # Reload all modules
-    await client.bot.reload_modules()
+    # Reload the modules whose files changed, the rest stay as they are
+    actions = await client.bot.reload_modules()
     
+    if not actions:
+        await message.edit(
+            "✅ <b>All modules are up to date</b>",
+            parse_mode="HTML"
+        )
+        return
+    
+    changes = "\n".join(f"• <code>{name}</code> - {action}" for name, action in sorted(actions.items()))
     await message.edit(
-        "✅ <b>All modules reloaded</b>",
+        f"✅ <b>Modules reloaded:</b>\n\n{changes}",
         parse_mode="HTML"
     )
 
 
 async def modules_cmd(client, message, args):
-    """Show loaded modules"""
-    modules = client.bot.modules.get_all_modules()
+    """Show known modules from the module index with their resource usage"""
+    modules = client.bot.modules.list_indexed_modules()
+    usage = await client.bot.modules.get_resource_usage()
     
     if not modules:
         await message.edit(
@@ -102,19 +115,30 @@ async def modules_cmd(client, message, args):
         )
         return
     
+    status_icons = {"loaded": "•", "lazy": "◦", "failed": "❌", "unloaded": "⏸"}
+    
     module_list = []
     for module in modules:
-        name = module.get('name', 'Unknown')
-        version = module.get('version', '1.0')
-        developer = module.get('developer', 'Unknown')
-        description = module.get('description', 'No description')
+        icon = status_icons.get(module['status'], "•")
+        line = (f"{icon} <code>{module['name']}</code> (v{module['version']}) "
+                f"by {module['developer']} - {module['description']}")
+        if module['status'] == "failed" and module['error']:
+            line += f"\n   <i>{html.escape(module['error'])}</i>"
         
-        module_list.append(f"• <code>{name}</code> (v{version}) by {developer} - {description}")
-    
+        stats = usage.get(module['name'])
+        if stats and (stats['calls'] or stats['tasks_live'] or stats['memory_bytes']):
+            line += (f"\n   ⏱ {stats['calls']} calls, {stats['errors']} errors "
+                     f"({stats['error_rate'] * 100:.1f}%), cpu {stats['cpu_ms']:.0f} ms, "
+                     f"wall {stats['wall_ms']:.0f} ms, {stats['tasks_live']} tasks")
+            if stats['memory_bytes'] is not None:
+                line += f", {format_size(stats['memory_bytes'])}"
+        module_list.append(line)
+    
+    loaded = sum(1 for module in modules if module['status'] in ("loaded", "lazy"))
     modules_text = "\n".join(module_list)
     
     await message.edit(
-        f"📦 <b>Loaded Modules ({len(modules)}):</b>\n\n{modules_text}",
+        f"📦 <b>Loaded Modules ({loaded}/{len(modules)}):</b>\n\n{modules_text}",
         parse_mode="HTML"
     )
 
@@ -130,7 +154,7 @@ def register(bot, commands, module_name):
                             usage=".unload [module_name]")
     
     commands.register_command("reload", reload_cmd, module_name,
-                            description="Reload all modules",
+                            description="Reload changed modules",
                             usage=".reload")
     
     commands.register_command("modules", modules_cmd, module_name,
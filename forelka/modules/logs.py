@@ -6,14 +6,17 @@ __developer__ = "Kirillusha"
 __version__ = "1.0"
 __description__ = "View and manage bot logs"
 
+import asyncio
+import html
+
+from ..core.log_reader import DEFAULT_LOG_FILE, log_exists, render_line, tail_lines
+from ..core.log_search import get_log_search, parse_query
+from ..core.logger import rotate_logs
+
 
 async def logs_cmd(client, message, args):
     """View recent logs"""
-    import os
-    
-    log_file = 'forelka.log'
-    
-    if not os.path.exists(log_file):
+    if not log_exists():
         await message.edit(
             "❌ <b>Log file not found</b>",
             parse_mode="HTML"
@@ -21,23 +24,22 @@ async def logs_cmd(client, message, args):
         return
     
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        # Show last 50 lines by default
+        num_lines = 50
+        if args and args[0].isdigit():
+            num_lines = min(int(args[0]), 200)  # Limit to 200 lines max
+        
+        # Rotated segments included, read off the event loop
+        recent_logs = await asyncio.get_event_loop().run_in_executor(None, tail_lines, DEFAULT_LOG_FILE, num_lines)
         
-        if not lines:
+        if not recent_logs:
             await message.edit(
                 "📝 <b>Log file is empty</b>",
                 parse_mode="HTML"
             )
             return
         
-        # Show last 50 lines by default
-        num_lines = 50
-        if args and args[0].isdigit():
-            num_lines = min(int(args[0]), 200)  # Limit to 200 lines max
-        
-        recent_logs = lines[-num_lines:]
-        log_content = ''.join(recent_logs)
+        log_content = ''.join(render_line(line) for line in recent_logs)
         
         # Truncate if too long
         if len(log_content) > 4000:
@@ -57,13 +59,59 @@ async def logs_cmd(client, message, args):
         )
 
 
-async def clear_logs_cmd(client, message, args):
-    """Clear log file"""
-    import os
+async def log_search_cmd(client, message, args):
+    """Search logs, newest first"""
+    options = parse_query(" ".join(args))
+    if not any(options.get(key) for key in ("text", "regex", "level", "since", "until", "fields")):
+        await message.edit(
+            "❌ <b>Usage:</b> <code>.logsearch [level:error] [since:2h] [until:2024-01-31] "
+            "[module:name] [account:id] [command:name] [after:cursor] text or /regex/</code>",
+            parse_mode="HTML"
+        )
+        return
     
-    log_file = 'forelka.log'
+    try:
+        page = await asyncio.get_event_loop().run_in_executor(
+            None, lambda: get_log_search(DEFAULT_LOG_FILE).search(limit=20, **options)
+        )
+    except ValueError as e:
+        await message.edit(
+            f"❌ <b>Invalid query:</b> <code>{html.escape(str(e))}</code>",
+            parse_mode="HTML"
+        )
+        return
+    except Exception as e:
+        await message.edit(
+            f"❌ <b>Error searching logs:</b> <code>{html.escape(str(e))}</code>",
+            parse_mode="HTML"
+        )
+        return
     
-    if not os.path.exists(log_file):
+    if not page["results"]:
+        await message.edit(
+            "📝 <b>Nothing found</b>",
+            parse_mode="HTML"
+        )
+        return
+    
+    lines = "\n".join(result["line"][:300] for result in page["results"])
+    if len(lines) > 3500:
+        lines = lines[:3500] + "\n...[truncated]..."
+    
+    text = (
+        f"<b>🔍 Log search ({len(page['results'])} newest matches):</b>\n\n"
+        f"<code>{html.escape(lines)}</code>"
+    )
+    if page["cursor"]:
+        query = " ".join(arg for arg in args if not arg.lower().startswith("after:"))
+        text += f"\n\n<b>Older:</b> <code>.logsearch after:{html.escape(page['cursor'])} {html.escape(query)}</code>"
+    
+    await message.edit(text, parse_mode="HTML")
+
+
+async def clear_logs_cmd(client, message, args):
+    """Clear log file"""
+    if not log_exists():
         await message.edit(
             "📝 <b>Log file does not exist</b>",
             parse_mode="HTML"
@@ -71,18 +119,19 @@ async def clear_logs_cmd(client, message, args):
         return
     
     try:
-        # Create backup before clearing
-        backup_file = f"{log_file}.backup.{int(time.time())}"
-        import shutil
-        shutil.copy2(log_file, backup_file)
+        # The current file becomes a rotated segment, nothing is copied
+        segment = await asyncio.get_event_loop().run_in_executor(None, rotate_logs)
         
-        # Clear the log file
-        with open(log_file, 'w', encoding='utf-8') as f:
-            f.write("")
+        if segment is None:
+            await message.edit(
+                "📝 <b>Log file is already empty</b>",
+                parse_mode="HTML"
+            )
+            return
         
         await message.edit(
             f"✅ <b>Logs cleared</b>\n"
-            f"<b>Backup created:</b> <code>{backup_file}</code>",
+            f"<b>Previous log kept as:</b> <code>{segment}</code>",
             parse_mode="HTML"
         )
         
@@ -99,6 +148,10 @@ def register(bot, commands, module_name):
                             description="View recent logs",
                             usage=".logs [num_lines]")
     
+    commands.register_command("logsearch", log_search_cmd, module_name,
+                            description="Search logs by text, regex, level and time",
+                            usage=".logsearch [level:error] [since:2h] [until:date] [module:name] [after:cursor] text or /regex/")
+    
     commands.register_command("clearlogs", clear_logs_cmd, module_name,
                             description="Clear log file",
                             usage=".clearlogs")
\ No newline at end of file
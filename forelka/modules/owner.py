@@ -14,7 +14,7 @@ async def owner_cmd(client, message, args):
     
     if not args and not message.reply_to_message:
         # Show current owners
-        owners = await client.bot.db.get_owners(account_id)
+        owners = sorted(client.bot.permissions.get_owners(account_id))
         
         if not owners:
             await message.edit(
@@ -55,7 +55,7 @@ async def owner_cmd(client, message, args):
         return
     
     # Check if user is already owner
-    is_owner = await client.bot.db.is_owner(account_id, target_user_id)
+    is_owner = client.bot.permissions.is_owner(account_id, target_user_id)
     
     if is_owner:
         # Remove owner
@@ -79,7 +79,7 @@ async def admin_cmd(client, message, args):
     user_id = message.from_user.id if message.from_user else None
     
     # Check if user is owner
-    if not await client.bot.db.is_owner(account_id, user_id):
+    if not client.bot.permissions.is_owner(account_id, user_id):
         await message.edit(
             "❌ <b>Access denied: Owner permissions required</b>",
             parse_mode="HTML"
@@ -35,6 +35,7 @@ async def prefix_cmd(client, message, args):
     
     # Update client
     client.prefix = new_prefix
+    client.bot.commands.set_prefix(account_id, new_prefix)
     
     await message.edit(
         f"✅ <b>Prefix changed to:</b> <code>{new_prefix}</code>",
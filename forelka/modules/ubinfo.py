@@ -29,7 +29,7 @@ async def ubinfo_cmd(client, message, args):
     enabled_modules = [m for m in modules if m.get('enabled', True)]
     
     # Get owner information
-    owners = await client.bot.db.get_owners(account_id)
+    owners = client.bot.permissions.get_owners(account_id)
     
     info_text = f"""
 🤖 <b>Forelka Userbot Information</b>
@@ -73,12 +73,23 @@ async def stats_cmd(client, message, args):
     
     # Get database stats
     accounts = await client.bot.db.get_all_accounts()
-    owners_count = sum([len(await client.bot.db.get_owners(acc['id'])) for acc in accounts])
+    owners = await client.bot.db.get_owners_for_accounts([acc['id'] for acc in accounts])
+    owners_count = sum(len(ids) for ids in owners.values())
     
     # Get module stats
     modules = client.bot.modules.get_all_modules()
     enabled_modules = [m for m in modules if m.get('enabled', True)]
     
+    # Get command stats
+    metrics = client.bot.commands.metrics
+    total_calls = sum(h.count for h in metrics.commands.values())
+    total_errors = sum(h.errors for h in metrics.commands.values())
+    slowest = "\n".join(
+        f"• <code>{name}</code>: {s['count']} calls, p50 {s['p50_ms']}ms, "
+        f"p95 {s['p95_ms']}ms, p99 {s['p99_ms']}ms, {s['errors']} errors"
+        for name, s in metrics.top("p95_ms", 5)
+    ) or "• No commands executed yet"
+    
     stats_text = f"""
 📈 <b>Forelka Statistics</b>
 
@@ -96,6 +107,14 @@ async def stats_cmd(client, message, args):
 • <b>Path:</b> <code>{client.bot.db.db_path}</code>
 • <b>Accounts:</b> <code>{len(accounts)}</code>
 • <b>Owners:</b> <code>{owners_count}</code>
+
+⏱ <b>Commands:</b>
+• <b>Executed:</b> <code>{total_calls}</code>
+• <b>Errors:</b> <code>{total_errors}</code>
+• <b>Queued:</b> <code>{client.bot.commands.queue_depth()}</code>
+
+🐢 <b>Slowest (p95):</b>
+{slowest}
     """
     
     await message.edit(stats_text.strip(), parse_mode="HTML")
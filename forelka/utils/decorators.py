@@ -30,7 +30,7 @@ def owner_only(func: Callable):
         account_id = getattr(client, 'account_id', 1)
         user_id = message.from_user.id if message.from_user else None
         
-        if not await client.bot.db.is_owner(account_id, user_id):
+        if not client.bot.permissions.is_owner(account_id, user_id):
             await client.bot.utils.send_owner_only_message(client, message)
             return
         
@@ -44,7 +44,7 @@ def admin_only(func: Callable):
         account_id = getattr(client, 'account_id', 1)
         user_id = message.from_user.id if message.from_user else None
         
-        if not await client.bot.db.is_owner(account_id, user_id):
+        if not client.bot.permissions.is_owner(account_id, user_id):
             await client.bot.utils.send_admin_only_message(client, message)
             return
         
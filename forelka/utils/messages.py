@@ -17,7 +17,7 @@ class MessageManager:
         user_id = message.from_user.id if message.from_user else None
         account_id = getattr(client, 'account_id', 1)
         
-        is_owner = await self.bot.db.is_owner(account_id, user_id)
+        is_owner = self.bot.permissions.is_owner(account_id, user_id)
         
         if is_owner and reply_to:
             await message.edit(text, parse_mode=parse_mode)
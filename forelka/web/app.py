@@ -7,10 +7,14 @@ from flask_login import LoginManager, UserMixin, login_user, login_required, log
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
 import json
+import asyncio
 from datetime import datetime
 
 from ..core.config import ConfigManager
 from ..core.database import DatabaseManager
+from ..core.log_reader import DEFAULT_LOG_FILE, render_line, tail_lines
+from ..core.log_search import get_log_search
+from ..core.module_index import ModuleIndex
 from ..utils.helpers import get_system_info
 
 
@@ -20,12 +24,55 @@ class WebUser(UserMixin):
         self.id = id
 
 
-def create_app():
-    """Create and configure Flask application"""
+async def load_accounts(db: DatabaseManager):
+    """Get every account with its owners, prefix and module counts
+    
+    Uses the batch queries, so the cost does not grow with the number
+    of accounts.
+    """
+    accounts = await db.get_all_accounts()
+    account_ids = [account['id'] for account in accounts]
+    
+    owners = await db.get_owners_for_accounts(account_ids)
+    modules = await db.get_modules_for_accounts(account_ids)
+    settings = await db.get_settings_for_keys(account_ids, ["prefix"])
+    
+    for account in accounts:
+        rows = modules[account['id']]
+        account['owners'] = owners[account['id']]
+        account['prefix'] = str(settings[account['id']].get('prefix', account.get('prefix', '.')))
+        account['modules'] = {
+            'total': len(rows),
+            'enabled': sum(1 for row in rows if row['enabled'])
+        }
+    
+    return accounts
+
+
+async def load_module_report(bot):
+    """Indexed modules with their resource usage, run on the bot's loop"""
+    modules = bot.modules.list_indexed_modules()
+    usage = await bot.modules.get_resource_usage()
+    for module in modules:
+        module['usage'] = usage.get(module['name'])
+    return modules
+
+
+def run_on_bot_loop(bot, coro, timeout: float = 10.0):
+    """Run a coroutine on the bot's event loop from a request thread and wait for it"""
+    return asyncio.run_coroutine_threadsafe(coro, bot.loop).result(timeout)
+
+
+def create_app(bot=None):
+    """Create and configure Flask application
+    
+    Pass the running ForelkaBot instance to serve live runtime data; the
+    bot starts the web server that way itself.
+    """
     app = Flask(__name__)
     
     # Load configuration
-    config = ConfigManager()
+    config = bot.config if bot is not None else ConfigManager()
     web_config = config.get_web_config()
     
     app.config.update(
@@ -41,7 +88,7 @@ def create_app():
     login_manager.login_view = 'login'
     
     # Initialize database
-    db = DatabaseManager(config.get("database_path", "forelka.db"))
+    db = DatabaseManager.from_config(config)
     
     @login_manager.user_loader
     def load_user(user_id):
@@ -95,12 +142,24 @@ def create_app():
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/stats')
+    @login_required
+    def api_stats():
+        """Get command counters and latency percentiles"""
+        if bot is None:
+            return jsonify({'error': 'Bot instance is not attached'}), 503
+        
+        try:
+            return jsonify(run_on_bot_loop(bot, bot.get_stats()))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
     @app.route('/api/accounts')
     @login_required
     def api_accounts():
         """Get all accounts"""
         try:
-            accounts = db.get_all_accounts()
+            accounts = asyncio.run(load_accounts(db))
             return jsonify(accounts)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -110,15 +169,13 @@ def create_app():
     def api_modules():
         """Get all modules"""
         try:
-            # This would need to be connected to the actual bot instance
-            # For now, return mock data
-            return jsonify([
-                {'name': 'help', 'status': 'enabled', 'version': '1.0'},
-                {'name': 'ping', 'status': 'enabled', 'version': '1.0'},
-                {'name': 'owner', 'status': 'enabled', 'version': '1.0'},
-                {'name': 'prefix', 'status': 'enabled', 'version': '1.0'},
-                {'name': 'alias', 'status': 'enabled', 'version': '1.0'}
-            ])
+            if bot is not None:
+                return jsonify(run_on_bot_loop(bot, load_module_report(bot)))
+            
+            # Without a bot read the index it keeps on disk
+            modules_config = config.get_modules_config()
+            index = ModuleIndex.for_directory(modules_config.get('loaded_modules_dir', 'loaded_modules'))
+            return jsonify(index.list_modules())
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -127,23 +184,39 @@ def create_app():
     def api_logs():
         """Get recent logs"""
         try:
-            log_file = 'forelka.log'
-            if os.path.exists(log_file):
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()[-100:]  # Last 100 lines
-                    return jsonify({'logs': lines})
-            else:
-                return jsonify({'logs': []})
+            # Last 100 lines, across rotated segments
+            return jsonify({'logs': [render_line(line) for line in tail_lines(DEFAULT_LOG_FILE, 100)]})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/logs/search')
+    @login_required
+    def api_logs_search():
+        """Search logs, newest first; pass the returned cursor for older results"""
+        try:
+            page = get_log_search(DEFAULT_LOG_FILE).search(
+                text=request.args.get('q'),
+                regex=request.args.get('regex'),
+                level=request.args.get('level'),
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+                limit=min(request.args.get('limit', 50, type=int), 500),
+                cursor=request.args.get('cursor'),
+                fields={field: request.args.get(field) for field in ('account', 'module', 'command')}
+            )
+            return jsonify(page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
     return app
 
 
-def run_web_server():
-    """Run the web server"""
-    app = create_app()
-    config = ConfigManager()
+def run_web_server(bot=None):
+    """Run the web server, ForelkaBot.start runs it in a thread with itself as bot"""
+    app = create_app(bot)
+    config = bot.config if bot is not None else ConfigManager()
     web_config = config.get_web_config()
     
     if web_config.get('enabled', True):
@@ -6,6 +6,10 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from flask_login import login_required, current_user
 import json
 import os
+import asyncio
+
+from ..core.log_reader import DEFAULT_LOG_FILE, render_line, tail_lines
+from ..core.log_search import get_log_search
 
 web_routes = Blueprint('web_routes', __name__)
 
@@ -51,56 +55,63 @@ def api_accounts():
     """API endpoint for account management"""
     from ..core.database import DatabaseManager
     from ..core.config import ConfigManager
+    from .app import load_accounts
     
-    db = DatabaseManager(ConfigManager().get("database_path", "forelka.db"))
-    
-    if request.method == 'GET':
-        try:
-            accounts = db.get_all_accounts()
-            return jsonify({'success': True, 'accounts': accounts})
-        except Exception as e:
-            return jsonify({'success': False, 'error': str(e)}), 500
-    
-    elif request.method == 'POST':
-        try:
-            data = request.get_json()
-            user_id = data.get('user_id')
-            api_id = data.get('api_id')
-            api_hash = data.get('api_hash')
-            prefix = data.get('prefix', '.')
-            
-            if not all([user_id, api_id, api_hash]):
-                return jsonify({'success': False, 'error': 'Missing required fields'}), 400
-            
-            account_id = db.add_account(user_id, api_id, api_hash, prefix)
-            return jsonify({'success': True, 'account_id': account_id})
-        except Exception as e:
-            return jsonify({'success': False, 'error': str(e)}), 500
+    db = DatabaseManager.from_config(ConfigManager())
     
-    elif request.method == 'DELETE':
-        try:
-            data = request.get_json()
-            account_id = data.get('account_id')
-            
-            if not account_id:
-                return jsonify({'success': False, 'error': 'Account ID required'}), 400
-            
-            db.remove_account(account_id)
-            return jsonify({'success': True})
-        except Exception as e:
-            return jsonify({'success': False, 'error': str(e)}), 500
+    try:
+        if request.method == 'GET':
+            try:
+                accounts = asyncio.run(load_accounts(db))
+                return jsonify({'success': True, 'accounts': accounts})
+            except Exception as e:
+                return jsonify({'success': False, 'error': str(e)}), 500
+        
+        elif request.method == 'POST':
+            try:
+                data = request.get_json()
+                user_id = data.get('user_id')
+                api_id = data.get('api_id')
+                api_hash = data.get('api_hash')
+                prefix = data.get('prefix', '.')
+                
+                if not all([user_id, api_id, api_hash]):
+                    return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+                
+                account_id = asyncio.run(db.add_account(user_id, api_id, api_hash, prefix))
+                return jsonify({'success': True, 'account_id': account_id})
+            except Exception as e:
+                return jsonify({'success': False, 'error': str(e)}), 500
+        
+        elif request.method == 'DELETE':
+            try:
+                data = request.get_json()
+                account_id = data.get('account_id')
+                
+                if not account_id:
+                    return jsonify({'success': False, 'error': 'Account ID required'}), 400
+                
+                asyncio.run(db.remove_account(account_id))
+                return jsonify({'success': True})
+            except Exception as e:
+                return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        # Stop the executor threads of this per-request instance
+        asyncio.run(db.close())
 
 
 @web_routes.route('/api/modules', methods=['GET'])
 @login_required
 def api_modules():
     """API endpoint for module management"""
-    from ..core.bot import ForelkaBot
+    from ..core.config import ConfigManager
+    from ..core.module_index import ModuleIndex
     
     try:
-        bot = ForelkaBot()
-        modules = bot.modules.get_all_modules()
-        return jsonify({'success': True, 'modules': modules})
+        # The bot keeps the index up to date, no need to load the modules here
+        modules_config = ConfigManager().get_modules_config()
+        index = ModuleIndex.for_directory(modules_config.get('loaded_modules_dir', 'loaded_modules'))
+        return jsonify({'success': True, 'modules': index.list_modules()})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -110,15 +121,31 @@ def api_modules():
 def api_logs():
     """API endpoint for log viewing"""
     try:
-        log_file = 'forelka.log'
-        if not os.path.exists(log_file):
-            return jsonify({'success': True, 'logs': []})
-        
-        with open(log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            # Return last 1000 lines
-            logs = [line.strip() for line in lines[-1000:]]
-            return jsonify({'success': True, 'logs': logs})
+        # Return last 1000 lines, across rotated segments
+        logs = [render_line(line).strip() for line in tail_lines(DEFAULT_LOG_FILE, 1000)]
+        return jsonify({'success': True, 'logs': logs})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@web_routes.route('/api/logs/search', methods=['GET'])
+@login_required
+def api_logs_search():
+    """API endpoint for log search, newest first with cursor pagination"""
+    try:
+        page = get_log_search(DEFAULT_LOG_FILE).search(
+            text=request.args.get('q'),
+            regex=request.args.get('regex'),
+            level=request.args.get('level'),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            limit=min(request.args.get('limit', 50, type=int), 500),
+            cursor=request.args.get('cursor'),
+            fields={field: request.args.get(field) for field in ('account', 'module', 'command')}
+        )
+        return jsonify({'success': True, **page})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 